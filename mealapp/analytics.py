@@ -0,0 +1,184 @@
+from datetime import timedelta
+
+import numpy as np
+
+from .generator import calorie_goal_for, nutrition_targets
+from .models import MEAL_SLOTS, NUTRITION_FIELDS, DailyNutrition, MealPlan
+
+ANALYTICS_DAYS = 90
+MAX_ANALYTICS_DAYS = 366
+
+# Rolling windows in days, ending on each day of the range
+WINDOWS = (7, 30)
+
+# A planned day adheres when its calories are within this share of the goal
+ADHERENCE_TOLERANCE = 0.1
+
+
+def _day_rows(queryset, start, *fields):
+    """(day offsets from start, other columns) of day-keyed rows"""
+    rows = list(queryset.order_by().values_list('day', *fields))
+    if not rows:
+        return None, None
+    columns = np.array(rows, dtype=object)
+    index = (columns[:, 0].astype('datetime64[D]')
+             - np.datetime64(start, 'D')).astype(np.int64)
+    return index, columns[:, 1:]
+
+
+def load_history(user, start, end):
+    """
+    Every calendar day from start to end: (days, 5) nutrition totals in
+    NUTRITION_FIELDS order, (days, 4) slot recipe ids (0 = empty) and a
+    planned flag. Days without a plan are zero rows. Totals come from
+    DailyNutrition and recipe ids from the plans themselves, in two
+    indexed range queries without recipe joins.
+    """
+    size = (end - start).days + 1
+    values = np.zeros((size, len(NUTRITION_FIELDS)))
+    recipes = np.zeros((size, len(MEAL_SLOTS)), dtype=np.int64)
+    planned = np.zeros(size, dtype=bool)
+
+    index, columns = _day_rows(DailyNutrition.objects.filter(
+        user=user, day__range=(start, end)), start, *NUTRITION_FIELDS)
+    if index is not None:
+        values[index] = columns.astype(float)
+        planned[index] = True
+
+    index, columns = _day_rows(MealPlan.objects.filter(
+        user=user, day__range=(start, end)), start,
+        *[f'{slot}_recipe_id' for slot in MEAL_SLOTS])
+    if index is not None:
+        # Empty slots come back as None -> nan -> 0
+        recipes[index] = np.nan_to_num(
+            columns.astype(float)).astype(np.int64)
+    return values, recipes, planned
+
+
+def rolling_mean(values, weights, window):
+    """
+    Mean of `values` rows over the trailing `window` days, counting only
+    rows whose weight is set. nan where a window holds no such row.
+    """
+    values = np.asarray(values, dtype=float).reshape(len(weights), -1)
+    weights = np.asarray(weights, dtype=float)
+    sums = np.vstack([np.zeros((1, values.shape[1])),
+                      np.cumsum(values * weights[:, None], axis=0)])
+    counts = np.concatenate([[0], np.cumsum(weights)])
+    stop = np.arange(1, len(weights) + 1)
+    begin = np.maximum(stop - window, 0)
+    count = counts[stop] - counts[begin]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums[stop] - sums[begin]) / count[:, None]
+
+
+def streaks(flags):
+    """
+    (current, longest) runs of set flags. The current run ends on the
+    last day, or on the day before when the last day is not done yet.
+    """
+    padded = np.concatenate([[0], flags.astype(np.int8), [0]])
+    edges = np.flatnonzero(np.diff(padded))
+    begins, ends = edges[::2], edges[1::2]
+    if not len(begins):
+        return 0, 0
+    lengths = ends - begins
+    current = lengths[-1] if ends[-1] >= len(flags) - 1 else 0
+    return int(current), int(lengths.max())
+
+
+def _rounded(array, digits=1):
+    """JSON-safe list: rounded floats with nan as None"""
+    return [None if value != value else value
+            for value in np.round(array, digits).tolist()]
+
+
+def nutrition_analytics(user, start, end):
+    """
+    Rolling averages against the calorie goal, adherence, complete-day
+    streaks, calorie trend and recipe variety for start..end.
+    """
+    goal = calorie_goal_for(user)
+    targets = nutrition_targets(goal)
+    # Load enough earlier days that the first windows are full
+    lead = max(WINDOWS) - 1
+    values, recipes, planned = load_history(
+        user, start - timedelta(days=lead), end)
+
+    complete = (recipes > 0).all(axis=1)
+    adherent = planned & (
+        np.abs(values[:, 0] - goal) <= ADHERENCE_TOLERANCE * goal)
+    averages = {window: rolling_mean(values, planned, window)
+                for window in WINDOWS}
+    adherence = {window: rolling_mean(adherent, planned, window)[:, 0] * 100
+                 for window in WINDOWS}
+
+    # Everything below covers the requested range only
+    values, recipes = values[lead:], recipes[lead:]
+    planned, complete = planned[lead:], complete[lead:]
+    adherent = adherent[lead:]
+    planned_days = int(planned.sum())
+    current_streak, longest_streak = streaks(complete)
+
+    # Least-squares slope of the planned days' calories, per week
+    trend = None
+    if planned_days > 1:
+        offsets = np.flatnonzero(planned)
+        if offsets[-1] > offsets[0]:
+            trend = float(np.polyfit(offsets, values[planned, 0], 1)[0] * 7)
+
+    variety = {}
+    for column, slot in enumerate(MEAL_SLOTS):
+        used = recipes[:, column][recipes[:, column] > 0]
+        variety[slot] = {
+            'planned': int(used.size),
+            'distinct': int(np.unique(used).size),
+        }
+    filled = recipes[recipes > 0]
+    distinct = int(np.unique(filled).size)
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'goal': round(goal, 1),
+        'targets': dict(zip(NUTRITION_FIELDS, _rounded(targets))),
+        'summary': {
+            'planned_days': planned_days,
+            'complete_days': int(complete.sum()),
+            'adherence': (round(float(adherent.mean(where=planned)) * 100, 1)
+                          if planned_days else None),
+            'current_streak': current_streak,
+            'longest_streak': longest_streak,
+            'calorie_trend': None if trend is None else round(trend, 1),
+            'averages': {
+                str(window): dict(zip(
+                    NUTRITION_FIELDS, _rounded(averages[window][-1])))
+                for window in WINDOWS
+            },
+            'adherence_windows': {
+                str(window): _rounded(adherence[window][-1:])[0]
+                for window in WINDOWS
+            },
+            'variety': {
+                'slots': variety,
+                'distinct': distinct,
+                'share': (round(distinct / filled.size * 100, 1)
+                          if filled.size else None),
+            },
+        },
+        # Column-oriented series, one entry per day, for charts
+        'series': {
+            'day': [(start + timedelta(days=offset)).isoformat()
+                    for offset in range(len(planned))],
+            'planned': planned.tolist(),
+            'complete': complete.tolist(),
+            **{field: _rounded(values[:, column])
+               for column, field in enumerate(NUTRITION_FIELDS)},
+            **{f'avg_{window}_{field}': _rounded(
+                averages[window][lead:, column])
+               for window in WINDOWS
+               for column, field in enumerate(NUTRITION_FIELDS)},
+            **{f'adherence_{window}': _rounded(adherence[window][lead:])
+               for window in WINDOWS},
+        },
+    }
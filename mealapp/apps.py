@@ -5,6 +5,5 @@ class MealappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mealapp'
 
-
-def ready(self):
-    import mealapp.signals
+    def ready(self):
+        import mealapp.signals
@@ -0,0 +1,217 @@
+import json
+import threading
+import time
+from collections.abc import Sequence
+
+from django.core.cache import cache
+from django.db.models.functions import Lower
+
+from .models import Recipe
+from .search import get_search_backend
+
+# Cache key holding the current catalog version. Signals bump it whenever
+# a recipe is saved or deleted so every worker rebuilds its snapshot; the
+# cache is shared between workers (settings.CACHES).
+CATALOG_VERSION_KEY = 'mealapp:catalog_version'
+
+# Upper bound on memoized search slices per snapshot
+MAX_SEARCH_SLICES = 256
+
+# Per-category (id, title) choice lists, one cache entry per version.
+# Superseded versions simply expire.
+CHOICES_CACHE_KEY = 'mealapp:recipe_choices:v{version}'
+CHOICES_TIMEOUT = 60 * 60 * 24
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_version():
+    """Return the current catalog version (starts at 1)"""
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every worker's snapshot with a new version. The version
+    is a fresh timestamp rather than cache.incr(), which DatabaseCache
+    runs as a get and a set, so two concurrent bumps could store the
+    same number.
+    """
+    version = time.time_ns()
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def _image_url(recipe):
+    """Resolve the Cloudinary URL once per snapshot build"""
+    try:
+        return recipe.image_url.url if hasattr(
+            recipe.image_url, 'url') else str(recipe.image_url)
+    except Exception:
+        return str(recipe.image_url)
+
+
+class CardSlice(Sequence):
+    """Lazy view over snapshot cards, so paging never copies a slice"""
+
+    def __init__(self, cards, indices):
+        self._cards = cards
+        self._indices = indices
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._cards[i] for i in self._indices[index]]
+        return self._cards[self._indices[index]]
+
+    def __len__(self):
+        return len(self._indices)
+
+
+class CatalogSnapshot:
+    """
+    Immutable, pre-serialized view of the whole recipe catalog.
+    Cards are plain dicts the index template can render directly and
+    each recipe's JSON is encoded once, so slices are byte joins.
+    Search slices keep the rank order of the search backend.
+    """
+
+    def __init__(self, version, recipes):
+        self.version = version
+        self.cards = []
+        self._fragments = []
+        for recipe in recipes:
+            # Card rendition stored on the row; rows not backfilled yet
+            # fall back to the original image through the SDK
+            variants = recipe.image_variants
+            image_url = variants.get('card') or _image_url(recipe)
+            self.cards.append({
+                'id': recipe.id,
+                'title': recipe.title,
+                'category': recipe.category,
+                'description': recipe.description,
+                'image_url': image_url,
+                'image_srcset': variants.get('srcset', ''),
+                'image_placeholder': variants.get('placeholder', ''),
+                'image_status': recipe.image_status,
+                'servings': recipe.servings,
+                'prep_time_minutes': recipe.prep_time_minutes,
+                'cook_time_minutes': recipe.cook_time_minutes,
+                'total_calories': recipe.total_calories,
+                'protein': recipe.protein,
+                'carbs': recipe.carbs,
+                'fat': recipe.fat,
+                'fiber': recipe.fiber,
+                'created_by': recipe.created_by.username,
+            })
+            # The index page's payload. Ingredients and instructions are
+            # left out: the page never reads them, and they are stored as
+            # text, so this payload only ever carried empty lists for them.
+            self._fragments.append(json.dumps({
+                'id': recipe.id,
+                'recipe_name': recipe.title,
+                'category': recipe.category,
+                'description': recipe.description,
+                'image_url': image_url,
+                'prep_time_minutes': recipe.prep_time_minutes,
+                'total_calories': recipe.total_calories,
+                'servings': recipe.servings,
+                'protein': recipe.protein,
+                'carbs': recipe.carbs,
+                'fat': recipe.fat,
+                'fiber': recipe.fiber,
+            }).encode())
+
+        self.json = self._join(range(len(self.cards)))
+        self._positions = {
+            card['id']: i for i, card in enumerate(self.cards)}
+        self._by_category = {}
+        for category, _label in Recipe.CATEGORY_CHOICES:
+            indices = [i for i, card in enumerate(self.cards)
+                       if card['category'] == category]
+            self._by_category[category] = (indices, self._join(indices))
+        self._searches = {}
+        self._search_lock = threading.Lock()
+
+    def _join(self, indices):
+        return b'[' + b', '.join(self._fragments[i] for i in indices) + b']'
+
+    def _search_indices(self, category, search):
+        """Ranked indices for a search, memoized for this version"""
+        key = (category, search.strip().casefold())
+        hit = self._searches.get(key)
+        if hit is None:
+            ids = get_search_backend().ranked_ids(search, category or None)
+            hit = [self._positions[pk] for pk in ids
+                   if pk in self._positions]
+            with self._search_lock:
+                if len(self._searches) >= MAX_SEARCH_SLICES:
+                    self._searches.clear()
+                self._searches[key] = hit
+        return hit
+
+    def slice(self, category='', search=''):
+        """Return (cards, json_bytes) for a category/search filter"""
+        if not search:
+            if not category:
+                return self.cards, self.json
+            indices, payload = self._by_category.get(category, ([], b'[]'))
+            return CardSlice(self.cards, indices), payload
+        indices = self._search_indices(category, search)
+        return CardSlice(self.cards, indices), self._join(indices)
+
+
+def get_catalog_snapshot():
+    """Return this worker's snapshot, rebuilding it if the version moved"""
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            recipes = Recipe.objects.select_related('created_by').defer(
+                'search_vector').order_by('-created_at', 'id')
+            _snapshot = CatalogSnapshot(version, recipes)
+        return _snapshot
+
+
+def get_recipe_choices():
+    """
+    Return {category: [(id, title), ...]} sorted by title. Built with one
+    values_list query per catalog version and shared through the cache.
+    """
+    key = CHOICES_CACHE_KEY.format(version=get_catalog_version())
+    choices = cache.get(key)
+    if choices is None:
+        choices = {category: [] for category, _label in
+                   Recipe.CATEGORY_CHOICES}
+        rows = Recipe.objects.order_by(Lower('title'), 'id').values_list(
+            'id', 'title', 'category')
+        for pk, title, category in rows:
+            choices.setdefault(category, []).append((pk, title))
+        cache.set(key, choices, CHOICES_TIMEOUT)
+    return choices
+
+
+def suggest_recipes(category, term, limit=20):
+    """
+    Typeahead over the cached choices: titles starting with the term
+    first, then titles containing it. An empty term lists the first
+    titles alphabetically.
+    """
+    options = get_recipe_choices().get(category, [])
+    term = term.strip().casefold()
+    if not term:
+        return options[:limit]
+    prefix = []
+    contains = []
+    for pk, title in options:
+        position = title.casefold().find(term)
+        if position == 0:
+            prefix.append((pk, title))
+            if len(prefix) >= limit:
+                break
+        elif position > 0 and len(contains) < limit:
+            contains.append((pk, title))
+    return (prefix + contains)[:limit]
@@ -0,0 +1,129 @@
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import Count, Max, Q
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .catalog import get_catalog_version
+from .models import MealPlan, Recipe
+from .planning import parse_day
+
+# Shared caches (CDN) may keep anonymous pages this long
+PUBLIC_MAX_AGE = 60
+PUBLIC_S_MAXAGE = 300
+
+
+def _viewer(request):
+    """
+    Pages render differently per user (nav bar, edit buttons). Signed-in
+    pages also embed CSRF tokens, and the CSRF secret changes on login.
+    """
+    if request.user.is_authenticated:
+        # Creates the secret if the request has none yet, so the ETag
+        # matches the token the page is rendered with
+        get_token(request)
+        return f"u{request.user.pk}:{request.META['CSRF_COOKIE']}"
+    return 'anon'
+
+
+def _has_pending_messages(request):
+    # len() peeks at the storage without marking messages as shown
+    return bool(len(messages.get_messages(request)))
+
+
+def make_etag(request, *parts):
+    """
+    Build an ETag from cheap validators plus the viewer. Pending flash
+    messages disable conditional handling so they still get rendered.
+    """
+    if _has_pending_messages(request):
+        return None
+    key = ':'.join(str(part) for part in (_viewer(request),) + parts)
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def cache_headers(view_func):
+    """
+    Anonymous responses are publicly cacheable for a short time;
+    signed-in responses are private and always revalidated.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD'):
+            return response
+        patch_vary_headers(response, ['Cookie'])
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=PUBLIC_MAX_AGE,
+                s_maxage=PUBLIC_S_MAXAGE)
+        return response
+    return wrapper
+
+
+# Validators: each is a cache lookup or one indexed query
+
+def _recipe_row(request, recipe_id):
+    # Memoized so ETag and Last-Modified share one primary-key lookup
+    if not hasattr(request, '_recipe_row'):
+        request._recipe_row = Recipe.objects.filter(
+            id=recipe_id).values_list('id', 'updated_at').first()
+    return request._recipe_row
+
+
+def recipe_last_modified(request, recipe_id):
+    row = _recipe_row(request, recipe_id)
+    if row is None or _has_pending_messages(request):
+        return None
+    return row[1]
+
+
+def recipe_etag(request, recipe_id):
+    row = _recipe_row(request, recipe_id)
+    if row is None:
+        return None
+    updated_at = row[1]
+    # Legacy rows without updated_at fall back to the catalog version
+    version = (updated_at.isoformat() if updated_at
+               else f'v{get_catalog_version()}')
+    return make_etag(request, 'recipe', recipe_id, version)
+
+
+def catalog_etag(request):
+    return make_etag(
+        request, 'catalog', get_catalog_version(),
+        request.GET.urlencode())
+
+
+def _meal_plan_state(request, day):
+    """
+    The user's latest change and plan count, plus the id and change time
+    of the plan for `day`, in one query. The latest change alone misses
+    deletes of any other plan, and of the day's plan once it is gone.
+    """
+    day_plan = Q(day=day) if day else Q(pk__in=[])
+    return MealPlan.objects.filter(user=request.user).aggregate(
+        latest=Max('updated_at'), plans=Count('id'),
+        day_id=Max('id', filter=day_plan),
+        day_updated=Max('updated_at', filter=day_plan))
+
+
+def meal_plan_etag(request, date):
+    if not request.user.is_authenticated:
+        return None
+    state = _meal_plan_state(request, parse_day(date))
+    # The editor also lists recipes, so the catalog version matters too
+    return make_etag(
+        request, 'meal_plan', date, state['latest'], state['plans'],
+        state['day_id'], state['day_updated'], get_catalog_version())
+
+
+recipe_condition = condition(
+    etag_func=recipe_etag, last_modified_func=recipe_last_modified)
+catalog_condition = condition(etag_func=catalog_etag)
+meal_plan_condition = condition(etag_func=meal_plan_etag)
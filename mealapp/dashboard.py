@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .catalog import get_catalog_version
+from .models import MealPlan
+from .planning import with_slot_recipes
+from .stats import DASHBOARD_CACHE_KEY, DASHBOARD_TIMEOUT
+
+
+def build_dashboard_context(user, today):
+    """Two queries: user with profile and stats, then today's plan"""
+    user = User.objects.select_related('profile', 'stats').get(pk=user.pk)
+    profile = getattr(user, 'profile', None)
+    stats = getattr(user, 'stats', None)
+    meal_plan = with_slot_recipes(MealPlan.objects.with_nutrition()).filter(
+        user=user, day=today).first()
+
+    total_calories = meal_plan.get_total_calories() if meal_plan else 0
+    goal = profile.daily_calorie_goal if profile else None
+    return {
+        'user_profile': profile,
+        'meal_plan': meal_plan,
+        'today': today,
+        'total_calories': total_calories,
+        'remaining_calories': (goal or 0) - total_calories,
+        'user_recipes_count': stats.recipe_count if stats else 0,
+        'meal_plan_count': stats.meal_plan_count if stats else 0,
+    }
+
+
+def get_dashboard_context(user):
+    """Cached dashboard context; never writes to the database"""
+    today = date.today()
+    version = get_catalog_version()
+    key = DASHBOARD_CACHE_KEY.format(user_id=user.pk)
+    entry = cache.get(key)
+    if entry and entry['day'] == today and entry['version'] == version:
+        return entry['context']
+    context = build_dashboard_context(user, today)
+    cache.set(key, {'day': today, 'version': version, 'context': context},
+              DASHBOARD_TIMEOUT)
+    return context
@@ -0,0 +1,125 @@
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .models import MealPlan, Recipe
+from .streaming import (
+    byte_chunks, compressed_chunks, compressor, csv_lines, ndjson_lines)
+
+# Rows fetched per round trip; on PostgreSQL through a server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, field lookup or expression). Recipe rows use the field names
+# import_recipes reads, so an NDJSON export can be imported again.
+RECIPE_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('category', 'category'),
+    ('description', 'description'),
+    ('ingredients', 'ingredients'),
+    ('instructions', 'instructions'),
+    ('servings', 'servings'),
+    ('prep_time_minutes', 'prep_time_minutes'),
+    ('cook_time_minutes', 'cook_time_minutes'),
+    ('total_calories', 'total_calories'),
+    ('protein', 'protein'),
+    ('carbs', 'carbs'),
+    ('fat', 'fat'),
+    ('fiber', 'fiber'),
+    # The stored value, not a CloudinaryResource
+    ('image_url', Cast('image_url', CharField())),
+    ('created_by', 'created_by_id'),
+    ('username', 'created_by__username'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+# Recipe titles are resolved with joins in the same query
+MEAL_PLAN_COLUMNS = [
+    ('id', 'id'),
+    ('user', 'user_id'),
+    ('username', 'user__username'),
+    ('day', 'day'),
+    ('breakfast_recipe', 'breakfast_recipe_id'),
+    ('breakfast', 'breakfast_recipe__title'),
+    ('lunch_recipe', 'lunch_recipe_id'),
+    ('lunch', 'lunch_recipe__title'),
+    ('dinner_recipe', 'dinner_recipe_id'),
+    ('dinner', 'dinner_recipe__title'),
+    ('snack_recipe', 'snack_recipe_id'),
+    ('snack', 'snack_recipe__title'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+# kind: (model, columns, username lookup, date lookup)
+EXPORTS = {
+    'recipes': (Recipe, RECIPE_COLUMNS, 'created_by__username',
+                'created_at__date'),
+    'meal-plans': (MealPlan, MEAL_PLAN_COLUMNS, 'user__username', 'day'),
+}
+
+OUTPUT_FORMATS = {
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'csv': ('csv', 'text/csv'),
+}
+COMPRESSIONS = {
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd'),
+}
+
+
+def export_rows(kind, users=(), since=None, until=None,
+                chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Column names and an iterator of row tuples for an export, filtered
+    by usernames and an inclusive date range (recipe creation date or
+    plan day). Rows come in primary key order, so the database streams
+    them without sorting first.
+    """
+    model, columns, user_lookup, date_lookup = EXPORTS[kind]
+    queryset = model.objects.order_by('pk')
+    if users:
+        queryset = queryset.filter(**{f'{user_lookup}__in': users})
+    if since:
+        queryset = queryset.filter(**{f'{date_lookup}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{date_lookup}__lte': until})
+    names = [name for name, _value in columns]
+    rows = queryset.values_list(
+        *[value for _name, value in columns]).iterator(chunk_size=chunk_size)
+    return names, rows
+
+
+def export_chunks(kind, output='ndjson', compression=None, **filters):
+    """
+    The export as an iterator of byte blocks, NDJSON or CSV, optionally
+    gzip or zstd compressed. Rows are encoded as they are read, so
+    memory stays flat however many there are. Raises ValueError for an
+    unknown format or an unavailable compression before any query runs.
+    """
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f'unknown format: {output}')
+    compressobj = compressor(compression) if compression else None
+    names, rows = export_rows(kind, **filters)
+    if output == 'csv':
+        lines = csv_lines(rows, names)
+    else:
+        lines = ndjson_lines(dict(zip(names, row)) for row in rows)
+    if compressobj:
+        return compressed_chunks(lines, compressobj)
+    return byte_chunks(lines)
+
+
+def export_filename(kind, output, compression=None, today=None):
+    """e.g. meal-plans-2024-05-01.csv.gz"""
+    name = f'{kind}-{today}.' if today else f'{kind}.'
+    name += OUTPUT_FORMATS[output][0]
+    if compression:
+        name += '.' + COMPRESSIONS[compression][0]
+    return name
+
+
+def export_content_type(output, compression=None):
+    if compression:
+        return COMPRESSIONS[compression][1]
+    return OUTPUT_FORMATS[output][1]
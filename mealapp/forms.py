@@ -3,22 +3,59 @@ import json
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.core.files.uploadedfile import UploadedFile
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Field, HTML
 from django.forms import formset_factory
 from django.urls import reverse
+from .ingredients import split_ingredient_lines, split_instruction_lines
 from .models import MealPlan, UserProfile, Recipe
+from .uploads import MAX_IMAGE_BYTES
 from mealapp import models
 import re
 
 
+def image_upload_field():
+    """
+    Plain file field for an uploaded image. CloudinaryField's own form
+    field uploads while validating; views stage the file instead, see
+    mealapp.uploads.stage_image
+    """
+    return forms.FileField(
+        required=False, label='Image',
+        widget=forms.ClearableFileInput(
+            attrs={'class': 'form-control', 'accept': 'image/*'}))
+
+
+def clean_image_upload(image):
+    """Reject non-images and files over Cloudinary's size limit"""
+    # Without a new file the field returns the current image
+    if isinstance(image, UploadedFile):
+        if not (image.content_type or '').startswith('image/'):
+            raise forms.ValidationError('Please upload an image file.')
+        if image.size > MAX_IMAGE_BYTES:
+            raise forms.ValidationError(
+                f'Images can be at most '
+                f'{MAX_IMAGE_BYTES // (1024 * 1024)} MB.')
+    return image
+
+
+def apply_cleared_image(form, field):
+    """Reset the image to its default when it was cleared"""
+    if form.cleaned_data.get(field) is False:
+        setattr(form.instance, field,
+                form.instance._meta.get_field(field).default)
+
+
 class ProfileSetupForm(forms.ModelForm):
     """Form for setting up user profile"""
 
+    user_image = image_upload_field()
+
     class Meta:
         model = UserProfile
         fields = ['first_name', 'last_name', 'age',
-                  'weight_kg', 'height_cm', 'gender', 'user_image']
+                  'weight_kg', 'height_cm', 'gender']
         widgets = {
             'first_name': forms.TextInput(
                 attrs={'class': 'form-control',
@@ -45,6 +82,14 @@ class ProfileSetupForm(forms.ModelForm):
 
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['user_image'].initial = self.instance.user_image
+
+    def clean_user_image(self):
+        return clean_image_upload(self.cleaned_data.get('user_image'))
+
     def clean(self):
         cleaned_data = super().clean()
         age = cleaned_data.get('age')
@@ -68,11 +113,18 @@ class ProfileSetupForm(forms.ModelForm):
     def save(self, commit=True):
         """Save profile and update user name"""
         user = self.instance.user
-        user.first_name = self.cleaned_data.get('first_name', '')
-        user.last_name = self.cleaned_data.get('last_name', '')
-
-        user.save()
-
+        names = {
+            'first_name': self.cleaned_data.get('first_name') or '',
+            'last_name': self.cleaned_data.get('last_name') or '',
+        }
+        changed = [field for field, value in names.items()
+                   if getattr(user, field) != value]
+        if changed:
+            for field in changed:
+                setattr(user, field, names[field])
+            user.save(update_fields=changed)
+
+        apply_cleared_image(self, 'user_image')
         return super().save(commit=commit)
 
 
@@ -185,8 +237,12 @@ class MealSelectionForm(forms.Form):
 class RecipeForm(forms.ModelForm):
     """Form for creating and editing recipes"""
 
+    image_url = image_upload_field()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['image_url'].initial = self.instance.image_url
         # Pre-populate ingredients_text
         # and instructions_text for textarea fields
         if self.instance and self.instance.pk:
@@ -211,7 +267,7 @@ class RecipeForm(forms.ModelForm):
         model = Recipe
         fields = [
             'title', 'description', 'prep_time_minutes',
-            'cook_time_minutes', 'servings', 'image_url',
+            'cook_time_minutes', 'servings',
             'category', 'total_calories', 'carbs', 'protein',
             'fat', 'fiber',
         ]
@@ -219,23 +275,17 @@ class RecipeForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(
                 attrs={'rows': 2, 'cols': 40, 'class': 'form-control'}),
-            'image_url': forms.ClearableFileInput(
-                attrs={'class': 'form-control'}),
         }
 
+    def clean_image_url(self):
+        return clean_image_upload(self.cleaned_data.get('image_url'))
+
     # Validation for ingredients and instructions
     def clean(self):
         cleaned_data = super().clean()
-        raw_ingredients = self.data.get('ingredients_text', '')
-        import re
-        raw_ingredients = re.sub(r"[\[\]\'\"]", '', raw_ingredients)
-        if '\n' in raw_ingredients:
-            ingredients = [i.strip()
-                           for i in raw_ingredients.split('\n') if i.strip()]
-        else:
-            ingredients = [i.strip()
-                           for i in raw_ingredients.split(',') if i.strip()]
-        cleaned_data['ingredients'] = ingredients
+        # Same splitting rules as the stored ingredient rows
+        cleaned_data['ingredients'] = split_ingredient_lines(
+            self.data.get('ingredients_text', ''))
 
         raw_instructions = self.data.get('instructions_text', '')
         instructions = [line.strip()
@@ -246,10 +296,19 @@ class RecipeForm(forms.ModelForm):
 
     def save(self, commit=True, created_by=None):
         instance = super().save(commit=False)
-        instance.ingredients = self.cleaned_data.get('ingredients', [])
-        instance.instructions = self.cleaned_data.get('instructions', [])
+        # Stored text is kept while its lines are unchanged, so such an
+        # edit does not count as a change to them (see mealapp.signals)
+        for field, split in (('ingredients', split_ingredient_lines),
+                             ('instructions', split_instruction_lines)):
+            lines = self.cleaned_data.get(field, [])
+            if lines != split(getattr(instance, field)):
+                setattr(instance, field, lines)
+        apply_cleared_image(self, 'image_url')
         if created_by:
             instance.created_by = created_by
         if commit:
+            # Only changed columns are written (TrackedFieldsMixin), so
+            # an image set by a background upload since the recipe was
+            # loaded is kept unless the image was cleared here
             instance.save()
         return instance
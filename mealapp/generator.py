@@ -0,0 +1,200 @@
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from .catalog import get_catalog_version
+from .models import MEAL_SLOTS, NUTRITION_FIELDS, Recipe
+from .planning import upsert_meal_plans
+
+# Used when the user has no profile or an incomplete one
+DEFAULT_CALORIE_GOAL = 2000
+
+# Share of the daily calorie goal each slot aims for
+SLOT_SHARES = np.array([0.25, 0.35, 0.30, 0.10])
+
+# Share of calories from protein, carbs and fat and their kcal per gram
+MACRO_SPLIT = {'protein': (0.25, 4), 'carbs': (0.50, 4), 'fat': (0.25, 9)}
+FIBER_TARGET = 30
+
+# Relative weight of each NUTRITION_FIELDS deviation in the score
+WEIGHTS = np.array([4.0, 1.0, 1.0, 1.0, 0.5])
+
+# Recipes kept per slot before combinations are scored, so a day scores
+# CANDIDATES_PER_SLOT ** 4 combinations instead of the full cross product
+CANDIDATES_PER_SLOT = 12
+
+# Variety: a recipe appears at most MAX_REPEATS times per generated
+# week and never on two consecutive days while alternatives exist
+MAX_REPEATS = 2
+REPEAT_PENALTY = 0.5
+BLOCKED = 1e6
+
+# Random noise added to the shortlist so regenerating gives new plans
+JITTER = 0.05
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def nutrition_targets(calorie_goal):
+    """Daily (calories, protein, carbs, fat, fiber) targets"""
+    goal = calorie_goal or DEFAULT_CALORIE_GOAL
+    targets = [goal]
+    for field in NUTRITION_FIELDS[1:]:
+        if field == 'fiber':
+            targets.append(FIBER_TARGET)
+        else:
+            share, kcal_per_gram = MACRO_SPLIT[field]
+            targets.append(goal * share / kcal_per_gram)
+    return np.array(targets, dtype=float)
+
+
+class RecipeMatrix:
+    """
+    The catalog as one (n, 5) nutrition matrix per meal slot, in
+    NUTRITION_FIELDS column order, with the matching recipe ids.
+    """
+
+    def __init__(self, version, ids, categories, values):
+        self.version = version
+        ids = np.asarray(ids, dtype=np.int64)
+        categories = np.asarray(categories)
+        values = np.nan_to_num(np.asarray(values, dtype=float).reshape(
+            len(ids), len(NUTRITION_FIELDS)))
+        self.ids = []
+        self.values = []
+        for slot in MEAL_SLOTS:
+            mask = categories == slot
+            self.ids.append(ids[mask])
+            self.values.append(values[mask])
+
+    @classmethod
+    def from_database(cls, version=None):
+        rows = list(Recipe.objects.order_by('id').values_list(
+            'id', 'category', *NUTRITION_FIELDS))
+        return cls(
+            version,
+            [row[0] for row in rows],
+            [row[1] for row in rows],
+            [row[2:] for row in rows])
+
+
+def get_recipe_matrix():
+    """Return this worker's matrix, rebuilding it if the catalog moved"""
+    global _matrix
+    version = get_catalog_version()
+    matrix = _matrix
+    if matrix is not None and matrix.version == version:
+        return matrix
+    with _matrix_lock:
+        if _matrix is None or _matrix.version != version:
+            _matrix = RecipeMatrix.from_database(version)
+        return _matrix
+
+
+class MealPlanGenerator:
+    """
+    Pick a breakfast, lunch, dinner and snack per day whose summed
+    nutrition is closest to the targets, day after day for a week.
+    """
+
+    def __init__(self, matrix, calorie_goal, seed=None):
+        self.matrix = matrix
+        self.targets = nutrition_targets(calorie_goal)
+        self.rng = np.random.default_rng(seed)
+
+    def _deviation(self, totals, targets):
+        # Weighted squared deviation relative to the daily targets
+        return ((totals - targets) / self.targets) ** 2 @ WEIGHTS
+
+    def _shortlist(self, slot, usage, previous):
+        """Indices of the recipes closest to the slot's share"""
+        score = self._slot_scores[slot] + usage * REPEAT_PENALTY
+        score[usage >= MAX_REPEATS] += BLOCKED
+        if previous is not None:
+            score[previous] += BLOCKED
+        score += self.rng.random(len(score)) * JITTER
+        count = min(CANDIDATES_PER_SLOT, len(score))
+        return np.argpartition(score, count - 1)[:count]
+
+    def generate(self, days=7):
+        """
+        Return one dict per day mapping each slot to a recipe id (None
+        when the category is empty) plus the day's nutrition totals.
+        """
+        # Distance of every recipe to its slot's share, same every day
+        self._slot_scores = [
+            self._deviation(values, self.targets * share)
+            for values, share in zip(self.matrix.values, SLOT_SHARES)
+        ]
+        previous = [None] * len(MEAL_SLOTS)
+        plans = []
+        for day in range(days):
+            if day % 7 == 0:
+                # Repeat limits apply per week
+                usage = [np.zeros(len(ids), dtype=int)
+                         for ids in self.matrix.ids]
+            candidates = []
+            blocks = []
+            for slot in range(len(MEAL_SLOTS)):
+                if len(self.matrix.ids[slot]):
+                    shortlist = self._shortlist(
+                        slot, usage[slot], previous[slot])
+                    block = self.matrix.values[slot][shortlist]
+                else:
+                    shortlist = None
+                    block = np.zeros((1, len(NUTRITION_FIELDS)))
+                candidates.append(shortlist)
+                blocks.append(block)
+
+            # (k, k, k, k, 5) sums of every shortlisted combination
+            totals = (blocks[0][:, None, None, None, :]
+                      + blocks[1][None, :, None, None, :]
+                      + blocks[2][None, None, :, None, :]
+                      + blocks[3][None, None, None, :, :])
+            scores = self._deviation(totals, self.targets)
+            best = np.unravel_index(np.argmin(scores), scores.shape)
+
+            plan = {}
+            for slot, name in enumerate(MEAL_SLOTS):
+                if candidates[slot] is None:
+                    plan[name] = None
+                    continue
+                index = candidates[slot][best[slot]]
+                usage[slot][index] += 1
+                previous[slot] = index
+                plan[name] = int(self.matrix.ids[slot][index])
+            plan['totals'] = {
+                field: round(float(value), 1)
+                for field, value in zip(NUTRITION_FIELDS, totals[best])
+            }
+            plans.append(plan)
+        return plans
+
+
+def calorie_goal_for(user):
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return DEFAULT_CALORIE_GOAL
+    return (profile.daily_calorie_goal
+            or profile.calculate_daily_calorie_needs()
+            or DEFAULT_CALORIE_GOAL)
+
+
+def generate_meal_plans(user, start, days=7, seed=None):
+    """Generated plans for `days` consecutive days from `start`"""
+    generator = MealPlanGenerator(
+        get_recipe_matrix(), calorie_goal_for(user), seed=seed)
+    plans = generator.generate(days)
+    for offset, plan in enumerate(plans):
+        plan['day'] = start + timedelta(days=offset)
+    return plans
+
+
+def save_meal_plans(user, plans):
+    """Write generated plans, replacing whatever those days held"""
+    return upsert_meal_plans(user, {
+        plan['day']: {slot: plan[slot] for slot in MEAL_SLOTS}
+        for plan in plans
+    })
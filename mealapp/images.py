@@ -0,0 +1,534 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote, unquote
+
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import requests
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import ImageManifest, Recipe
+
+DEFAULT_IMAGE = 'default.jpg'
+CLOUDINARY_HOST = 'cloudinary.com'
+
+# Rows per UPDATE when image URLs are written back
+SAVE_BATCH_SIZE = 500
+
+# Seconds to wait on a source image host while hashing its image
+FETCH_TIMEOUT = 30
+
+# Largest page the Admin API's resource listing returns
+LIST_PAGE_SIZE = 500
+
+# How CloudinaryField stores an image: "image/upload/" + a delivery URL
+# when a URL was assigned, or "image/upload/[v<version>/]<public_id>.<fmt>"
+# for its own uploads. Delivery URLs look like
+# https://res.cloudinary.com/<cloud>/image/upload/[transformations/]
+# [v<version>/]<public_id>[.<format>][?query]
+STORED_IMAGE_RE = re.compile(
+    r'^(?:image/upload/)?'
+    r'(?:https?://res\.cloudinary\.com/(?P<cloud>[^/]+)/image/upload/)?'
+    r'(?:[a-z]{1,3}_[^/]*/)*(?:v(?P<version>\d+)/)?'
+    r'(?P<public_id>[^?#]+?)(?:\.(?P<format>[A-Za-z0-9]+))?(?:[?#].*)?$')
+FIELD_PREFIX = 'image/upload/'
+
+# Renditions stored on Recipe.image_variants. Cards are at most ~400px
+# wide and 250px high in the three column grid (layouts.css), heroes
+# fill the detail card. Every rendition lets Cloudinary pick the format
+# and quality.
+DELIVERY = 'f_auto,q_auto'
+VARIANT_TRANSFORMS = {
+    'thumb': 'c_fill,g_auto,w_160,h_120',
+    'card': 'c_fill,g_auto,w_480,h_320',
+    'hero': 'c_limit,w_1200',
+}
+SRCSET_WIDTHS = (320, 480, 640, 960)
+SRCSET_TRANSFORM = 'c_fill,g_auto,ar_3:2,w_{width}'
+# A blurred 24x16 JPEG of a few hundred bytes, shown until the card loads
+PLACEHOLDER_TRANSFORM = 'c_fill,g_auto,w_24,h_16,e_blur:200,q_30,f_jpg'
+MAX_PLACEHOLDER_BYTES = 2048
+
+# Failures worth another attempt; anything else (bad source URL, auth)
+# fails the recipe straight away. Network errors surface as GeneralError.
+RETRYABLE_ERRORS = (
+    cloudinary.exceptions.RateLimited,
+    cloudinary.exceptions.GeneralError,
+    requests.ConnectionError,
+    requests.Timeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def pending_uploads(batch_size=SAVE_BATCH_SIZE):
+    """
+    Yield (id, title, source_url) of recipes whose image is a URL on
+    another host, in keyset batches. The raw column is read so the URL is
+    not reparsed as a Cloudinary resource.
+    """
+    recipes = Recipe.objects.annotate(
+        source=Cast('image_url', CharField())).filter(
+        source__contains='://').exclude(source__contains=CLOUDINARY_HOST)
+    last_id = 0
+    while True:
+        rows = list(recipes.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'title', 'source')[:batch_size])
+        if not rows:
+            return
+        for recipe_id, title, source in rows:
+            yield recipe_id, title, source.removeprefix(FIELD_PREFIX)
+        last_id = rows[-1][0]
+
+
+def recipe_image_urls(chunk_size=2000):
+    """Stream (id, title, raw image_url) of every recipe"""
+    return Recipe.objects.annotate(
+        source=Cast('image_url', CharField())).order_by('id').values_list(
+        'id', 'title', 'source').iterator(chunk_size=chunk_size)
+
+
+def parse_stored_image(value):
+    """
+    (cloud_name, public_id) of a stored Cloudinary image; cloud_name is
+    None for the field's own uploads. None for other hosts.
+    """
+    match = STORED_IMAGE_RE.match(value or '')
+    if match is None or ('://' in value and not match['cloud']):
+        return None
+    # Delivery URLs are percent-encoded, listed public ids are not
+    return match['cloud'], unquote(match['public_id'])
+
+
+def image_source(value):
+    """
+    A stored image_url value without the prefix CloudinaryField adds
+    when a loaded URL is saved again, to tell when the image changed
+    """
+    return (value or '').removeprefix(FIELD_PREFIX)
+
+
+def image_variants(value, cloud_name=None):
+    """
+    Rendition URLs for a stored image_url value: thumb, card and hero, a
+    card srcset and a blurred placeholder, plus the source they were
+    derived from. Built by string formatting, without the SDK. Images on
+    other hosts use their own URL for every rendition; the default image
+    has none.
+    """
+    variants = {'source': image_source(value)}
+    if not value or value == DEFAULT_IMAGE:
+        return variants
+    match = STORED_IMAGE_RE.match(value)
+    if match is None or ('://' in value and not match['cloud']):
+        url = value.removeprefix(FIELD_PREFIX)
+        variants.update(thumb=url, card=url, hero=url)
+        return variants
+
+    cloud = match['cloud'] or cloud_name or cloudinary.config().cloud_name
+    path = quote(unquote(match['public_id']))
+    if match['version']:
+        path = f"v{match['version']}/{path}"
+
+    def url(transform, delivery=DELIVERY):
+        transform = f'{transform},{delivery}' if delivery else transform
+        return (f'https://res.{CLOUDINARY_HOST}/{cloud}/image/upload/'
+                f'{transform}/{path}')
+
+    for name, transform in VARIANT_TRANSFORMS.items():
+        variants[name] = url(transform)
+    variants['srcset'] = ', '.join(
+        f'{url(SRCSET_TRANSFORM.format(width=width))} {width}w'
+        for width in SRCSET_WIDTHS)
+    variants['placeholder'] = url(PLACEHOLDER_TRANSFORM, delivery=None)
+    return variants
+
+
+def inline_placeholder(url, session=requests):
+    """
+    The placeholder image at `url` as a data URI, so cards need no extra
+    request for it. Returns the URL unchanged if the image is too large.
+    """
+    response = session.get(url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    if len(response.content) > MAX_PLACEHOLDER_BYTES:
+        return url
+    content_type = response.headers.get('Content-Type', 'image/jpeg')
+    encoded = base64.b64encode(response.content).decode()
+    return f'data:{content_type};base64,{encoded}'
+
+
+def save_image_urls(urls, batch_size=SAVE_BATCH_SIZE):
+    """
+    Write {recipe_id: url} and its renditions with bulk_update. Bumps
+    updated_at (recipe ETags) and the catalog version, as the skipped
+    save signals would.
+    """
+    if not urls:
+        return 0
+    now = timezone.now()
+    Recipe.objects.bulk_update([
+        Recipe(id=recipe_id, image_url=url,
+               image_variants=image_variants(url), updated_at=now)
+        for recipe_id, url in urls.items()
+    ], ['image_url', 'image_variants', 'updated_at'], batch_size=batch_size)
+    bump_catalog_version()
+    return len(urls)
+
+
+class TokenBucket:
+    """
+    Thread-safe rate limiter: `rate` acquisitions per second on average,
+    with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+
+
+class CloudinaryUploader:
+    """Hashes source images and uploads them to Cloudinary"""
+
+    def digest(self, source):
+        """SHA-256 of the image at `source`, streamed"""
+        digest = hashlib.sha256()
+        with requests.get(
+                source, stream=True, timeout=FETCH_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(64 * 1024):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def upload(self, source, public_id, overwrite=True, folder='recipes'):
+        """
+        {'public_id', 'version', 'format', 'secure_url'} of the uploaded
+        image. `source` is a URL, a local file path or the image bytes.
+        """
+        result = cloudinary.uploader.upload(
+            source,
+            public_id=public_id,
+            folder=folder,
+            overwrite=overwrite,
+            resource_type='image'
+        )
+        return {key: result.get(key)
+                for key in ('public_id', 'version', 'format', 'secure_url')}
+
+
+def with_retry(call, retries=5, backoff=1.0, bucket=None, sleep=time.sleep):
+    """
+    call() with up to `retries` retries of RETRYABLE_ERRORS, sleeping
+    with exponential backoff and full jitter in between. Every attempt
+    takes a token from `bucket` first.
+    """
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            return call()
+        except RETRYABLE_ERRORS:
+            if attempt == retries:
+                raise
+            sleep(random.uniform(0, backoff * 2 ** attempt))
+
+
+def upload_with_retry(uploader, source, public_id, retries=5, backoff=1.0,
+                      bucket=None, sleep=time.sleep, overwrite=True,
+                      folder='recipes'):
+    return with_retry(
+        lambda: uploader.upload(source, public_id, overwrite, folder),
+        retries, backoff, bucket, sleep)
+
+
+def run_concurrently(jobs, task, workers=8):
+    """
+    Yield (job, result, error) as task(job) finishes on a thread pool.
+    Jobs are pulled lazily, at most two per worker in flight, so a large
+    catalog is never queued up front.
+    """
+    jobs = iter(jobs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while True:
+            for job in jobs:
+                running[pool.submit(task, job)] = job
+                if len(running) >= workers * 2:
+                    break
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                error = future.exception()
+                yield job, None if error else future.result(), error
+
+
+class UploadLog:
+    """
+    Append-only JSON lines of finished uploads and the image each one
+    replaces, written before the database is updated. A rerun first saves
+    what the last run uploaded but never wrote, and skips recipes that
+    failed for good.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def read(self):
+        """({recipe_id: (url, source)}, {failed recipe_id: error})"""
+        uploaded, failed = {}, {}
+        try:
+            with open(self.path) as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a crashed run
+                        continue
+                    if entry.get('url'):
+                        uploaded[entry['id']] = (
+                            entry['url'], entry.get('source'))
+                        failed.pop(entry['id'], None)
+                    else:
+                        failed[entry['id']] = entry.get('error', '')
+        except OSError:
+            pass
+        return uploaded, failed
+
+    def record(self, recipe_id, url=None, error=None, source=None):
+        line = json.dumps({'id': recipe_id, 'url': url, 'error': error,
+                           'source': source})
+        with self.lock, open(self.path, 'a') as handle:
+            handle.write(line + '\n')
+            handle.flush()
+
+    def compact(self, failed):
+        """
+        Keep only the {recipe_id: error} failures, once every upload in
+        the log is in the database
+        """
+        if not failed:
+            self.remove()
+            return
+        partial = f'{self.path}.tmp'
+        with self.lock, open(partial, 'w') as handle:
+            for recipe_id, error in failed.items():
+                handle.write(json.dumps(
+                    {'id': recipe_id, 'url': None, 'error': error}) + '\n')
+        os.replace(partial, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def unsaved_uploads(uploaded):
+    """
+    {recipe_id: url} of logged {recipe_id: (url, source)} uploads whose
+    recipe still has the image the upload replaces. Recipes whose image
+    changed since (or was saved already) are left alone.
+    """
+    current = dict(Recipe.objects.filter(pk__in=uploaded).annotate(
+        source=Cast('image_url', CharField())).values_list('id', 'source'))
+    return {
+        recipe_id: url for recipe_id, (url, source) in uploaded.items()
+        if source and recipe_id in current
+        and current[recipe_id].removeprefix(FIELD_PREFIX) == source
+    }
+
+
+def sync_batch(jobs, uploader, public_id_for, workers=8, retries=5,
+               backoff=1.0, bucket=None, rehash=False):
+    """
+    Bring a batch of (id, title, source) jobs onto Cloudinary using the
+    image manifest:
+      - a recipe whose source URL is unchanged keeps its asset without
+        any network call (unless `rehash`)
+      - other sources are downloaded and hashed; content already in the
+        manifest is shared instead of uploaded
+      - new content is uploaded once, under a content-addressed public
+        id, however many recipes in the batch use it
+    Returns ({recipe_id: unsaved ImageManifest}, [(job, error)], Counter
+    of unchanged / shared / uploaded recipes).
+    """
+    stats = Counter()
+    entries = {}
+    failures = []
+
+    known = ImageManifest.objects.in_bulk(
+        [job[0] for job in jobs], field_name='recipe_id')
+    to_hash = []
+    for job in jobs:
+        entry = known.get(job[0])
+        if entry and entry.source_url == job[2] and not rehash:
+            entries[job[0]] = entry
+            stats['unchanged'] += 1
+        else:
+            to_hash.append(job)
+
+    hashes = {}
+    for job, digest, error in run_concurrently(
+            to_hash,
+            lambda job: with_retry(
+                lambda: uploader.digest(job[2]), retries, backoff),
+            workers):
+        if error:
+            failures.append((job, error))
+        else:
+            hashes[job] = digest
+
+    assets = {}
+    for entry in ImageManifest.objects.filter(
+            content_hash__in=set(hashes.values())).order_by('id'):
+        assets.setdefault(entry.content_hash, entry)
+    uploads = {}
+    for job, digest in hashes.items():
+        if digest not in assets:
+            uploads.setdefault(digest, job)
+
+    for (digest, job), result, error in run_concurrently(
+            uploads.items(),
+            lambda item: upload_with_retry(
+                uploader, item[1][2],
+                f'{public_id_for(*item[1][:2])}_{item[0][:12]}',
+                retries, backoff, bucket, overwrite=False),
+            workers):
+        if error:
+            failures.extend(
+                (other, error) for other, other_digest in hashes.items()
+                if other_digest == digest)
+        else:
+            assets[digest] = ImageManifest(
+                public_id=result['public_id'], version=result['version'],
+                secure_url=result['secure_url'])
+
+    for job, digest in hashes.items():
+        asset = assets.get(digest)
+        if asset is None:
+            continue
+        if uploads.get(digest) is job:
+            stats['uploaded'] += 1
+        elif known.get(job[0]) and known[job[0]].content_hash == digest:
+            stats['unchanged'] += 1
+        else:
+            stats['shared'] += 1
+        entries[job[0]] = ImageManifest(
+            recipe_id=job[0], source_url=job[2], content_hash=digest,
+            public_id=asset.public_id, version=asset.version,
+            secure_url=asset.secure_url)
+    return entries, failures, stats
+
+
+def save_manifest(entries):
+    """Upsert new manifest rows, one per recipe; stored rows are skipped"""
+    ImageManifest.objects.bulk_create(
+        [entry for entry in entries if entry.pk is None],
+        update_conflicts=True, unique_fields=['recipe'],
+        update_fields=['source_url', 'content_hash', 'public_id', 'version',
+                       'secure_url', 'updated_at'])
+
+
+class CloudinaryLister:
+    """One page of the Admin API's upload listing under a prefix"""
+
+    def list_page(self, prefix, cursor=None, page_size=LIST_PAGE_SIZE):
+        """([public_id, ...], next_cursor or None)"""
+        options = {'type': 'upload', 'resource_type': 'image',
+                   'prefix': prefix, 'max_results': page_size}
+        if cursor:
+            options['next_cursor'] = cursor
+        result = cloudinary.api.resources(**options)
+        return ([resource['public_id'] for resource in result['resources']],
+                result.get('next_cursor'))
+
+
+def list_public_ids(lister, prefix, page_size=LIST_PAGE_SIZE, retries=5,
+                    backoff=1.0, bucket=None):
+    """Every public id under `prefix`, following the listing cursor"""
+    public_ids = set()
+    cursor = None
+    while True:
+        page, cursor = with_retry(
+            lambda: lister.list_page(prefix, cursor, page_size),
+            retries, backoff, bucket)
+        public_ids.update(page)
+        if not cursor:
+            return public_ids
+
+
+def reconcile_images(public_ids, recipes, cloud_name, prefix):
+    """
+    Compare the listed `public_ids` with (id, title, stored image) recipe
+    rows in one pass. Returns a dict of:
+      valid       recipes whose image exists
+      missing     [(id, title, public_id)] not found under the prefix
+      mismatched  [(id, title, value, reason)] another cloud, outside
+                  the prefix, or an unparseable Cloudinary URL
+      external    recipes still on another host or the default image
+      orphaned    [public_id] listed but used by no recipe
+    """
+    report = {'checked': 0, 'valid': 0, 'missing': [], 'mismatched': [],
+              'external': 0}
+    referenced = set()
+    for recipe_id, title, value in recipes:
+        report['checked'] += 1
+        if not value or value == DEFAULT_IMAGE:
+            report['external'] += 1
+            continue
+        parsed = parse_stored_image(value)
+        if parsed is None:
+            if CLOUDINARY_HOST in value:
+                report['mismatched'].append(
+                    (recipe_id, title, value, 'unparseable URL'))
+            else:
+                report['external'] += 1
+            continue
+        cloud, public_id = parsed
+        if cloud and cloud != cloud_name:
+            reason = f'cloud {cloud}, expected {cloud_name}'
+        elif not public_id.startswith(prefix):
+            reason = f'outside {prefix}'
+        else:
+            referenced.add(public_id)
+            if public_id in public_ids:
+                report['valid'] += 1
+            else:
+                report['missing'].append((recipe_id, title, public_id))
+            continue
+        report['mismatched'].append((recipe_id, title, value, reason))
+    report['orphaned'] = sorted(public_ids - referenced)
+    return report
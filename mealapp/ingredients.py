@@ -0,0 +1,188 @@
+import ast
+import re
+from fractions import Fraction
+
+from django.db import transaction
+
+from .models import Ingredient, RecipeIngredient, RecipeStep
+
+# Canonical unit for each accepted spelling
+UNIT_ALIASES = {
+    'cup': 'cup', 'cups': 'cup', 'c': 'cup',
+    'tbsp': 'tbsp', 'tbs': 'tbsp', 'tablespoon': 'tbsp',
+    'tablespoons': 'tbsp', 'tbsps': 'tbsp',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsps': 'tsp',
+    'g': 'g', 'gram': 'g', 'grams': 'g', 'gr': 'g',
+    'kg': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'mg': 'mg',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml',
+    'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'pinch': 'pinch', 'pinches': 'pinch',
+    'clove': 'clove', 'cloves': 'clove',
+    'slice': 'slice', 'slices': 'slice',
+    'can': 'can', 'cans': 'can',
+    'handful': 'handful', 'handfuls': 'handful',
+    'packet': 'packet', 'packets': 'packet', 'pack': 'packet',
+}
+
+# Preparation words dropped from the normalized ingredient name
+DESCRIPTORS = {
+    'large', 'small', 'medium', 'fresh', 'freshly', 'finely', 'roughly',
+    'chopped', 'diced', 'minced', 'sliced', 'grated', 'peeled',
+}
+
+UNICODE_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅛': '1/8',
+}
+
+# "2", "0.5", "1/2", "2 1/2", "1-2" (ranges keep the lower bound)
+QUANTITY_RE = re.compile(
+    r'^\s*(?P<qty>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)'
+    r'(?:\s*(?:-|to)\s*(?:\d+(?:\.\d+)?))?\s*')
+STRIP_RE = re.compile(r"[\[\]\'\"]")
+PAREN_RE = re.compile(r'\([^)]*\)')
+
+
+def _as_list(raw):
+    """Stored lists (e.g. "['2 Egg', '1 cup milk']") come back as lists"""
+    if isinstance(raw, (list, tuple)):
+        return [str(item).strip() for item in raw if str(item).strip()]
+    text = (raw or '').strip()
+    if text.startswith('['):
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return None
+        if isinstance(value, (list, tuple)):
+            return [str(item).strip() for item in value if str(item).strip()]
+    return None
+
+
+def split_ingredient_lines(raw):
+    """Split stored or submitted ingredients into one line per item"""
+    items = _as_list(raw)
+    if items is not None:
+        return items
+    text = STRIP_RE.sub('', raw or '')
+    separator = '\n' if '\n' in text else ','
+    return [item.strip() for item in text.split(separator) if item.strip()]
+
+
+def split_instruction_lines(raw):
+    """Split stored instructions into ordered steps"""
+    items = _as_list(raw)
+    if items is not None:
+        return items
+    text = STRIP_RE.sub('', raw or '')
+    separator = '\n' if '\n' in text else '.'
+    return [step.strip() for step in text.split(separator) if step.strip()]
+
+
+def _singular(word):
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes') and len(word) > 4:
+        return word[:-2]
+    if (word.endswith('s') and not word.endswith(('ss', 'us'))
+            and len(word) > 3):
+        return word[:-1]
+    return word
+
+
+def normalize_name(text):
+    """Lowercase, drop notes in brackets and singularize the last word"""
+    text = PAREN_RE.sub(' ', text.lower())
+    text = text.split(',')[0]
+    text = re.sub(r'[^\w\s-]', ' ', text)
+    words = text.split()
+    if words and words[0] == 'of':
+        words = words[1:]
+    # Keep at least one word, e.g. "ground" alone stays "ground"
+    while len(words) > 1 and words[0] in DESCRIPTORS:
+        words = words[1:]
+    if not words:
+        return ''
+    words[-1] = _singular(words[-1])
+    return ' '.join(words)[:100]
+
+
+def parse_ingredient(line):
+    """
+    Parse "2 1/2 cups of rice" into (2.5, 'cup', 'rice').
+    Quantity is None and unit is '' when they cannot be found.
+    """
+    text = line.strip()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f' {fraction}')
+    quantity = None
+    match = QUANTITY_RE.match(text)
+    if match:
+        quantity = float(sum(
+            Fraction(part) for part in match.group('qty').split()))
+        text = text[match.end():]
+
+    unit = ''
+    parts = text.split(None, 1)
+    if parts:
+        candidate = parts[0].lower().rstrip('.')
+        if candidate in UNIT_ALIASES:
+            unit = UNIT_ALIASES[candidate]
+            text = parts[1] if len(parts) > 1 else ''
+    return quantity, unit, normalize_name(text)
+
+
+def sync_recipe_structure(recipes):
+    """
+    Parse the given recipes once and replace their RecipeIngredient and
+    RecipeStep rows. Works in bulk: a fixed number of queries per call
+    regardless of how many recipes are passed in.
+    """
+    recipes = list(recipes)
+    if not recipes:
+        return 0
+
+    parsed = {}
+    names = set()
+    for recipe in recipes:
+        rows = [(line, *parse_ingredient(line))
+                for line in split_ingredient_lines(recipe.ingredients)]
+        steps = split_instruction_lines(recipe.instructions)
+        parsed[recipe.pk] = (rows, steps)
+        names.update(row[3] for row in rows if row[3])
+
+    ingredient_ids = dict(Ingredient.objects.filter(
+        name__in=names).values_list('name', 'id'))
+    missing = names - ingredient_ids.keys()
+    if missing:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name) for name in missing],
+            ignore_conflicts=True)
+        ingredient_ids.update(Ingredient.objects.filter(
+            name__in=missing).values_list('name', 'id'))
+
+    ingredient_rows = []
+    step_rows = []
+    for recipe_id, (rows, steps) in parsed.items():
+        for position, (line, quantity, unit, name) in enumerate(rows):
+            ingredient_rows.append(RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_ids.get(name),
+                position=position,
+                quantity=quantity,
+                unit=unit,
+                original_text=line,
+            ))
+        for position, text in enumerate(steps):
+            step_rows.append(RecipeStep(
+                recipe_id=recipe_id, position=position, text=text))
+
+    with transaction.atomic():
+        RecipeIngredient.objects.filter(recipe_id__in=parsed).delete()
+        RecipeStep.objects.filter(recipe_id__in=parsed).delete()
+        RecipeIngredient.objects.bulk_create(ingredient_rows)
+        RecipeStep.objects.bulk_create(step_rows)
+    return len(parsed)
@@ -0,0 +1,106 @@
+import time
+
+import cloudinary
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from mealapp.catalog import bump_catalog_version
+from mealapp.images import (
+    SAVE_BATCH_SIZE, image_source, image_variants, inline_placeholder,
+    run_concurrently)
+from mealapp.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Store thumbnail, card and hero image URLs, a srcset and an '
+            'inline placeholder on every recipe whose image changed since '
+            'they were derived (or was loaded from a fixture), in batches. '
+            'Placeholders still stored as URLs are inlined too.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SAVE_BATCH_SIZE,
+            help='Recipes read and written per batch.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Derive the renditions of every recipe again.')
+        parser.add_argument(
+            '--url-placeholders', action='store_true',
+            help='Keep placeholders as Cloudinary URLs instead of '
+                 'downloading each and storing it as a data URI; cards '
+                 'then make a request for it.')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Concurrent placeholder downloads.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        cloud_name = cloudinary.config().cloud_name
+        scanned = updated = failed = 0
+        last_id = 0
+        while True:
+            # Keyset batches on id; the raw column, not the parsed field
+            rows = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .annotate(source=Cast('image_url', CharField()))
+                .values_list('id', 'source', 'image_variants')
+                [:options['batch_size']])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+            changed = {}
+            placeholders = []
+            for recipe_id, source, variants in rows:
+                if (options['force']
+                        or variants.get('source') != image_source(source)):
+                    variants = changed[recipe_id] = image_variants(
+                        source, cloud_name)
+                if (not options['url_placeholders']
+                        and variants.get('placeholder', '').startswith(
+                            'http')):
+                    changed[recipe_id] = variants
+                    placeholders.append((recipe_id, variants))
+
+            if placeholders:
+                results = run_concurrently(
+                    placeholders, lambda job: inline_placeholder(
+                        job[1]['placeholder']), options['workers'])
+                for (recipe_id, variants), data_uri, error in results:
+                    if error:
+                        failed += 1
+                        self.stdout.write(self.style.WARNING(
+                            f"Placeholder of recipe #{recipe_id} kept as "
+                            f"a URL: {error}"))
+                    else:
+                        variants['placeholder'] = data_uri
+
+            if changed:
+                # bulk_update skips the save signals; updated_at feeds
+                # the recipe ETags
+                now = timezone.now()
+                with transaction.atomic():
+                    Recipe.objects.bulk_update([
+                        Recipe(id=recipe_id, image_variants=variants,
+                               updated_at=now)
+                        for recipe_id, variants in changed.items()
+                    ], ['image_variants', 'updated_at'],
+                        batch_size=options['batch_size'])
+                updated += len(changed)
+            self.stdout.write(
+                f"Scanned {scanned} recipes, updated {updated}...")
+
+        if updated:
+            bump_catalog_version()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled image variants of {updated} recipes "
+            f"({elapsed:.1f}s)"))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"{failed} placeholders could not be downloaded; rerun "
+                f"to retry them"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mealapp.ingredients import sync_recipe_structure
+from mealapp.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Parse every recipe\'s ingredients and instructions into '
+            'RecipeIngredient and RecipeStep rows, in batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Recipes parsed and written per batch.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        processed = 0
+        last_id = 0
+        while True:
+            # Keyset batches on id; only the columns the parser needs
+            batch = list(
+                Recipe.objects.filter(id__gt=last_id)
+                .only('id', 'ingredients', 'instructions')
+                .order_by('id')[:batch_size])
+            if not batch:
+                break
+            processed += sync_recipe_structure(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"Processed {processed} recipes...")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {processed} recipes in {elapsed:.1f}s"))
@@ -0,0 +1,103 @@
+import statistics
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from mealapp.models import UserProfile
+from mealapp.signals import save_user_profile
+
+
+def save_every_profile(sender, instance, **kwargs):
+    """
+    The receiver before change tracking, as the baseline: every User save
+    loads the profile and writes all of its columns
+    """
+    if hasattr(instance, 'profile'):
+        instance.profile.save(update_fields=[
+            field.name for field in UserProfile._meta.concrete_fields
+            if not field.primary_key])
+
+
+class Command(BaseCommand):
+    help = ('Log synthetic users in through the full login stack '
+            '(session, last_login update, signals) and report queries and '
+            'time per login, against a baseline run with the profile '
+            'saved on every User save. All synthetic rows are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=200,
+            help='Synthetic users, each logged in once.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # bulk_create skips the profile signal; add profiles directly
+            users = User.objects.bulk_create([
+                User(username=f'__login_benchmark_{index}__')
+                for index in range(options['users'])
+            ])
+            users = list(User.objects.filter(
+                username__startswith='__login_benchmark_'))
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, age=30, gender='other',
+                            height_cm=170, weight_kg=70)
+                for user in users
+            ])
+
+            # Baseline first, so both runs see equally warm caches
+            post_save.disconnect(save_user_profile, sender=User)
+            post_save.connect(save_every_profile, sender=User)
+            try:
+                baseline = self.run(users)
+            finally:
+                post_save.disconnect(save_every_profile, sender=User)
+                post_save.connect(save_user_profile, sender=User)
+            tracked = self.run(users)
+            transaction.set_rollback(True)
+
+        count = len(users) or 1
+        self.stdout.write(f"{len(users)} logins, per login:")
+        for label, (queries, timings, _tables) in (
+                ('baseline', baseline), ('tracked', tracked)):
+            self.stdout.write(
+                f"  {label:<8}  {queries / count:5.1f} queries  "
+                f"{statistics.median(timings or [0]):6.2f} ms (median)")
+        self.stdout.write("Statements per login (baseline -> tracked):")
+        statements = baseline[2] | tracked[2]
+        for statement, _total in statements.most_common():
+            self.stdout.write(
+                f"  {baseline[2][statement] / count:5.2f} -> "
+                f"{tracked[2][statement] / count:5.2f}  {statement}")
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back.'))
+
+    def run(self, users):
+        """Log each user in once: (queries, timings in ms, statements)"""
+        timings = []
+        tables = Counter()
+        queries = 0
+        for user in users:
+            # A fresh instance per login, as the auth backend loads it
+            user = User.objects.get(pk=user.pk)
+            client = Client()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                client.force_login(user)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries += len(captured)
+            for query in captured:
+                words = query['sql'].split()
+                tables[f'{words[0]} {self.table(words)}'] += 1
+        return queries, timings, tables
+
+    def table(self, words):
+        # The first quoted identifier after FROM / INTO / UPDATE
+        for keyword in ('FROM', 'INTO', 'UPDATE'):
+            if keyword in words:
+                return words[words.index(keyword) + 1].strip('"')
+        return ''
@@ -0,0 +1,58 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from mealapp.generator import MealPlanGenerator, RecipeMatrix
+from mealapp.models import MEAL_SLOTS
+
+
+class Command(BaseCommand):
+    help = ('Time weekly meal plan generation on a synthetic in-memory '
+            'catalog. No database rows are touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Size of the synthetic catalog.')
+        parser.add_argument(
+            '--weeks', type=int, default=50,
+            help='Weeks generated; the median and p95 are reported.')
+        parser.add_argument('--goal', type=float, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        size = options['recipes']
+        # NUTRITION_FIELDS columns; macros loosely follow the calories
+        calories = rng.uniform(50, 900, size)
+        values = np.column_stack([
+            calories,
+            calories * rng.uniform(0.05, 0.35, size) / 4,
+            calories * rng.uniform(0.2, 0.7, size) / 4,
+            calories * rng.uniform(0.1, 0.45, size) / 9,
+            rng.uniform(0, 15, size),
+        ])
+        matrix = RecipeMatrix(
+            None, np.arange(1, size + 1),
+            rng.choice(MEAL_SLOTS, size), values)
+
+        timings = []
+        deviations = []
+        for week in range(options['weeks']):
+            generator = MealPlanGenerator(
+                matrix, options['goal'], seed=options['seed'] + week)
+            started = time.perf_counter()
+            plans = generator.generate(7)
+            timings.append((time.perf_counter() - started) * 1000)
+            deviations.extend(
+                abs(plan['totals']['total_calories'] - options['goal'])
+                for plan in plans)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{size} recipes: median {statistics.median(timings):.2f} ms, "
+            f"p95 {p95:.2f} ms per week; mean calorie deviation "
+            f"{statistics.mean(deviations):.1f} kcal/day")
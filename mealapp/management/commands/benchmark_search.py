@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from mealapp.models import Recipe
+from mealapp.search import IContainsSearchBackend, get_search_backend
+
+WORDS = [
+    'chicken', 'rice', 'oats', 'banana', 'spinach', 'lentil', 'salmon',
+    'quinoa', 'avocado', 'tomato', 'garlic', 'ginger', 'yogurt', 'berry',
+    'almond', 'tofu', 'pepper', 'onion', 'potato', 'egg', 'bread', 'bean',
+    'mushroom', 'cheese', 'lemon', 'honey', 'carrot', 'pasta', 'curry',
+    'broccoli', 'pumpkin', 'coconut', 'mango', 'apple', 'cinnamon',
+]
+UNITS = ['cup', 'tbsp', 'tsp', 'g', 'ml', 'slice']
+CATEGORIES = [choice for choice, _label in Recipe.CATEGORY_CHOICES]
+QUERIES = ['chicken', 'spinach lentil', 'salm', 'coconut curry', 'zucchini']
+
+
+class Command(BaseCommand):
+    help = ('Compare recipe search latency of the full-text backend against '
+            'the legacy icontains path on synthetic catalogs. '
+            'All synthetic rows are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000],
+            help='Catalog sizes to benchmark (ascending).')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Runs per query; the median is reported.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        backend = get_search_backend()
+        legacy = IContainsSearchBackend()
+        self.stdout.write(
+            f"Backend: {type(backend).__name__} ({connection.vendor})")
+
+        with transaction.atomic():
+            author = User.objects.create(username='__search_benchmark__')
+            created = 0
+            for size in sorted(options['sizes']):
+                created += self._populate(author, size - created, rng)
+                for term in QUERIES:
+                    fts_ms, fts_hits = self._time(
+                        backend, term, options['repeat'])
+                    like_ms, like_hits = self._time(
+                        legacy, term, options['repeat'])
+                    self.stdout.write(
+                        f"{size:>8} recipes  {term!r:<18} "
+                        f"fts {fts_ms:8.2f} ms ({fts_hits:>6} hits)  "
+                        f"icontains {like_ms:8.2f} ms ({like_hits:>6} hits)")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back.'))
+
+    def _populate(self, author, count, rng, batch_size=2000):
+        """Bulk insert synthetic recipes (the index triggers fire)"""
+        if count <= 0:
+            return 0
+        for start in range(0, count, batch_size):
+            Recipe.objects.bulk_create([
+                self._recipe(author, rng)
+                for _ in range(min(batch_size, count - start))
+            ])
+        return count
+
+    def _recipe(self, author, rng):
+        main = rng.sample(WORDS, 3)
+        ingredients = [
+            f"{rng.randint(1, 4)} {rng.choice(UNITS)} {word}"
+            for word in rng.sample(WORDS, 6)
+        ]
+        return Recipe(
+            title=' '.join(main).title(),
+            description=f"A simple dish with {main[0]} and {main[1]}",
+            ingredients=', '.join(ingredients),
+            total_calories=rng.uniform(100, 900),
+            protein=rng.uniform(0, 60),
+            carbs=rng.uniform(0, 120),
+            fat=rng.uniform(0, 50),
+            fiber=rng.uniform(0, 20),
+            category=rng.choice(CATEGORIES),
+            created_by=author,
+        )
+
+    def _time(self, backend, term, repeat):
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            hits = len(backend.ranked_ids(term))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), hits
@@ -0,0 +1,104 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mealapp.ingredients import parse_ingredient, split_ingredient_lines
+from mealapp.models import MEAL_SLOTS, MealPlan, Recipe
+from mealapp.shopping import build_shopping_list, ingredients_cache_key
+
+ITEMS = [
+    'chicken breast', 'rice', 'rolled oats', 'banana', 'spinach', 'lentils',
+    'salmon fillet', 'quinoa', 'avocado', 'tomatoes', 'garlic cloves',
+    'ginger', 'greek yogurt', 'blueberries', 'almonds', 'tofu',
+    'red pepper', 'onion', 'potatoes', 'eggs', 'milk', 'olive oil',
+    'butter', 'flour', 'honey', 'carrots', 'pasta', 'coconut milk',
+]
+UNITS = ['cup', 'cups', 'tbsp', 'tsp', 'g', 'kg', 'ml', 'oz', 'lb', '']
+
+
+class Command(BaseCommand):
+    help = ('Time shopping list generation for a month of meal plans: '
+            'parsing free text per request vs. the cached engine. '
+            'All synthetic rows are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=31,
+            help='Length of the planned range.')
+        parser.add_argument(
+            '--recipes', type=int, default=120,
+            help='Synthetic recipes the plans draw from.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Runs per variant; the median is reported.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = date(2030, 1, 1)
+        end = start + timedelta(days=options['days'] - 1)
+
+        with transaction.atomic():
+            user = User.objects.create(username='__shopping_benchmark__')
+            recipes = {slot: [] for slot in MEAL_SLOTS}
+            for index in range(options['recipes']):
+                slot = MEAL_SLOTS[index % len(MEAL_SLOTS)]
+                lines = [
+                    f"{rng.randint(1, 4)} {rng.choice(UNITS)} "
+                    f"{rng.choice(ITEMS)}".replace('  ', ' ')
+                    for _ in range(rng.randint(6, 14))
+                ]
+                recipes[slot].append(Recipe.objects.create(
+                    title=f'Benchmark {index}', description='benchmark',
+                    ingredients='\n'.join(lines), total_calories=400,
+                    protein=20, carbs=50, fat=10, fiber=5, category=slot,
+                    servings=rng.randint(1, 6), created_by=user))
+            MealPlan.objects.bulk_create([
+                MealPlan(user=user, day=start + timedelta(days=offset), **{
+                    f'{slot}_recipe': rng.choice(recipes[slot])
+                    for slot in MEAL_SLOTS})
+                for offset in range(options['days'])
+            ])
+            all_recipes = [r for group in recipes.values() for r in group]
+
+            def legacy():
+                # What a naive view would do: parse every slot's text
+                plans = MealPlan.objects.filter(
+                    user=user, day__range=(start, end)).select_related(
+                    *[f'{slot}_recipe' for slot in MEAL_SLOTS])
+                for plan in plans:
+                    for slot in MEAL_SLOTS:
+                        recipe = getattr(plan, f'{slot}_recipe')
+                        lines = split_ingredient_lines(recipe.ingredients)
+                        for line in lines:
+                            parse_ingredient(line)
+
+            def cold():
+                cache.delete_many([
+                    ingredients_cache_key(recipe.pk, recipe.updated_at)
+                    for recipe in all_recipes])
+                build_shopping_list(user, start, end)
+
+            def warm():
+                build_shopping_list(user, start, end)
+
+            warm()
+            for label, run in (('parse per request', legacy),
+                               ('engine, cold cache', cold),
+                               ('engine, warm cache', warm)):
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    run()
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{options['days']} days  {label:<20} "
+                    f"{statistics.median(timings):8.2f} ms")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark data rolled back.'))
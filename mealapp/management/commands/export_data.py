@@ -0,0 +1,74 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mealapp.export import (
+    COMPRESSIONS, EXPORT_CHUNK_SIZE, EXPORTS, OUTPUT_FORMATS, export_chunks)
+from mealapp.planning import parse_day
+
+
+class Command(BaseCommand):
+    help = ('Export recipes or meal plans (with their recipe titles) as '
+            'NDJSON or CSV, optionally gzip or zstd compressed. Rows are '
+            'streamed from the database and written as they are read, so '
+            'memory use does not grow with the export.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument(
+            '--format', choices=sorted(OUTPUT_FORMATS), default='ndjson')
+        parser.add_argument(
+            '--compress', choices=sorted(COMPRESSIONS),
+            help='Compress the output.')
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write; standard output by default.')
+        parser.add_argument(
+            '--from', dest='since',
+            help='First day included (YYYY-MM-DD): recipe creation date '
+                 'or plan day.')
+        parser.add_argument(
+            '--to', dest='until', help='Last day included (YYYY-MM-DD).')
+        parser.add_argument(
+            '--user', action='append', default=[],
+            help='Only this username\'s rows; may be repeated.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        filters = {'users': options['user'],
+                   'chunk_size': options['chunk_size']}
+        for name in ('since', 'until'):
+            if options[name]:
+                filters[name] = parse_day(options[name])
+                if filters[name] is None:
+                    raise CommandError(
+                        f"{options[name]} is not a YYYY-MM-DD date")
+        try:
+            chunks = export_chunks(
+                options['kind'], options['format'], options['compress'],
+                **filters)
+        except ValueError as error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        written = 0
+        path = options['output']
+        stream = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+        finally:
+            if stream is sys.stdout.buffer:
+                stream.flush()
+            else:
+                stream.close()
+
+        # Progress goes to stderr, keeping stdout for the data
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {options['kind']}: {written / 1e6:.1f} MB in "
+            f"{elapsed:.1f}s"))
@@ -0,0 +1,215 @@
+import json
+import os
+from bisect import bisect_right
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from mealapp.generator import MealPlanGenerator, RecipeMatrix, calorie_goal_for
+from mealapp.models import MEAL_SLOTS, MealPlan
+from mealapp.nutrition import refresh_daily_nutrition
+from mealapp.stats import invalidate_dashboard, refresh_user_stats
+
+SLOT_FIELDS = [f'{slot}_recipe_id' for slot in MEAL_SLOTS]
+
+# Catalog matrix, loaded once per worker process by _init_worker
+_worker_matrix = None
+
+
+def _init_worker():
+    global _worker_matrix
+    import django
+    django.setup()
+    _worker_matrix = RecipeMatrix.from_database()
+
+
+def generate_shard(user_ids, start, seed=None, dry_run=False,
+                   matrix=None):
+    """
+    Generate and upsert a week of plans for one shard of users.
+    Returns (users, plans) counts.
+    """
+    matrix = matrix or _worker_matrix or RecipeMatrix.from_database()
+    users = User.objects.filter(id__in=user_ids).select_related('profile')
+    rows = []
+    for user in users:
+        generator = MealPlanGenerator(
+            matrix, calorie_goal_for(user),
+            seed=None if seed is None else seed + user.id)
+        for offset, plan in enumerate(generator.generate(7)):
+            rows.append(MealPlan(
+                user_id=user.id, day=start + timedelta(days=offset),
+                **{field: plan[slot]
+                   for field, slot in zip(SLOT_FIELDS, MEAL_SLOTS)}))
+
+    if not dry_run and rows:
+        with transaction.atomic():
+            MealPlan.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['user', 'day'],
+                update_fields=SLOT_FIELDS + ['updated_at'])
+            # bulk_create skips the signals keeping DailyNutrition, the
+            # dashboard counters and the dashboard cache in sync
+            refresh_daily_nutrition(MealPlan.objects.filter(
+                user_id__in=user_ids,
+                day__range=(start, start + timedelta(days=6))))
+            refresh_user_stats(user_ids)
+        invalidate_dashboard(*user_ids)
+    return len(users), len(rows)
+
+
+def next_monday(today=None):
+    today = today or date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+class Command(BaseCommand):
+    help = ('Pre-generate a week of meal plans for every active user, '
+            'sharding users across worker processes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', help='First day (YYYY-MM-DD), default next Monday.')
+        parser.add_argument(
+            '--since',
+            help='Only users who logged in on or after this date.')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes; 1 runs in this process.')
+        parser.add_argument(
+            '--shard-size', type=int, default=500,
+            help='Users per shard (one bulk upsert each).')
+        parser.add_argument(
+            '--checkpoint', default='generate_weekly_plans.checkpoint',
+            help='File recording finished shards, used to resume.')
+        parser.add_argument('--seed', type=int)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Generate plans without writing them.')
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['start']) or next_monday()
+        since = self.parse_date(options['since'])
+
+        users = User.objects.filter(is_active=True)
+        if since:
+            users = users.filter(last_login__date__gte=since)
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+
+        # Finished shards are recorded as the id range they covered. Users
+        # are listed in id order, so a range held every matching user in
+        # it; a resume skips the ids inside finished ranges and re-shards
+        # the rest, whatever users were added or removed in between.
+        checkpoint = options['checkpoint']
+        key = f'{start.isoformat()}:{since or "-"}'
+        done = [] if options['dry_run'] else self.load_checkpoint(
+            checkpoint, key)
+        pending_ids = self.unfinished(user_ids, done)
+        if len(pending_ids) < len(user_ids):
+            self.stdout.write(
+                f"Resuming: {len(user_ids) - len(pending_ids)} users "
+                f"already done")
+        size = options['shard_size']
+        shards = [pending_ids[i:i + size]
+                  for i in range(0, len(pending_ids), size)]
+
+        self.stdout.write(
+            f"Generating week of {start} for {len(pending_ids)} users "
+            f"in {len(shards)} shards")
+        started = time.perf_counter()
+        total_users = total_plans = 0
+        for shard, (users_done, plans_done) in self.run(shards, start,
+                                                        options):
+            total_users += users_done
+            total_plans += plans_done
+            if not options['dry_run']:
+                done.append((shard[0], shard[-1]))
+                self.save_checkpoint(checkpoint, key, done)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{total_users} users, {total_plans} plans "
+                f"({total_users / elapsed:.0f} users/sec)")
+
+        elapsed = time.perf_counter() - started
+        if not options['dry_run'] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        rate = total_users / elapsed if elapsed else 0
+        verb = 'Generated (dry run)' if options['dry_run'] else 'Generated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {total_plans} plans for {total_users} users in "
+            f"{elapsed:.1f}s ({rate:.0f} users/sec)"))
+
+    def run(self, shards, start, options):
+        """Yield (shard, result) as shards finish"""
+        args = (start, options['seed'], options['dry_run'])
+        if options['workers'] <= 1:
+            matrix = RecipeMatrix.from_database()
+            for shard in shards:
+                yield shard, generate_shard(shard, *args, matrix=matrix)
+            return
+        # Forked workers must not share the parent's connections
+        connections.close_all()
+        with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(generate_shard, shard, *args): shard
+                for shard in shards
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date: {value} (use YYYY-MM-DD)")
+
+    def merge_ranges(self, done):
+        """
+        Finished (first, last) ranges merged into disjoint ones. Shards cut
+        after a resume can span, and so overlap, earlier finished ranges.
+        """
+        merged = []
+        for first, last in sorted(done):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        return merged
+
+    def unfinished(self, user_ids, done):
+        """The ids outside every finished (first, last) range"""
+        ranges = self.merge_ranges(done)
+        firsts = [first for first, _last in ranges]
+        pending = []
+        for user_id in user_ids:
+            # The only range that can hold user_id starts at or before it
+            index = bisect_right(firsts, user_id) - 1
+            if index < 0 or user_id > ranges[index][1]:
+                pending.append(user_id)
+        return pending
+
+    def load_checkpoint(self, path, key):
+        try:
+            with open(path) as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return []
+        # A checkpoint for another week or filter does not apply
+        if data.get('key') != key:
+            return []
+        return [tuple(pair) for pair in data.get('done', [])
+                if isinstance(pair, list) and len(pair) == 2]
+
+    def save_checkpoint(self, path, key, done):
+        # Write then rename so a crash never leaves a truncated file
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump({'key': key, 'done': self.merge_ranges(done)}, handle)
+        os.replace(temporary, path)
@@ -0,0 +1,141 @@
+import json
+import time
+from collections import Counter
+from itertools import batched
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mealapp.catalog import bump_catalog_version
+from mealapp.recipe_import import (
+    iter_json_records, normalize_recipe, upsert_recipes)
+from mealapp.stats import invalidate_dashboard, refresh_user_stats
+
+
+class Command(BaseCommand):
+    help = ('Import recipes from JSON fixtures or JSON lines files. Files '
+            'are parsed record by record and written in batches, upserting '
+            'on each recipe\'s owner and title, so recipes repeated across '
+            'files (all_recipes.json and the category fixtures) are '
+            'written once and re-imports update in place.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'files', nargs='+',
+            help='Fixture (JSON array) or JSON lines files.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Records validated and written per batch.')
+        parser.add_argument(
+            '--owner',
+            help='Username owning every imported recipe, instead of the '
+                 'records\' created_by.')
+        parser.add_argument(
+            '--skip-structure', action='store_true',
+            help='Do not parse ingredient and step rows; run '
+                 'backfill_recipe_structure afterwards.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate the files without writing.')
+        parser.add_argument(
+            '--show', type=int, default=20,
+            help='Invalid records listed.')
+
+    def handle(self, *args, **options):
+        owner_id = None
+        if options['owner']:
+            try:
+                owner_id = User.objects.get(username=options['owner']).id
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['owner']}")
+
+        started = timezone.now()
+        clock = time.perf_counter()
+        self.counts = Counter()
+        self.show = options['show']
+        self.known_users = set()
+        owners = set()
+        for path in options['files']:
+            try:
+                with open(path, encoding='utf-8') as stream:
+                    records = enumerate(iter_json_records(stream), 1)
+                    for batch in batched(records, options['batch_size']):
+                        rows = self.validate(path, batch, owner_id)
+                        owners.update(row['created_by_id'] for row in rows)
+                        if options['dry_run']:
+                            self.counts['valid'] += len(rows)
+                        else:
+                            self.counts.update(upsert_recipes(
+                                rows, started,
+                                structure=not options['skip_structure']))
+                        read = self.counts['read']
+                        rate = read / (time.perf_counter() - clock)
+                        self.stdout.write(
+                            f"{path}: {read} records read "
+                            f"({rate:.0f} rows/s)...")
+            except OSError as error:
+                raise CommandError(f"Cannot read {path}: {error}")
+            except (json.JSONDecodeError, UnicodeDecodeError) as error:
+                raise CommandError(
+                    f"{path} is not valid JSON: {error}; records before "
+                    f"the error were imported")
+
+        written = self.counts['created'] + self.counts['updated']
+        if written:
+            # bulk_create skipped the save signals
+            refresh_user_stats(owners)
+            invalidate_dashboard(*owners)
+            bump_catalog_version()
+
+        elapsed = time.perf_counter() - clock
+        counts = self.counts
+        rate = counts['read'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {counts['read']} records in {elapsed:.1f}s "
+            f"({rate:.0f} rows/s)"))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Valid: {counts['valid']} (dry run, nothing written)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Created: {counts['created']}, updated: "
+                f"{counts['updated']}, duplicates skipped: "
+                f"{counts['duplicate']}"))
+            if written and options['skip_structure']:
+                self.stdout.write(
+                    "Run backfill_recipe_structure to parse ingredients")
+        if counts['invalid']:
+            self.stdout.write(self.style.ERROR(
+                f"Invalid records skipped: {counts['invalid']}"))
+
+    def validate(self, path, batch, owner_id):
+        """Normalized rows of a batch of (index, record); reports others"""
+        rows = []
+        for index, record in batch:
+            self.counts['read'] += 1
+            try:
+                rows.append((index, normalize_recipe(record, owner_id)))
+            except ValueError as error:
+                self.invalid(path, index, error)
+
+        # Owners are checked once each, in one query per batch
+        unknown = {row['created_by_id'] for _index, row in rows}
+        unknown -= self.known_users
+        if unknown:
+            self.known_users.update(User.objects.filter(
+                id__in=unknown).values_list('id', flat=True))
+        valid = []
+        for index, row in rows:
+            if row['created_by_id'] in self.known_users:
+                valid.append(row)
+            else:
+                self.invalid(
+                    path, index, f"unknown user {row['created_by_id']}")
+        return valid
+
+    def invalid(self, path, index, error):
+        self.counts['invalid'] += 1
+        if self.counts['invalid'] <= self.show:
+            self.stdout.write(self.style.WARNING(
+                f"{path} record {index}: {error}"))
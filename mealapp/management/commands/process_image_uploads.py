@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mealapp.images import run_concurrently
+from mealapp.models import ImageUpload
+from mealapp.uploads import UPLOAD_RETRIES, run_upload
+
+
+class Command(BaseCommand):
+    help = ('Upload staged recipe and profile images the web process did '
+            'not finish, e.g. because it restarted. Images are staged in '
+            'the database, so this can run on any dyno (e.g. from Heroku '
+            'Scheduler).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=300,
+            help='Only take pending uploads staged at least this many '
+                 'seconds ago, leaving fresh ones to the web process.')
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry uploads that failed before.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Concurrent uploads.')
+        parser.add_argument(
+            '--retries', type=int, default=UPLOAD_RETRIES,
+            help='Retries of rate limited or failed requests per image.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        statuses = ['pending', 'failed'] if options['retry_failed'] else [
+            'pending']
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        upload_ids = list(
+            ImageUpload.objects.filter(
+                status__in=statuses, updated_at__lte=cutoff)
+            .order_by('id').values_list('id', flat=True))
+
+        done = failed = 0
+        results = run_concurrently(
+            upload_ids,
+            lambda upload_id: run_upload(upload_id, options['retries']),
+            options['workers'])
+        for upload_id, uploaded, error in results:
+            if uploaded:
+                done += 1
+            else:
+                failed += 1
+                upload = ImageUpload.objects.filter(pk=upload_id).first()
+                reason = error or (upload and upload.error) or 'superseded'
+                self.stdout.write(self.style.WARNING(
+                    f"Upload #{upload_id} not set: {reason}"))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Uploaded {done} of {len(upload_ids)} staged images "
+            f"({elapsed:.1f}s)"))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"{failed} not uploaded; failed ones are kept for "
+                f"--retry-failed"))
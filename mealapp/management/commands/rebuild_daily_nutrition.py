@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mealapp.models import NUTRITION_FIELDS, DailyNutrition, MealPlan
+from mealapp.nutrition import (
+    BATCH_SIZE, live_totals, orphaned_rows, refresh_daily_nutrition)
+
+# Float sums may differ in the last digits between databases
+TOLERANCE = 1e-6
+
+
+class Command(BaseCommand):
+    help = ('Recompute the DailyNutrition table from meal plans and '
+            'recipes in batches, then check it against the live join.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Meal plans recomputed and upserted per batch.')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the table with the live join, no writes.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if not options['check']:
+            rebuilt = self.rebuild(batch_size)
+            removed, _ = orphaned_rows().delete()
+            self.stdout.write(
+                f"Rebuilt {rebuilt} rows, removed {removed} orphaned rows")
+
+        problems = self.verify(batch_size)
+        elapsed = time.perf_counter() - started
+        if problems:
+            raise CommandError(
+                f"{problems} DailyNutrition rows disagree with the "
+                f"meal plans ({elapsed:.1f}s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"DailyNutrition matches the meal plans ({elapsed:.1f}s)"))
+
+    def plan_batches(self, batch_size):
+        """Keyset batches of meal plan ids"""
+        last_id = 0
+        while True:
+            ids = list(
+                MealPlan.objects.filter(id__gt=last_id)
+                .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def rebuild(self, batch_size):
+        rebuilt = 0
+        for ids in self.plan_batches(batch_size):
+            rebuilt += refresh_daily_nutrition(
+                MealPlan.objects.filter(id__in=ids), batch_size)
+            self.stdout.write(f"Rebuilt {rebuilt} rows...")
+        return rebuilt
+
+    def verify(self, batch_size):
+        """Count missing, stale and orphaned summary rows"""
+        missing = stale = 0
+        for ids in self.plan_batches(batch_size):
+            live = list(live_totals(MealPlan.objects.filter(id__in=ids)))
+            stored = {
+                (row.user_id, row.day): row
+                for row in DailyNutrition.objects.filter(
+                    user_id__in={row['user_id'] for row in live},
+                    day__in={row['day'] for row in live})
+            }
+            for row in live:
+                summary = stored.get((row['user_id'], row['day']))
+                if summary is None:
+                    missing += 1
+                elif summary.slot_count != row['slot_count'] or any(
+                        abs(getattr(summary, field) - row[f'sum_{field}'])
+                        > TOLERANCE for field in NUTRITION_FIELDS):
+                    stale += 1
+        orphaned = orphaned_rows().count()
+        self.stdout.write(
+            f"Missing: {missing}, stale: {stale}, orphaned: {orphaned}")
+        return missing + stale + orphaned
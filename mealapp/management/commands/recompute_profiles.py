@@ -0,0 +1,159 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from mealapp.models import (
+    ACTIVITY_FACTOR, UserProfile, basal_metabolic_rate, body_mass_index)
+from mealapp.stats import invalidate_dashboard
+
+COLUMNS = ('id', 'user_id', 'age', 'gender', 'height_cm', 'weight_kg',
+           'bmi', 'daily_calorie_goal')
+
+# Rows per UPDATE statement written by bulk_update
+UPDATE_BATCH_SIZE = 1000
+
+# Stored values are rounded to 2 decimals; closer than this is unchanged
+TOLERANCE = 0.005
+
+
+def recompute(rows, activity_factor=ACTIVITY_FACTOR, goal_offset=0,
+              min_goal=0):
+    """
+    New (bmi, goal) arrays for COLUMNS rows, and the mask of rows where
+    either differs from the stored value. Rows missing an input keep
+    their stored value, as UserProfile.save() does.
+    """
+    data = np.array(rows, dtype=object).reshape(len(rows), len(COLUMNS))
+    age, height, weight, bmi, goal = (
+        data[:, COLUMNS.index(name)].astype(float)
+        for name in ('age', 'height_cm', 'weight_kg', 'bmi',
+                     'daily_calorie_goal'))
+    male = data[:, COLUMNS.index('gender')] == 'male'
+
+    # nan (NULL) compares False, matching the model's truthiness checks
+    with np.errstate(invalid='ignore', divide='ignore'):
+        has_body = (height > 0) & (weight > 0)
+        has_goal = has_body & (age > 0)
+        new_bmi = np.where(
+            has_body, np.round(body_mass_index(weight, height), 2), bmi)
+        new_goal = basal_metabolic_rate(weight, height, age, male)
+        new_goal = np.maximum(
+            new_goal * activity_factor + goal_offset, min_goal)
+        new_goal = np.where(has_goal, np.round(new_goal, 2), goal)
+
+    def differs(old, new):
+        return ~(np.isclose(old, new, rtol=0, atol=TOLERANCE)
+                 | (np.isnan(old) & np.isnan(new)))
+
+    return new_bmi, new_goal, differs(bmi, new_bmi), differs(goal, new_goal)
+
+
+def _nullable(value):
+    return None if np.isnan(value) else float(value)
+
+
+class Command(BaseCommand):
+    help = ('Recompute BMI and daily calorie goals of all profiles in '
+            'chunks with NumPy, writing changed rows with bulk_update. '
+            'Note that later profile edits recalculate with the default '
+            'activity factor.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Profiles read, computed and written per chunk.')
+        parser.add_argument(
+            '--activity-factor', type=float, default=ACTIVITY_FACTOR,
+            help=f'BMR multiplier (default {ACTIVITY_FACTOR}, sedentary).')
+        parser.add_argument(
+            '--goal-offset', type=float, default=0,
+            help='Kcal added to every goal, e.g. -500 for weight loss.')
+        parser.add_argument(
+            '--min-goal', type=float, default=0,
+            help='Lowest goal written, in kcal.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without writing.')
+        parser.add_argument(
+            '--show', type=int, default=10,
+            help='Changed profiles listed in a dry run.')
+
+    def handle(self, *args, **options):
+        if options['activity_factor'] <= 0:
+            raise CommandError('--activity-factor must be positive')
+        dry_run = options['dry_run']
+        started = time.perf_counter()
+        scanned = bmi_changed = goal_changed = written = 0
+        deltas = []
+        samples = []
+
+        for rows in self.chunks(options['chunk_size']):
+            new_bmi, new_goal, bmi_diff, goal_diff = recompute(
+                rows, options['activity_factor'], options['goal_offset'],
+                options['min_goal'])
+            changed = np.flatnonzero(bmi_diff | goal_diff)
+            scanned += len(rows)
+            bmi_changed += int(bmi_diff.sum())
+            goal_changed += int(goal_diff.sum())
+
+            old_goal = np.array(
+                [row[-1] for row in rows], dtype=float)[goal_diff]
+            deltas.append(new_goal[goal_diff] - old_goal)
+            if dry_run:
+                for index in changed[:options['show'] - len(samples)]:
+                    samples.append((rows[index], new_bmi[index],
+                                    new_goal[index]))
+                continue
+
+            now = timezone.now()
+            profiles = [
+                UserProfile(
+                    id=rows[index][0], bmi=_nullable(new_bmi[index]),
+                    daily_calorie_goal=_nullable(new_goal[index]),
+                    updated_at=now)
+                for index in changed
+            ]
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(
+                    profiles, ['bmi', 'daily_calorie_goal', 'updated_at'],
+                    batch_size=UPDATE_BATCH_SIZE)
+            invalidate_dashboard(*[rows[index][1] for index in changed])
+            written += len(profiles)
+
+        elapsed = time.perf_counter() - started
+        deltas = np.concatenate(deltas) if deltas else np.empty(0)
+        deltas = deltas[~np.isnan(deltas)]
+        self.stdout.write(
+            f"Scanned {scanned} profiles: {bmi_changed} BMI and "
+            f"{goal_changed} calorie goal changes")
+        if deltas.size:
+            self.stdout.write(
+                f"Goal change: mean {deltas.mean():+.1f} kcal, "
+                f"min {deltas.min():+.1f}, max {deltas.max():+.1f}")
+        for row, bmi, goal in samples:
+            values = dict(zip(COLUMNS, row))
+            self.stdout.write(
+                f"  profile {values['id']}: BMI {values['bmi']} -> "
+                f"{_nullable(bmi)}, goal {values['daily_calorie_goal']} -> "
+                f"{_nullable(goal)}")
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"Dry run, nothing written ({elapsed:.1f}s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated {written} profiles ({elapsed:.1f}s)"))
+
+    def chunks(self, size):
+        """Keyset chunks of COLUMNS rows"""
+        last_id = 0
+        while True:
+            rows = list(
+                UserProfile.objects.filter(id__gt=last_id)
+                .order_by('id').values_list(*COLUMNS)[:size])
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
@@ -1,54 +1,122 @@
-from django.core.management.base import BaseCommand
-from mealapp.models import Recipe
-import cloudinary
-import cloudinary.uploader
-import os
-
-# Ensure env.py is loaded if needed for credentials
-
-
-def upload_to_cloudinary_and_update(recipe):
-    url = str(recipe.image_url)
-    if not url or 'cloudinary.com' in url or url == 'default.jpg':
-        return False
-    try:
-        public_id = f"recipes/{recipe.title.lower().replace(' ', '_')}_{recipe.id}"
-        result = cloudinary.uploader.upload(
-            url,
-            public_id=public_id,
-            folder="recipes",
-            overwrite=True,
-            resource_type="image"
-        )
-        recipe.image_url = result['secure_url']
-        recipe.save()
-        return True
-    except Exception as e:
-        print(f"Error uploading {recipe.title}: {e}")
-        return False
+import time
+from collections import Counter
+from itertools import batched
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from mealapp.images import (
+    SAVE_BATCH_SIZE, CloudinaryUploader, TokenBucket,
+    UploadLog, pending_uploads, save_image_urls, save_manifest, sync_batch,
+    unsaved_uploads)
 
 
 class Command(BaseCommand):
-    help = 'Upload non-Cloudinary recipe images to Cloudinary and update the database.'
+    help = ('Upload non-Cloudinary recipe images to Cloudinary and update '
+            'the database. Uploads run concurrently under a rate limit with '
+            'retries; progress is logged to a checkpoint file for resume. '
+            'An image manifest skips unchanged and duplicate images.')
+
+    checkpoint = 'sync_recipe_images_cloudinary.checkpoint'
+
+    def public_id(self, recipe_id, title):
+        return f"recipes/{title.lower().replace(' ', '_')}_{recipe_id}"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Concurrent uploads.')
+        parser.add_argument(
+            '--rate', type=float, default=10,
+            help='Upload attempts per second across workers; 0 = no limit.')
+        parser.add_argument(
+            '--retries', type=int, default=5,
+            help='Retries of rate limited or failed requests per image.')
+        parser.add_argument(
+            '--backoff', type=float, default=1.0,
+            help='Base delay in seconds, doubled on every retry.')
+        parser.add_argument(
+            '--batch-size', type=int, default=SAVE_BATCH_SIZE,
+            help='Recipes hashed, uploaded and written per batch.')
+        parser.add_argument(
+            '--checkpoint', default=self.checkpoint,
+            help='Upload log used to resume an interrupted run.')
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry recipes that failed in an earlier run.')
+        parser.add_argument(
+            '--rehash', action='store_true',
+            help='Re-download images whose source URL is unchanged and '
+                 'upload them again if their content changed.')
+
+    def get_uploader(self, options):
+        return CloudinaryUploader()
 
     def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        log = UploadLog(options['checkpoint'])
+        uploaded, failed_before = log.read()
+        if uploaded:
+            # Uploaded by an interrupted run but maybe never saved. Only
+            # images nothing else has changed since are replaced.
+            resumed = save_image_urls(
+                unsaved_uploads(uploaded), options['batch_size'])
+            self.stdout.write(
+                f"Resuming: saved {resumed} of {len(uploaded)} earlier "
+                f"uploads")
+        skip = set() if options['retry_failed'] else set(failed_before)
+        # Every logged upload is saved now; keep just the failures
+        failures_left = {recipe_id: error
+                         for recipe_id, error in failed_before.items()
+                         if recipe_id in skip}
+        log.compact(failures_left)
+        if skip:
+            self.stdout.write(
+                f"Skipping {len(skip)} recipes that failed before "
+                f"(--retry-failed to include them)")
+
+        uploader = self.get_uploader(options)
+        bucket = TokenBucket(options['rate']) if options['rate'] else None
+        jobs = (job for job in pending_uploads() if job[0] not in skip)
+        started = time.perf_counter()
         updated = 0
-        failed = 0
-        for recipe in Recipe.objects.all():
-            url = str(recipe.image_url)
-            if url and 'cloudinary.com' not in url and url != 'default.jpg':
-                self.stdout.write(f"Uploading for {recipe.title}...")
-                if upload_to_cloudinary_and_update(recipe):
-                    updated += 1
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Updated: {recipe.title}"))
-                else:
-                    failed += 1
-                    self.stdout.write(self.style.ERROR(
-                        f"Failed: {recipe.title}"))
-        self.stdout.write(self.style.SUCCESS(f"Total updated: {updated}"))
-        if failed:
-            self.stdout.write(self.style.ERROR(f"Total failed: {failed}"))
+        stats = Counter()
+        for batch in batched(jobs, options['batch_size']):
+            entries, failures, counts = sync_batch(
+                batch, uploader, self.public_id, options['workers'],
+                options['retries'], options['backoff'], bucket,
+                options['rehash'])
+            stats.update(counts)
+            for (recipe_id, title, source), error in failures:
+                failures_left[recipe_id] = str(error)
+                log.record(recipe_id, error=str(error))
+                self.stdout.write(self.style.ERROR(
+                    f"Failed: {title} ({source}): {error}"))
+            sources = {recipe_id: source for recipe_id, _title, source
+                       in batch}
+            for recipe_id, entry in entries.items():
+                log.record(recipe_id, url=entry.secure_url,
+                           source=sources[recipe_id])
+            with transaction.atomic():
+                save_manifest(entries.values())
+                updated += save_image_urls(
+                    {recipe_id: entry.secure_url
+                     for recipe_id, entry in entries.items()},
+                    options['batch_size'])
+            self.stdout.write(
+                f"Updated {updated} recipes: {stats['uploaded']} uploaded, "
+                f"{stats['shared']} shared, {stats['unchanged']} unchanged")
+
+        # The uploads are saved; later runs only need the failures
+        log.compact(failures_left)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Total updated: {updated} ({elapsed:.1f}s)"))
+        if failures_left:
+            self.stdout.write(self.style.ERROR(
+                f"Total failed: {len(failures_left)}; rerun to retry them "
+                f"with --retry-failed ({options['checkpoint']})"))
         else:
             self.stdout.write(self.style.SUCCESS(
                 "All non-Cloudinary images updated!"))
@@ -1,52 +1,69 @@
-from django.core.management.base import BaseCommand
-from mealapp.models import Recipe
+import time
+
 import cloudinary
-import cloudinary.api
-import os
+from django.core.management.base import BaseCommand
+
+from mealapp.images import (
+    LIST_PAGE_SIZE, CloudinaryLister, TokenBucket, list_public_ids,
+    recipe_image_urls, reconcile_images)
 
 
 class Command(BaseCommand):
-    help = 'Check each recipe image_url against Cloudinary uploads and report missing or mismatched images.'
+    help = ('Check recipe image_urls against Cloudinary in one pass: list '
+            'every asset under the prefix page by page, then report '
+            'missing, mismatched and orphaned images.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix', default='recipes/',
+            help='Public id prefix the recipe images live under.')
+        parser.add_argument(
+            '--page-size', type=int, default=LIST_PAGE_SIZE,
+            help='Assets per listing request (Cloudinary allows 500).')
+        parser.add_argument(
+            '--rate', type=float, default=2,
+            help='Listing requests per second; 0 = no limit.')
+        parser.add_argument(
+            '--show', type=int, default=50,
+            help='Problems listed per category.')
+
+    def get_lister(self):
+        return CloudinaryLister()
 
     def handle(self, *args, **options):
-        cloud_name = cloudinary.config().cloud_name
-        checked = 0
-        missing = 0
-        valid = 0
-        for recipe in Recipe.objects.all():
-            url = str(recipe.image_url)
-            if 'cloudinary.com' in url:
-                # Extract public_id from URL
-                try:
-                    # Cloudinary URLs look like: https://res.cloudinary.com/<cloud_name>/image/upload/v1234567890/recipes/recipe_title_id.jpg
-                    parts = url.split(f"/{cloud_name}/image/upload/")
-                    if len(parts) == 2:
-                        public_id = parts[1].split('.')[0]  # Remove extension
-                        public_id = public_id.split(
-                            '?')[0]  # Remove query params
-                        # Check if resource exists
-                        try:
-                            cloudinary.api.resource(public_id)
-                            valid += 1
-                        except cloudinary.exceptions.NotFound:
-                            self.stdout.write(self.style.ERROR(
-                                f"Missing on Cloudinary: {recipe.title} ({public_id})"))
-                            missing += 1
-                    else:
-                        self.stdout.write(self.style.WARNING(
-                            f"Could not parse public_id for {recipe.title}: {url}"))
-                        missing += 1
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(
-                        f"Error checking {recipe.title}: {e}"))
-                    missing += 1
-            else:
-                self.stdout.write(self.style.WARNING(
-                    f"Not a Cloudinary URL: {recipe.title} ({url})"))
-                missing += 1
-            checked += 1
-        self.stdout.write(self.style.SUCCESS(f"Checked: {checked} recipes"))
+        started = time.perf_counter()
+        prefix = options['prefix']
+        bucket = TokenBucket(options['rate']) if options['rate'] else None
+        public_ids = list_public_ids(
+            self.get_lister(), prefix, options['page_size'], bucket=bucket)
+        self.stdout.write(
+            f"Listed {len(public_ids)} Cloudinary images under {prefix}")
+
+        report = reconcile_images(
+            public_ids, recipe_image_urls(), cloudinary.config().cloud_name,
+            prefix)
+
+        show = options['show']
+        for recipe_id, title, public_id in report['missing'][:show]:
+            self.stdout.write(self.style.ERROR(
+                f"Missing on Cloudinary: {title} #{recipe_id} ({public_id})"))
+        for recipe_id, title, url, reason in report['mismatched'][:show]:
+            self.stdout.write(self.style.WARNING(
+                f"Mismatched: {title} #{recipe_id} ({reason}): {url}"))
+        for public_id in report['orphaned'][:show]:
+            self.stdout.write(self.style.WARNING(
+                f"Orphaned on Cloudinary: {public_id}"))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked: {report['checked']} recipes ({elapsed:.1f}s)"))
         self.stdout.write(self.style.SUCCESS(
-            f"Valid Cloudinary images: {valid}"))
+            f"Valid Cloudinary images: {report['valid']}"))
+        self.stdout.write(
+            f"Not on Cloudinary yet: {report['external']}")
         self.stdout.write(self.style.ERROR(
-            f"Missing or invalid images: {missing}"))
+            f"Missing images: {len(report['missing'])}"))
+        self.stdout.write(self.style.WARNING(
+            f"Mismatched URLs: {len(report['mismatched'])}"))
+        self.stdout.write(self.style.WARNING(
+            f"Orphaned assets: {len(report['orphaned'])}"))
@@ -0,0 +1,28 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+from mealapp import search
+
+
+def install_search_index(apps, schema_editor):
+    search.install_search_index(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    search.uninstall_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0019_alter_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0021_recipe_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', '-updated_at'], name='meal_plan_user_updated_idx'),
+        ),
+    ]
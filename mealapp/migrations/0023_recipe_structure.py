@@ -0,0 +1,56 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0022_meal_plan_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'db_table': 'ingredient',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='mealapp.recipe')),
+            ],
+            options={
+                'db_table': 'recipe_step',
+                'ordering': ['recipe', 'position'],
+                'unique_together': {('recipe', 'position')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('quantity', models.FloatField(blank=True, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('original_text', models.TextField()),
+                ('ingredient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_rows', to='mealapp.ingredient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_rows', to='mealapp.recipe')),
+            ],
+            options={
+                'db_table': 'recipe_ingredient',
+                'ordering': ['recipe', 'position'],
+                'unique_together': {('recipe', 'position')},
+            },
+        ),
+    ]
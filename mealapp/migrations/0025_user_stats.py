@@ -0,0 +1,44 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('mealapp', 'UserStats')
+    users = User.objects.annotate(
+        recipe_total=models.Count('recipes', distinct=True),
+        plan_total=models.Count('meal_plans', distinct=True),
+    ).values_list('id', 'recipe_total', 'plan_total')
+    UserStats.objects.bulk_create([
+        UserStats(user_id=user_id, recipe_count=recipes,
+                  meal_plan_count=plans)
+        for user_id, recipes, plans in users.iterator()
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mealapp', '0024_daily_nutrition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('meal_plan_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+                'db_table': 'user_stats',
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0025_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.URLField(max_length=1000)),
+                ('content_hash', models.CharField(db_index=True, help_text='SHA-256 of the image', max_length=64)),
+                ('public_id', models.CharField(max_length=255)),
+                ('version', models.BigIntegerField(blank=True, null=True)),
+                ('secure_url', models.URLField(max_length=1000)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='image_manifest', to='mealapp.recipe')),
+            ],
+            options={
+                'db_table': 'image_manifest',
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:17
+
+from django.db import migrations, models
+
+
+def backfill_import_keys(apps, schema_editor):
+    # Same key as mealapp.models.recipe_import_key, so importing the
+    # fixtures again updates recipes loaded earlier. Later recipes with
+    # the same owner and title keep no key.
+    Recipe = apps.get_model('mealapp', 'Recipe')
+    seen = set()
+    batch = []
+    rows = Recipe.objects.order_by('id').values_list(
+        'id', 'title', 'created_by_id')
+    for pk, title, owner_id in rows.iterator():
+        key = f"{owner_id}:{' '.join(title.split()).casefold()}"
+        if key not in seen:
+            seen.add(key)
+            batch.append(Recipe(id=pk, import_key=key))
+        if len(batch) >= 1000:
+            Recipe.objects.bulk_update(batch, ['import_key'])
+            batch = []
+    Recipe.objects.bulk_update(batch, ['import_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0028_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=300, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_import_keys, migrations.RunPython.noop),
+    ]
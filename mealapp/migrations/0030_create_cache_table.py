@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The DatabaseCache table in settings.CACHES; skipped if it exists
+    call_command(
+        'createcachetable', database=schema_editor.connection.alias,
+        verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0029_recipe_import_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from mealapp.search import SqliteFTSSearchBackend
+
+
+def restore_fts_triggers(apps, schema_editor):
+    # SQLite remakes the recipe table to add 0027-0029's columns, which
+    # drops the FTS triggers from 0020. Put them back and re-index what
+    # was written in between.
+    if schema_editor.connection.vendor == 'sqlite':
+        SqliteFTSSearchBackend().install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0030_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_fts_triggers, migrations.RunPython.noop),
+    ]
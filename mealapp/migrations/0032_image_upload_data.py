@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+TARGETS = {
+    'recipe': ('Recipe', 'pk', 'image_status'),
+    'profile': ('UserProfile', 'user_id', 'user_image_status'),
+}
+
+
+def fail_disk_staged_uploads(apps, schema_editor):
+    # Their files are on some dyno's local disk, if anywhere; the images
+    # have to be chosen again
+    ImageUpload = apps.get_model('mealapp', 'ImageUpload')
+    for kind, (model_name, lookup, status_field) in TARGETS.items():
+        object_ids = ImageUpload.objects.filter(
+            kind=kind).values_list('object_id', flat=True)
+        apps.get_model('mealapp', model_name).objects.filter(**{
+            f'{lookup}__in': list(object_ids),
+            status_field: 'pending',
+        }).update(**{status_field: 'failed'})
+    ImageUpload.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mealapp', '0031_restore_recipe_fts_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fail_disk_staged_uploads, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='imageupload',
+            name='path',
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='data',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+    ]
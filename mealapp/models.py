@@ -1,16 +1,89 @@
 from cloudinary.models import CloudinaryField
 from django.forms import formset_factory
 from django.shortcuts import get_object_or_404
-from datetime import timezone
+from datetime import timedelta, timezone
 from django.db import models
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.search import SearchVectorField
 
 
-class UserProfile(models.Model):
+# Sedentary; recompute_profiles can apply another factor in bulk
+ACTIVITY_FACTOR = 1.2
+
+
+# Images uploaded through forms are pushed to Cloudinary off-request
+# (mealapp.uploads); until then the old image is shown as pending
+IMAGE_STATUS_CHOICES = [
+    ('ready', 'Ready'),
+    ('pending', 'Pending'),
+    ('failed', 'Failed'),
+]
+
+
+# Plain arithmetic, so these work on scalars and NumPy arrays alike
+def body_mass_index(weight_kg, height_cm):
+    return weight_kg / (height_cm / 100) ** 2
+
+
+def basal_metabolic_rate(weight_kg, height_cm, age, male):
+    """Mifflin-St Jeor: +5 kcal for men, -161 kcal otherwise"""
+    return 10 * weight_kg + 6.25 * height_cm - 5 * age - 161 + 166 * male
+
+
+class TrackedFieldsMixin:
+    """
+    Remembers the values a row was loaded with, so save() writes only the
+    changed columns and skips the UPDATE entirely when nothing changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+
+    def changed_fields(self):
+        """Attnames changed since loading, or None if not loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return {name for name, value in loaded.items()
+                if getattr(self, name) != value}
+
+    def save(self, *args, **kwargs):
+        if not args and kwargs.get('update_fields') is None:
+            changed = self.changed_fields()
+            if changed is not None:
+                if not changed:
+                    return
+                # auto_now columns are only written when listed
+                kwargs['update_fields'] = changed | {
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)}
+        super().save(*args, **kwargs)
+
+        saved = kwargs.get('update_fields')
+        saved = None if saved is None else set(saved)
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if saved is None or {field.name, field.attname} & saved:
+                loaded[field.attname] = getattr(self, field.attname)
+        self._loaded_values = loaded
+
+
+class UserProfile(TrackedFieldsMixin, models.Model):
     """
     User profile with health and dietary information
     """
+    # Inputs of BMI and the calorie goal
+    BODY_FIELDS = {'age', 'gender', 'height_cm', 'weight_kg'}
+
     GENDER_CHOICES = [
         ('male', 'Male'),
         ('female', 'Female'),
@@ -25,6 +98,8 @@ class UserProfile(models.Model):
     first_name = models.CharField(max_length=30, null=True, blank=True)
     last_name = models.CharField(max_length=30, null=True, blank=True)
     user_image = CloudinaryField('image', default='default_profile')
+    user_image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default='ready')
     age = models.IntegerField(null=True, blank=True)
     gender = models.CharField(
         max_length=10,
@@ -63,8 +138,8 @@ class UserProfile(models.Model):
     def calculate_bmi(self):
         """Calculate and update BMI"""
         if self.height_cm and self.weight_kg:
-            height_m = self.height_cm / 100
-            self.bmi = round(self.weight_kg / (height_m ** 2), 2)
+            self.bmi = round(
+                body_mass_index(self.weight_kg, self.height_cm), 2)
             return self.bmi
         return None
 
@@ -73,26 +148,30 @@ class UserProfile(models.Model):
         if not self.age or not self.weight_kg or not self.height_cm:
             return None
 
-        if self.gender == 'male':
-            bmr = 10*self.weight_kg+6.25*self.height_cm-5*self.age+5
-        else:
-            bmr = 10*self.weight_kg+6.25*self.height_cm-5*self.age-161
-
-        activity_factor = 1.2  # Sedentary
-        self.daily_calorie_goal = round(bmr * activity_factor, 2)
+        bmr = basal_metabolic_rate(
+            self.weight_kg, self.height_cm, self.age, self.gender == 'male')
+        self.daily_calorie_goal = round(bmr * ACTIVITY_FACTOR, 2)
         return self.daily_calorie_goal
 
     def save(self, *args, **kwargs):
-        """Auto-calculate BMI and calorie goal before saving"""
-        if self.height_cm and self.weight_kg:
-            self.calculate_bmi()
-        if self.age and self.weight_kg and self.height_cm:
-            self.calculate_daily_calorie_needs()
+        """Recalculate BMI and calorie goal when their inputs change"""
+        changed = self.changed_fields()
+        if (changed is None or changed & self.BODY_FIELDS
+                or self.bmi is None or self.daily_calorie_goal is None):
+            if self.height_cm and self.weight_kg:
+                self.calculate_bmi()
+            if self.age and self.weight_kg and self.height_cm:
+                self.calculate_daily_calorie_needs()
         super().save(*args, **kwargs)
 
 
+def recipe_import_key(title, owner_id):
+    """Recipes are identified by their owner and case-folded title"""
+    return f"{owner_id}:{' '.join(title.split()).casefold()}"
+
+
 # Recipe Model
-class Recipe(models.Model):
+class Recipe(TrackedFieldsMixin, models.Model):
     """
     Recipe model with ingredients and nutrition info
     """
@@ -110,6 +189,12 @@ class Recipe(models.Model):
     instructions = models.TextField(max_length=500, blank=True)
 
     image_url = CloudinaryField('image', default='default.jpg')
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default='ready')
+    # Rendition URLs, srcset and placeholder derived from image_url when
+    # it changes, see mealapp.images.image_variants
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False)
 
     # Servings and Time
     servings = models.IntegerField(default=1)
@@ -146,22 +231,175 @@ class Recipe(models.Model):
     updated_at = models.DateTimeField(
         auto_now=True, null=True, blank=True)      # Use auto_now for updates
 
+    # Owner and case-folded title, the key import_recipes upserts match
+    # on (see mealapp.recipe_import). Kept in step on save; None when
+    # another recipe of the owner has the same title.
+    import_key = models.CharField(
+        max_length=300, unique=True, null=True, blank=True, editable=False)
+
+    # Full-text search document (title, description, ingredients).
+    # Maintained by a database trigger, see mealapp.search
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
     class Meta:
         db_table = 'recipe'
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination on (-created_at, id)
+            models.Index(
+                fields=['-created_at', 'id'], name='recipe_created_id_idx'),
+            models.Index(
+                fields=['created_by', '-created_at', 'id'],
+                name='recipe_owner_created_idx'),
+        ]
 
     def total_time(self):
         """Calculate total time"""
         return self.prep_time_minutes + self.cook_time_minutes
 
+    def save(self, *args, **kwargs):
+        """Re-key renamed or re-owned recipes, so imports still match"""
+        changed = self.changed_fields()
+        if changed is None or changed & {'title', 'created_by_id'}:
+            key = recipe_import_key(self.title, self.created_by_id)
+            if key != self.import_key:
+                taken = Recipe.objects.filter(
+                    import_key=key).exclude(pk=self.pk).exists()
+                self.import_key = None if taken else key
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'import_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.created_by:
             return f"{self.title} (by {self.created_by.username})"
         return "Unknown"
 
 
+class Ingredient(models.Model):
+    """
+    Normalized ingredient name shared across recipes
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        db_table = 'ingredient'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class RecipeIngredient(models.Model):
+    """
+    One parsed ingredient line of a recipe, filled when the recipe is
+    saved (see mealapp.ingredients)
+    """
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='ingredient_rows')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='recipe_rows')
+    position = models.PositiveSmallIntegerField()
+    quantity = models.FloatField(null=True, blank=True)
+    unit = models.CharField(max_length=20, blank=True)
+    original_text = models.TextField()
+
+    class Meta:
+        db_table = 'recipe_ingredient'
+        ordering = ['recipe', 'position']
+        unique_together = ['recipe', 'position']
+
+    def __str__(self):
+        return self.original_text
+
+
+class RecipeStep(models.Model):
+    """
+    One ordered instruction step of a recipe
+    """
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='steps')
+    position = models.PositiveSmallIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        db_table = 'recipe_step'
+        ordering = ['recipe', 'position']
+        unique_together = ['recipe', 'position']
+
+    def __str__(self):
+        return self.text
+
+
+# Meal slots of a MealPlan and the recipe columns summed per day
+MEAL_SLOTS = ['breakfast', 'lunch', 'dinner', 'snack']
+NUTRITION_FIELDS = ['total_calories', 'protein', 'carbs', 'fat', 'fiber']
+
+
+def slot_sum(field, prefix=''):
+    """SQL expression adding one recipe column across all four slots"""
+    expression = None
+    for slot in MEAL_SLOTS:
+        part = Coalesce(
+            F(f'{prefix}{slot}_recipe__{field}'), Value(0.0),
+            output_field=models.FloatField())
+        expression = part if expression is None else expression + part
+    return expression
+
+
+def filled_slots(prefix=''):
+    """SQL expression counting the slots that have a recipe"""
+    expression = None
+    for slot in MEAL_SLOTS:
+        part = Case(
+            When(**{f'{prefix}{slot}_recipe__isnull': False}, then=1),
+            default=0, output_field=models.IntegerField())
+        expression = part if expression is None else expression + part
+    return expression
+
+
+def fold_weeks(rows):
+    """Collect per-day rollup rows and add Monday-start weekly totals"""
+    days = []
+    weeks = {}
+    for row in rows:
+        days.append(row)
+        week_start = row['day'] - timedelta(days=row['day'].weekday())
+        week = weeks.setdefault(week_start, dict(
+            {'week': week_start, 'plans': 0},
+            **dict.fromkeys(NUTRITION_FIELDS, 0)))
+        week['plans'] += row['plans']
+        for field in NUTRITION_FIELDS:
+            week[field] += row[field] or 0
+    return {'days': days, 'weeks': list(weeks.values())}
+
+
+class MealPlanQuerySet(models.QuerySet):
+    def with_nutrition(self):
+        """
+        Annotate each plan with nutrition_<field> totals of its four
+        slots, computed in SQL (LEFT JOINs + COALESCE).
+        """
+        return self.annotate(**{
+            f'nutrition_{field}': slot_sum(field)
+            for field in NUTRITION_FIELDS
+        })
+
+    def nutrition_rollup(self):
+        """
+        Per-day and per-week (Monday start) totals for the filtered plans.
+        One GROUP BY day query; weeks are folded from the day rows.
+        """
+        return fold_weeks(self.order_by().values('day').annotate(
+            plans=Count('id'),
+            **{field: Sum(slot_sum(field)) for field in NUTRITION_FIELDS},
+        ).order_by('day'))
+
+
 # MealPlan Model
 class MealPlan(models.Model):
     """
@@ -188,6 +426,8 @@ class MealPlan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MealPlanQuerySet.as_manager()
+
     class Meta:
 
         db_table = 'meal_plan'
@@ -195,6 +435,12 @@ class MealPlan(models.Model):
         verbose_name_plural = 'Meal Plans'
         unique_together = ['user', 'day']  # ADD THIS
         ordering = ['-day']  # ADD THIS - show newest first
+        indexes = [
+            # Per-user "latest change" validator for conditional GET
+            models.Index(
+                fields=['user', '-updated_at'],
+                name='meal_plan_user_updated_idx'),
+        ]
 
     def __str__(self):
 
@@ -202,6 +448,9 @@ class MealPlan(models.Model):
 
     def get_total_calories(self):
         """Calculate total calories for the day"""
+        # Already summed in SQL by MealPlan.objects.with_nutrition()
+        if hasattr(self, 'nutrition_total_calories'):
+            return self.nutrition_total_calories
         total = 0
         for recipe in [self.breakfast_recipe, self.lunch_recipe,
                        self.dinner_recipe, self.snack_recipe]:
@@ -243,3 +492,114 @@ class MealPlan(models.Model):
                 }
         summary['total_calories'] = self.get_total_calories()
         return summary
+
+
+class DailyNutritionQuerySet(models.QuerySet):
+    def rollup(self):
+        """Same shape as MealPlan.objects.nutrition_rollup(), no joins"""
+        return fold_weeks(self.order_by().values('day').annotate(
+            plans=Count('id'),
+            **{field: Sum(field) for field in NUTRITION_FIELDS},
+        ).order_by('day'))
+
+
+# Materialized per-day totals, kept in sync by mealapp.nutrition
+class DailyNutrition(models.Model):
+    """
+    Nutrition totals of one user's meal plan for one day
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='daily_nutrition')
+    day = models.DateField()
+    total_calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fat = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+    slot_count = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DailyNutritionQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'daily_nutrition'
+        unique_together = ['user', 'day']
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.day}"
+
+
+# Denormalized per-user counters read by the dashboard, kept in sync by
+# mealapp.stats.refresh_user_stats
+class UserStats(models.Model):
+    """
+    Counts shown on the dashboard, so it never runs COUNT queries
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='stats')
+    recipe_count = models.PositiveIntegerField(default=0)
+    meal_plan_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'user_stats'
+        verbose_name_plural = 'User stats'
+
+    def __str__(self):
+        return f"{self.user.username} stats"
+
+
+# Written by the Cloudinary upload commands, see mealapp.images
+class ImageManifest(models.Model):
+    """
+    Where a recipe's image came from and where it lives on Cloudinary.
+    Identical images (same content hash) share one Cloudinary asset.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name='image_manifest')
+    source_url = models.URLField(max_length=1000)
+    content_hash = models.CharField(
+        max_length=64, db_index=True, help_text="SHA-256 of the image")
+    public_id = models.CharField(max_length=255)
+    version = models.BigIntegerField(null=True, blank=True)
+    secure_url = models.URLField(max_length=1000)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'image_manifest'
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.public_id}"
+
+
+class ImageUpload(models.Model):
+    """
+    An uploaded image staged in the database until it is pushed to
+    Cloudinary and set on its recipe or profile, so any process can
+    finish it. Rows are deleted once the upload succeeds.
+    """
+    KIND_CHOICES = [
+        ('recipe', 'Recipe image'),
+        ('profile', 'Profile image'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    data = models.BinaryField()
+    status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'image_upload'
+        indexes = [
+            models.Index(fields=['kind', 'object_id'],
+                         name='image_upload_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.status}"
@@ -0,0 +1,66 @@
+from django.db.models import Exists, OuterRef, Q
+
+from .models import (
+    MEAL_SLOTS, NUTRITION_FIELDS, DailyNutrition, MealPlan, filled_slots,
+    slot_sum)
+
+# Plans upserted per INSERT ... ON CONFLICT statement
+BATCH_SIZE = 1000
+
+SUMMARY_FIELDS = NUTRITION_FIELDS + ['slot_count']
+
+
+def plans_using_recipes(recipe_ids):
+    """Meal plans with any of the given recipes in any slot"""
+    condition = Q()
+    for slot in MEAL_SLOTS:
+        condition |= Q(**{f'{slot}_recipe_id__in': recipe_ids})
+    return MealPlan.objects.filter(condition)
+
+
+def live_totals(plans):
+    """Per-plan totals computed from the recipe join, as plain dicts"""
+    return plans.order_by().annotate(
+        slot_count=filled_slots(),
+        **{f'sum_{field}': slot_sum(field)
+           for field in NUTRITION_FIELDS},
+    ).values('user_id', 'day', 'slot_count', *[
+        f'sum_{field}' for field in NUTRITION_FIELDS])
+
+
+def _summary(row):
+    return DailyNutrition(
+        user_id=row['user_id'], day=row['day'],
+        slot_count=row['slot_count'],
+        **{field: row[f'sum_{field}'] for field in NUTRITION_FIELDS})
+
+
+def _upsert(rows):
+    DailyNutrition.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['user', 'day'],
+        update_fields=SUMMARY_FIELDS + ['updated_at'])
+
+
+def refresh_daily_nutrition(plans, batch_size=BATCH_SIZE):
+    """
+    Recompute the DailyNutrition rows of the given plans: one SELECT
+    over the recipe join, then one upsert per batch_size plans.
+    """
+    refreshed = 0
+    batch = []
+    for row in live_totals(plans).iterator(chunk_size=batch_size):
+        batch.append(_summary(row))
+        if len(batch) >= batch_size:
+            _upsert(batch)
+            refreshed += len(batch)
+            batch = []
+    if batch:
+        _upsert(batch)
+        refreshed += len(batch)
+    return refreshed
+
+
+def orphaned_rows():
+    """Summary rows whose meal plan no longer exists"""
+    return DailyNutrition.objects.exclude(Exists(MealPlan.objects.filter(
+        user=OuterRef('user'), day=OuterRef('day'))))
@@ -0,0 +1,204 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.db import connection
+from django.db.models import F, Q
+
+
+def encode_cursor(payload):
+    """Encode a cursor payload as an opaque, URL-safe token"""
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(token):
+    """Decode a cursor token; invalid or missing tokens return None"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for display, which avoids a COUNT(*) scan.
+    None on databases other than PostgreSQL, which have no estimate.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CursorPage(Sequence):
+    """One page of results with opaque next/previous cursors"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 total=None):
+        self.object_list = list(object_list)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a queryset ordered by unique keys, e.g.
+    ('-created_at', 'id'). Each page is a single indexed range query,
+    so page N costs the same as page 1 (no COUNT, no OFFSET).
+    A nullable first key sorts its NULLs last. Keys may also be
+    annotations, such as a search rank.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = []
+        for key in ordering:
+            name = key.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            field = (annotation.output_field if annotation is not None
+                     else queryset.model._meta.get_field(name))
+            self.keys.append((name, key.startswith('-'), field))
+
+    def _order_by(self, reverse):
+        ordering = []
+        for name, descending, field in self.keys:
+            descending = descending != reverse
+            column = F(name)
+            if field.null:
+                # NULLs sort last going forward, first going backward
+                ordering.append(
+                    column.desc(nulls_last=not reverse) if descending
+                    else column.asc(nulls_first=reverse))
+            else:
+                ordering.append(column.desc() if descending else column.asc())
+        return ordering
+
+    def _beyond(self, values, reverse):
+        """Q matching rows strictly after (or before) the cursor row"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, descending, field), value in zip(self.keys, values):
+            forward_lookup = 'lt' if descending else 'gt'
+            backward_lookup = 'gt' if descending else 'lt'
+            lookup = backward_lookup if reverse else forward_lookup
+            if value is None:
+                step = Q(**{f'{name}__isnull': False}) if reverse else None
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                step = Q(**{f'{name}__{lookup}': value})
+                if field.null and not reverse:
+                    step |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            if step is not None:
+                condition |= equal & step
+            equal &= same
+        return condition
+
+    def _cursor(self, obj, direction):
+        values = []
+        for name, _descending, field in self.keys:
+            attname = getattr(field, 'attname', None)
+            if attname is None:
+                # An annotation; numbers, which JSON keeps exactly
+                values.append(getattr(obj, name))
+            elif getattr(obj, attname) is None:
+                values.append(None)
+            else:
+                values.append(field.value_to_string(obj))
+        return encode_cursor({'d': direction, 'k': values})
+
+    def _values(self, payload):
+        raw = payload.get('k')
+        if not isinstance(raw, list) or len(raw) != len(self.keys):
+            return None
+        try:
+            return [
+                None if value is None else field.to_python(value)
+                for (_name, _descending, field), value in zip(self.keys, raw)
+            ]
+        except Exception:
+            return None
+
+    def get_page(self, token):
+        payload = decode_cursor(token)
+        values = self._values(payload) if payload else None
+        reverse = bool(values) and payload.get('d') == 'prev'
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._beyond(values, reverse))
+        rows = list(
+            queryset.order_by(*self._order_by(reverse))[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage([])
+        if reverse:
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=(
+                self._cursor(rows[0], 'prev') if has_previous else None),
+        )
+
+
+class OffsetCursorPaginator:
+    """
+    Cursor pagination for sequences whose order is not keyset friendly,
+    such as ranked search results or the in-memory catalog snapshot.
+    Slicing a sequence is O(per page), so no page pays for a COUNT.
+    """
+
+    def __init__(self, sequence, per_page):
+        self.sequence = sequence
+        self.per_page = per_page
+
+    def get_page(self, token):
+        payload = decode_cursor(token) or {}
+        offset = payload.get('o', 0)
+        if not isinstance(offset, int) or offset < 0:
+            offset = 0
+        rows = list(self.sequence[offset:offset + self.per_page + 1])
+        more = len(rows) > self.per_page
+        previous_offset = max(offset - self.per_page, 0)
+        return CursorPage(
+            rows[:self.per_page],
+            next_cursor=encode_cursor(
+                {'o': offset + self.per_page}) if more else None,
+            previous_cursor=encode_cursor(
+                {'o': previous_offset}) if offset > 0 else None,
+        )
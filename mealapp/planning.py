@@ -0,0 +1,207 @@
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+
+from .models import MEAL_SLOTS, NUTRITION_FIELDS, MealPlan, Recipe
+from .nutrition import refresh_daily_nutrition
+from .stats import invalidate_dashboard, refresh_user_stats
+
+# Recipe columns the calendar and list pages actually render
+SLOT_RECIPE_COLUMNS = ['id', 'title'] + NUTRITION_FIELDS
+
+# Longest range the calendar will load at once
+MAX_RANGE_DAYS = 62
+
+# Upper bounds for the bulk operations
+MAX_UPSERT_DAYS = 366
+MAX_COPY_WEEKS = 12
+WEEKDAYS = (0, 1, 2, 3, 4)
+
+
+def with_slot_recipes(queryset):
+    """
+    Join all four slot recipes in the same query, loading only the
+    columns needed to render them.
+    """
+    relations = [f'{slot}_recipe' for slot in MEAL_SLOTS]
+    columns = ['id', 'user_id', 'day', 'updated_at'] + relations + [
+        f'{relation}__{column}'
+        for relation in relations for column in SLOT_RECIPE_COLUMNS
+    ]
+    return queryset.select_related(*relations).only(*columns)
+
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_range(params, today=None):
+    """
+    Read ?from=&to= (YYYY-MM-DD). Defaults to the current Monday-Sunday
+    week and clamps the span to MAX_RANGE_DAYS.
+    """
+    today = today or date.today()
+    start = parse_day(params.get('from'))
+    end = parse_day(params.get('to'))
+    if start is None:
+        start = (end or today) - timedelta(days=(end or today).weekday())
+    if end is None or end < start:
+        end = start + timedelta(days=6)
+    end = min(end, start + timedelta(days=MAX_RANGE_DAYS - 1))
+    return start, end
+
+
+def day_totals(plan):
+    """Nutrition totals annotated by MealPlan.objects.with_nutrition()"""
+    if plan is None:
+        return dict.fromkeys(NUTRITION_FIELDS, 0)
+    return {
+        field: getattr(plan, f'nutrition_{field}')
+        for field in NUTRITION_FIELDS
+    }
+
+
+def meal_plan_calendar(user, start, end):
+    """
+    One entry per day in [start, end], empty days included, loaded
+    with a single query however long the range is. Totals are summed
+    in SQL.
+    """
+    plans = {
+        plan.day: plan for plan in with_slot_recipes(
+            MealPlan.objects.filter(
+                user=user, day__range=(start, end)).with_nutrition())
+    }
+    days = []
+    current = start
+    while current <= end:
+        plan = plans.get(current)
+        days.append({
+            'day': current,
+            'plan': plan,
+            'meals': {
+                slot: getattr(plan, f'{slot}_recipe') if plan else None
+                for slot in MEAL_SLOTS
+            },
+            'totals': day_totals(plan),
+        })
+        current += timedelta(days=1)
+    return days
+
+
+def calendar_as_json(days):
+    """JSON-ready representation of meal_plan_calendar() output"""
+    return [{
+        'day': entry['day'].isoformat(),
+        'plan_id': entry['plan'].id if entry['plan'] else None,
+        'meals': {
+            slot: {
+                'id': recipe.id,
+                'title': recipe.title,
+                'total_calories': recipe.total_calories,
+            } if recipe else None
+            for slot, recipe in entry['meals'].items()
+        },
+        'totals': entry['totals'],
+    } for entry in days]
+
+
+def _recipe_id(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid recipe id: {value!r}")
+
+
+def upsert_meal_plans(user, days):
+    """
+    Apply {day: {slot: recipe_id}} in one transaction with
+    INSERT ... ON CONFLICT (user, day) DO UPDATE. Slots left out of a day
+    keep their current recipe; None clears a slot. Costs one validation
+    query, one upsert per distinct set of slots and one DailyNutrition
+    refresh, however many days are written.
+    """
+    if len(days) > MAX_UPSERT_DAYS:
+        raise ValueError(f"At most {MAX_UPSERT_DAYS} days per request.")
+    rows = {}
+    for day, slots in days.items():
+        if isinstance(day, str):
+            day = parse_day(day)
+            if day is None:
+                raise ValueError("Days must be YYYY-MM-DD.")
+        unknown = set(slots) - set(MEAL_SLOTS)
+        if unknown:
+            raise ValueError(f"Unknown meal slot: {sorted(unknown)[0]}")
+        rows[day] = {slot: _recipe_id(value) for slot, value in slots.items()}
+    if not rows:
+        return 0
+
+    recipe_ids = {pk for slots in rows.values() for pk in slots.values()
+                  if pk is not None}
+    found = set(Recipe.objects.filter(
+        id__in=recipe_ids).values_list('id', flat=True))
+    if recipe_ids - found:
+        raise ValueError(f"Unknown recipe id: {min(recipe_ids - found)}")
+
+    # Rows updating the same slots share one statement
+    groups = {}
+    for day, slots in rows.items():
+        groups.setdefault(tuple(sorted(slots)), []).append(MealPlan(
+            user=user, day=day,
+            **{f'{slot}_recipe_id': pk for slot, pk in slots.items()}))
+
+    with transaction.atomic():
+        for slots, plans in groups.items():
+            MealPlan.objects.bulk_create(
+                plans, update_conflicts=True, unique_fields=['user', 'day'],
+                update_fields=[f'{slot}_recipe_id' for slot in slots]
+                + ['updated_at'])
+        # bulk_create bypasses the signals that maintain DailyNutrition,
+        # the dashboard counters and the dashboard cache
+        refresh_daily_nutrition(
+            MealPlan.objects.filter(user=user, day__in=rows))
+        refresh_user_stats([user.pk])
+    invalidate_dashboard(user.pk)
+    return len(rows)
+
+
+def _plan_slots(plan):
+    return {slot: getattr(plan, f'{slot}_recipe_id') for slot in MEAL_SLOTS}
+
+
+def copy_week(user, start, weeks=1):
+    """
+    Copy the plans of the 7 days from `start` onto the following
+    `weeks` weeks. Days without a plan in the source week are skipped.
+    """
+    if not 1 <= weeks <= MAX_COPY_WEEKS:
+        raise ValueError(f"Weeks must be between 1 and {MAX_COPY_WEEKS}.")
+    source = MealPlan.objects.filter(
+        user=user, day__range=(start, start + timedelta(days=6)))
+    days = {}
+    for plan in source:
+        for week in range(1, weeks + 1):
+            days[plan.day + timedelta(weeks=week)] = _plan_slots(plan)
+    return upsert_meal_plans(user, days)
+
+
+def repeat_plan(user, source_day, start, end, weekdays=WEEKDAYS):
+    """Copy the plan of `source_day` onto the given weekdays of a range"""
+    if end < start or (end - start).days >= MAX_UPSERT_DAYS:
+        raise ValueError("Invalid date range.")
+    plan = MealPlan.objects.filter(user=user, day=source_day).first()
+    if plan is None:
+        raise ValueError(f"No meal plan on {source_day}.")
+    slots = _plan_slots(plan)
+    days = {}
+    current = start
+    while current <= end:
+        if current.weekday() in weekdays and current != source_day:
+            days[current] = slots
+        current += timedelta(days=1)
+    return upsert_meal_plans(user, days)
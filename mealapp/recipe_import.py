@@ -0,0 +1,172 @@
+import json
+import math
+from collections import Counter
+
+from django.db import transaction
+
+from .images import DEFAULT_IMAGE, image_variants
+from .ingredients import (
+    split_ingredient_lines, split_instruction_lines, sync_recipe_structure)
+from .models import Recipe, recipe_import_key
+
+# Characters read from the file at a time; a record may span chunks
+READ_CHUNK_SIZE = 64 * 1024
+
+# A single record larger than this is treated as a malformed file
+# rather than buffered until the end of it
+MAX_RECORD_CHARS = 4 * 1024 * 1024
+
+NUMBER_FIELDS = ('total_calories', 'protein', 'carbs', 'fat', 'fiber')
+CATEGORIES = {value for value, _label in Recipe.CATEGORY_CHOICES}
+
+# Columns an import writes; created_at and search_vector are left to the
+# database and the model defaults
+IMPORT_FIELDS = [
+    'title', 'description', 'instructions', 'image_url', 'image_variants',
+    'servings', 'prep_time_minutes', 'cook_time_minutes', 'ingredients',
+    'total_calories', 'protein', 'carbs', 'fat', 'fiber', 'category',
+    'created_by',
+]
+
+
+def iter_json_records(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the objects of a top-level JSON array (a fixture) or of JSON
+    lines one at a time, holding only the current record and one chunk
+    of text in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        # Skip the array brackets, commas and whitespace between records
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = stream.read(chunk_size), 0
+            eof = not buffer
+            continue
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Most likely a record cut off at the end of the chunk
+            if eof or len(buffer) - position > MAX_RECORD_CHARS:
+                raise
+            more = stream.read(chunk_size)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        yield record
+
+
+def _number(fields, name, default=None, integer=False):
+    value = fields.get(name, default)
+    if value is None or value == '':
+        raise ValueError(f'{name} is missing')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} is not a number: {value!r}') from None
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f'{name} must be zero or more')
+    return round(value) if integer else value
+
+
+def normalize_recipe(record, owner_id=None):
+    """
+    Validate one recipe record, either a fixture entry ({"model",
+    "pk", "fields"}) or a plain object of Recipe fields, and return the
+    model field values. Ingredient and instruction lists are stored one
+    per line. `owner_id`, if given, replaces the record's created_by.
+    Raises ValueError.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('record is not an object')
+    if record.get('model', 'mealapp.recipe') != 'mealapp.recipe':
+        raise ValueError(f"not a recipe: {record['model']}")
+    fields = record.get('fields', record)
+
+    title = ' '.join(str(fields.get('title') or '').split())
+    if not title:
+        raise ValueError('title is missing')
+    if len(title) > 255:
+        raise ValueError('title is longer than 255 characters')
+    category = str(fields.get('category') or '').strip().lower()
+    if category not in CATEGORIES:
+        raise ValueError(f'unknown category: {category!r}')
+    ingredients = split_ingredient_lines(fields.get('ingredients'))
+    if not ingredients:
+        raise ValueError('ingredients are missing')
+    owner = owner_id or fields.get('created_by')
+    if not isinstance(owner, int) or isinstance(owner, bool):
+        raise ValueError('created_by is missing or not a user id')
+
+    image_url = str(fields.get('image_url') or '').strip() or DEFAULT_IMAGE
+    values = {
+        'title': title,
+        'description': str(fields.get('description') or '').strip(),
+        'instructions': '\n'.join(
+            split_instruction_lines(fields.get('instructions'))),
+        'ingredients': '\n'.join(ingredients),
+        'image_url': image_url,
+        'image_variants': image_variants(image_url),
+        'category': category,
+        'servings': max(1, _number(fields, 'servings', 1, integer=True)),
+        'prep_time_minutes': _number(
+            fields, 'prep_time_minutes', 0, integer=True),
+        'cook_time_minutes': _number(
+            fields, 'cook_time_minutes', 0, integer=True),
+        'created_by_id': owner,
+        'import_key': recipe_import_key(title, owner),
+    }
+    for name in NUMBER_FIELDS:
+        values[name] = _number(fields, name)
+    return values
+
+
+def upsert_recipes(rows, started, structure=True):
+    """
+    Write normalized recipes with one bulk upsert on import_key. Keys
+    already written since `started` (the overlap between fixture files)
+    are skipped, so each recipe is written once per run. Parses the
+    ingredient and instruction rows unless `structure` is off.
+    Returns a Counter of created, updated and duplicate rows.
+    """
+    counts = Counter()
+    unique = {}
+    for row in rows:
+        if row['import_key'] in unique:
+            counts['duplicate'] += 1
+        else:
+            unique[row['import_key']] = row
+    existing = dict(
+        Recipe.objects.filter(import_key__in=unique).values_list(
+            'import_key', 'updated_at'))
+    recipes = []
+    for key, row in unique.items():
+        updated_at = existing.get(key)
+        if updated_at and updated_at >= started:
+            counts['duplicate'] += 1
+            continue
+        counts['updated' if key in existing else 'created'] += 1
+        recipes.append(Recipe(**row))
+    if not recipes:
+        return counts
+
+    with transaction.atomic():
+        # bulk_create fills updated_at (recipe ETags) like save() would.
+        # Conflicting keys are updated in place, keeping their id.
+        Recipe.objects.bulk_create(
+            recipes, update_conflicts=True, unique_fields=['import_key'],
+            update_fields=IMPORT_FIELDS + ['updated_at'])
+        if structure:
+            ids = dict(Recipe.objects.filter(import_key__in=[
+                recipe.import_key for recipe in recipes]).values_list(
+                'import_key', 'id'))
+            for recipe in recipes:
+                recipe.pk = ids[recipe.import_key]
+            sync_recipe_structure(recipes)
+    return counts
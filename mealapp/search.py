@@ -0,0 +1,340 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, FloatField, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+# Weighted columns indexed for full-text search
+SEARCH_CONFIG = 'english'
+SEARCH_FIELDS = [
+    ('title', 'A'),
+    ('description', 'B'),
+    ('ingredients', 'C'),
+]
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Order of a ranked search queryset, best match first: a unique keyset
+# (see mealapp.pagination.KeysetPaginator)
+RANKED_ORDER = ('-rank', 'id')
+
+
+def search_tokens(term):
+    """Split user input into safe search tokens"""
+    return TOKEN_RE.findall(term or '')
+
+
+def preserve_order(queryset, ids):
+    """Order a queryset by the position of each pk in ids"""
+    if not ids:
+        return queryset.none()
+    ordering = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ordering)
+
+
+# Index structures, used by the migrations and the backends alike.
+# Generated from SEARCH_FIELDS so the two cannot drift apart.
+_COLUMNS = ', '.join(field for field, _weight in SEARCH_FIELDS)
+
+
+def _weighted_vector(prefix=''):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        f"coalesce({prefix}{field}, '')), '{weight}')"
+        for field, weight in SEARCH_FIELDS)
+
+
+def _values(prefix):
+    return ', '.join(f'{prefix}.{field}' for field, _w in SEARCH_FIELDS)
+
+
+POSTGRES_INSTALL = [
+    f"""
+    CREATE OR REPLACE FUNCTION recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {_weighted_vector('NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    'DROP TRIGGER IF EXISTS recipe_search_vector_trigger ON recipe;',
+    f"""
+    CREATE TRIGGER recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF {_COLUMNS} ON recipe
+    FOR EACH ROW EXECUTE FUNCTION recipe_search_vector_update();
+    """,
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_gin '
+    'ON recipe USING gin (search_vector);',
+]
+POSTGRES_REBUILD = f'UPDATE recipe SET search_vector = {_weighted_vector()};'
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS recipe_search_vector_gin;',
+    'DROP TRIGGER IF EXISTS recipe_search_vector_trigger ON recipe;',
+    'DROP FUNCTION IF EXISTS recipe_search_vector_update();',
+]
+
+# bm25 column weights, in SEARCH_FIELDS order
+BM25_WEIGHTS = '10.0, 4.0, 1.0'
+
+# SQLite drops a table's triggers whenever a migration remakes it, see
+# migration 0031
+SQLITE_TRIGGERS = {
+    'recipe_fts_insert': f"""
+    CREATE TRIGGER IF NOT EXISTS recipe_fts_insert
+    AFTER INSERT ON recipe BEGIN
+        INSERT INTO recipe_fts(rowid, {_COLUMNS})
+        VALUES (new.id, {_values('new')});
+    END;
+    """,
+    'recipe_fts_delete': f"""
+    CREATE TRIGGER IF NOT EXISTS recipe_fts_delete
+    AFTER DELETE ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, {_values('old')});
+    END;
+    """,
+    'recipe_fts_update': f"""
+    CREATE TRIGGER IF NOT EXISTS recipe_fts_update
+    AFTER UPDATE ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, {_COLUMNS})
+        VALUES ('delete', old.id, {_values('old')});
+        INSERT INTO recipe_fts(rowid, {_COLUMNS})
+        VALUES (new.id, {_values('new')});
+    END;
+    """,
+}
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5("
+    f"{_COLUMNS}, content='recipe', content_rowid='id', "
+    f"tokenize='porter unicode61');",
+    *SQLITE_TRIGGERS.values(),
+]
+SQLITE_REBUILD = "INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild');"
+SQLITE_UNINSTALL = [
+    *[f'DROP TRIGGER IF EXISTS {name};' for name in SQLITE_TRIGGERS],
+    'DROP TABLE IF EXISTS recipe_fts;',
+]
+
+# (backend, database alias): whether the index is installed. Checked
+# once per process; migrations run before the web processes start.
+_available = {}
+
+
+def reset_search_backends():
+    """Forget which databases have an index, e.g. after installing one"""
+    _available.clear()
+
+
+class BaseSearchBackend(ABC):
+    """
+    Common interface for recipe search backends.
+    ranked_ids() returns recipe ids, best match first.
+    """
+    vendor = None
+    install_sql = []
+    rebuild_sql = None
+    uninstall_sql = []
+
+    @classmethod
+    def available(cls, using):
+        """Whether the index structures exist on this connection"""
+        return True
+
+    def install(self, schema_editor):
+        """Create the index structures and fill the index"""
+        for sql in self.install_sql:
+            schema_editor.execute(sql)
+        if self.rebuild_sql:
+            schema_editor.execute(self.rebuild_sql)
+        reset_search_backends()
+
+    def uninstall(self, schema_editor):
+        """Drop the index structures"""
+        for sql in self.uninstall_sql:
+            schema_editor.execute(sql)
+        reset_search_backends()
+
+    def rebuild(self):
+        """Re-index every recipe"""
+        if self.rebuild_sql:
+            with connection.cursor() as cursor:
+                cursor.execute(self.rebuild_sql)
+
+    @abstractmethod
+    def ranked_ids(self, term, category=None, limit=None):
+        """Ids of matching recipes, best match first"""
+
+    def search(self, queryset, term):
+        """
+        Filter an existing Recipe queryset, best match first. Ranked
+        backends annotate a `rank` (higher is better) and order by
+        RANKED_ORDER, which keyset pagination can follow.
+        """
+        return preserve_order(queryset, self.ranked_ids(term))
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """Legacy unranked substring search, used when no FTS is available"""
+
+    def _filter(self, queryset, term):
+        return queryset.filter(
+            Q(title__icontains=term) |
+            Q(description__icontains=term) |
+            Q(category__icontains=term)
+        )
+
+    def ranked_ids(self, term, category=None, limit=None):
+        queryset = Recipe.objects.all()
+        if category:
+            queryset = queryset.filter(category=category)
+        ids = self._filter(queryset, term).values_list('id', flat=True)
+        return list(ids[:limit] if limit else ids)
+
+    def search(self, queryset, term):
+        # Unranked; the queryset keeps its own order
+        return self._filter(queryset, term)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    tsvector column maintained by a trigger, GIN index and SearchRank
+    """
+    vendor = 'postgresql'
+    install_sql = POSTGRES_INSTALL
+    rebuild_sql = POSTGRES_REBUILD
+    uninstall_sql = POSTGRES_UNINSTALL
+
+    def _query(self, term):
+        tokens = search_tokens(term)
+        if not tokens:
+            return None
+        # Prefix match every token so partial words still hit
+        raw = ' & '.join(f'{token}:*' for token in tokens)
+        return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+    def _ranked(self, queryset, term):
+        query = self._query(term)
+        if query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+        ).order_by('-rank', '-created_at', '-id')
+
+    def ranked_ids(self, term, category=None, limit=None):
+        queryset = Recipe.objects.all()
+        if category:
+            queryset = queryset.filter(category=category)
+        ids = self._ranked(queryset, term).values_list('id', flat=True)
+        return list(ids[:limit] if limit else ids)
+
+    def search(self, queryset, term):
+        return self._ranked(queryset, term).order_by(*RANKED_ORDER)
+
+
+class SqliteFTSSearchBackend(BaseSearchBackend):
+    """
+    External-content FTS5 table kept in sync with triggers, ranked by bm25
+    """
+    vendor = 'sqlite'
+    table = 'recipe_fts'
+    install_sql = SQLITE_INSTALL
+    rebuild_sql = SQLITE_REBUILD
+    uninstall_sql = SQLITE_UNINSTALL
+
+    @classmethod
+    def available(cls, using):
+        # Databases built without migrations (e.g. with --run-syncdb)
+        # have no FTS table, and without its triggers it goes stale
+        names = [cls.table, *SQLITE_TRIGGERS]
+        with using.cursor() as cursor:
+            cursor.execute(
+                'SELECT name FROM sqlite_master WHERE name IN (%s)'
+                % ', '.join(['%s'] * len(names)), names)
+            found = {row[0] for row in cursor.fetchall()}
+        return found == set(names)
+
+    def _match(self, term):
+        tokens = search_tokens(term)
+        if not tokens:
+            return None
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, queryset, term):
+        match = self._match(term)
+        if match is None:
+            return queryset.none()
+        # bm25 is lower for better matches; negated to rank like the
+        # other backends. The rowid lookup makes it one index probe.
+        rank = RawSQL(
+            f'SELECT -bm25({self.table}, {BM25_WEIGHTS}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND {self.table}.rowid = recipe.id',
+            [match], output_field=FloatField())
+        matching = RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match])
+        return queryset.filter(pk__in=matching).annotate(
+            rank=rank).order_by(*RANKED_ORDER)
+
+    def ranked_ids(self, term, category=None, limit=None):
+        match = self._match(term)
+        if match is None:
+            return []
+        sql = (
+            f"SELECT r.id FROM {self.table} "
+            f"JOIN recipe r ON r.id = {self.table}.rowid "
+            f"WHERE {self.table} MATCH %s"
+        )
+        params = [match]
+        if category:
+            sql += ' AND r.category = %s'
+            params.append(category)
+        sql += (f' ORDER BY bm25({self.table}, {BM25_WEIGHTS}), '
+                'r.created_at DESC, r.id DESC')
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    backend.vendor: backend
+    for backend in (PostgresSearchBackend, SqliteFTSSearchBackend)
+}
+
+
+def get_search_backend(using=None):
+    """
+    Pick the search backend for the active database vendor, falling back
+    to substring search where its index is missing
+    """
+    using = using or connection
+    backend = SEARCH_BACKENDS.get(using.vendor)
+    if backend is None:
+        return IContainsSearchBackend()
+    key = (backend, using.alias)
+    if key not in _available:
+        _available[key] = backend.available(using)
+    return backend() if _available[key] else IContainsSearchBackend()
+
+
+def install_search_index(schema_editor):
+    """Install the index of the migrated database's backend, if any"""
+    backend = SEARCH_BACKENDS.get(schema_editor.connection.vendor)
+    if backend:
+        backend().install(schema_editor)
+
+
+def uninstall_search_index(schema_editor):
+    backend = SEARCH_BACKENDS.get(schema_editor.connection.vendor)
+    if backend:
+        backend().uninstall(schema_editor)
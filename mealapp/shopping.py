@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.core.cache import cache
+
+from .ingredients import parse_ingredient, split_ingredient_lines
+from .models import MEAL_SLOTS, MealPlan, Recipe, RecipeIngredient
+
+# Parsed ingredients per recipe version; an edit bumps updated_at and
+# with it the key, so stale entries are never read and simply expire
+INGREDIENTS_CACHE_KEY = 'mealapp:shopping:{id}:{version}'
+INGREDIENTS_TIMEOUT = 60 * 60 * 24 * 7
+
+# Units converted to a base unit (ml or g) so they can be added up.
+# Other units (clove, slice, can, ...) are only merged with themselves.
+UNIT_CONVERSIONS = {
+    'ml': ('ml', 1), 'l': ('ml', 1000),
+    'cup': ('ml', 240), 'tbsp': ('ml', 15), 'tsp': ('ml', 5),
+    'g': ('g', 1), 'kg': ('g', 1000), 'mg': ('g', 0.001),
+    'oz': ('g', 28.35), 'lb': ('g', 453.59),
+}
+
+# Base amounts at or above this are shown as l / kg
+LARGE_UNITS = {'ml': ('l', 1000), 'g': ('kg', 1000)}
+
+
+def ingredients_cache_key(recipe_id, updated_at):
+    version = updated_at.timestamp() if updated_at else 'initial'
+    return INGREDIENTS_CACHE_KEY.format(id=recipe_id, version=version)
+
+
+def _load_ingredients(recipe_ids):
+    """(name, quantity, unit) per recipe from the parsed rows"""
+    parsed = {pk: [] for pk in recipe_ids}
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).select_related('ingredient').order_by(
+        'recipe_id', 'position')
+    for row in rows:
+        name = row.ingredient.name if row.ingredient else row.original_text
+        parsed[row.recipe_id].append((name, row.quantity, row.unit))
+
+    # Recipes saved before structured rows existed: parse the text once
+    unparsed = [pk for pk, items in parsed.items() if not items]
+    if unparsed:
+        for pk, raw in Recipe.objects.filter(
+                id__in=unparsed).values_list('id', 'ingredients'):
+            parsed[pk] = [
+                (name or line, quantity, unit)
+                for line in split_ingredient_lines(raw)
+                for quantity, unit, name in [parse_ingredient(line)]
+            ]
+    return parsed
+
+
+def recipe_ingredients(versions):
+    """
+    {recipe_id: [(name, quantity, unit), ...]} for {recipe_id: updated_at},
+    served from the cache and filled with one query for the misses.
+    """
+    keys = {ingredients_cache_key(pk, updated_at): pk
+            for pk, updated_at in versions.items()}
+    hits = cache.get_many(list(keys))
+    result = {keys[key]: value for key, value in hits.items()}
+    missing = [pk for key, pk in keys.items() if key not in hits]
+    if missing:
+        loaded = _load_ingredients(missing)
+        cache.set_many({
+            ingredients_cache_key(pk, versions[pk]): items
+            for pk, items in loaded.items()
+        }, INGREDIENTS_TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+def _display(quantity, unit):
+    if unit in LARGE_UNITS:
+        large, factor = LARGE_UNITS[unit]
+        if quantity >= factor:
+            return round(quantity / factor, 2), large
+    return round(quantity, 2), unit
+
+
+def build_shopping_list(user, start, end, people=1):
+    """
+    Merge the ingredients of every planned recipe between start and end.
+    Amounts are scaled from the recipe's servings to `people`, converted
+    to ml/g where possible and summed per ingredient and unit.
+    """
+    slot_ids = MealPlan.objects.filter(
+        user=user, day__range=(start, end)).values_list(
+        *[f'{slot}_recipe_id' for slot in MEAL_SLOTS])
+    uses = Counter(pk for row in slot_ids for pk in row if pk is not None)
+    if not uses:
+        return []
+
+    recipes = {
+        pk: (servings, updated_at)
+        for pk, servings, updated_at in Recipe.objects.filter(
+            id__in=uses).values_list('id', 'servings', 'updated_at')
+    }
+    ingredients = recipe_ingredients(
+        {pk: updated_at for pk, (_servings, updated_at) in recipes.items()})
+
+    merged = {}
+    for pk, (servings, _updated_at) in recipes.items():
+        factor = uses[pk] * people / (servings or 1)
+        for name, quantity, unit in ingredients.get(pk, []):
+            base_unit, to_base = UNIT_CONVERSIONS.get(unit, (unit, 1))
+            item = merged.setdefault((name, base_unit), {
+                'name': name, 'quantity': None, 'unit': base_unit,
+                'recipes': set(),
+            })
+            item['recipes'].add(pk)
+            if quantity is not None:
+                item['quantity'] = (item['quantity'] or 0) + (
+                    quantity * to_base * factor)
+
+    items = []
+    for item in merged.values():
+        quantity, unit = item['quantity'], item['unit']
+        if quantity is not None:
+            quantity, unit = _display(quantity, unit)
+        items.append({
+            'name': item['name'],
+            'quantity': quantity,
+            'unit': unit,
+            'recipe_count': len(item['recipes']),
+        })
+    items.sort(key=lambda item: (item['name'], item['unit']))
+    return items
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from . models import UserProfile
+from . models import (
+    NUTRITION_FIELDS, DailyNutrition, MealPlan, Recipe, UserProfile)
+from .catalog import bump_catalog_version
+from .images import image_source, image_variants
+from .ingredients import sync_recipe_structure
+from .nutrition import plans_using_recipes, refresh_daily_nutrition
+from .stats import invalidate_dashboard, refresh_user_stats
 from django.apps import AppConfig
 
 
@@ -29,13 +35,129 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     """
-    Save the profile whenever the user is saved
+    Save the profile along with the user when it was edited through it
     """
-    # Only if profile exists (for staff users, profile might not exist)
-    if hasattr(instance, 'profile'):
+    # A profile not loaded on this instance has no unsaved edits, so the
+    # lookup (and the write) are skipped, e.g. for last_login on login.
+    # Loaded profiles only write the fields that actually changed.
+    if User.profile.is_cached(instance):
         instance.profile.save()
 
 
+@receiver(post_save, sender=Recipe)
+def derive_image_variants(sender, instance, raw=False, **kwargs):
+    """
+    Store the image renditions once, when the image changes. Connected
+    before the catalog bump so rebuilt snapshots see them.
+    Fixture loads (raw) are handled by backfill_image_variants.
+    """
+    if raw:
+        return
+    value = Recipe._meta.get_field('image_url').get_prep_value(
+        instance.image_url)
+    if instance.image_variants.get('source') != image_source(value):
+        instance.image_variants = image_variants(value)
+        Recipe.objects.filter(pk=instance.pk).update(
+            image_variants=instance.image_variants)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_catalog(sender, instance, **kwargs):
+    """
+    Bump the catalog version so every worker rebuilds its snapshot
+    """
+    bump_catalog_version()
+
+
+def _wrote(update_fields, fields):
+    """Whether a save wrote any of `fields`; full saves write them all"""
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+def parse_recipe_structure(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    """
+    Parse ingredients and instructions once, at write time, and only
+    when they were written. Fixture loads (raw) are handled by
+    backfill_recipe_structure.
+    """
+    if not raw and _wrote(update_fields, {'ingredients', 'instructions'}):
+        sync_recipe_structure([instance])
+
+
+@receiver(post_save, sender=MealPlan)
+def update_daily_nutrition(sender, instance, raw=False, **kwargs):
+    """
+    Keep the plan's DailyNutrition row in sync.
+    Fixture loads (raw) are handled by rebuild_daily_nutrition.
+    """
+    if not raw:
+        refresh_daily_nutrition(MealPlan.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=MealPlan)
+def delete_daily_nutrition(sender, instance, **kwargs):
+    DailyNutrition.objects.filter(
+        user_id=instance.user_id, day=instance.day).delete()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_nutrition(sender, instance, created, raw=False,
+                             update_fields=None, **kwargs):
+    """
+    Re-derive the totals of every plan using this recipe in bulk, when
+    its calories or macros were written. A new recipe is not in any
+    plan yet.
+    """
+    if (not created and not raw
+            and _wrote(update_fields, set(NUTRITION_FIELDS))):
+        refresh_daily_nutrition(plans_using_recipes([instance.pk]))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_plans(sender, instance, **kwargs):
+    # The slots are SET_NULL by the time post_delete runs
+    instance._meal_plan_ids = list(
+        plans_using_recipes([instance.pk]).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_recipe_nutrition(sender, instance, **kwargs):
+    plan_ids = getattr(instance, '_meal_plan_ids', None)
+    if plan_ids:
+        refresh_daily_nutrition(MealPlan.objects.filter(pk__in=plan_ids))
+
+
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=MealPlan)
+def update_meal_plan_stats(sender, instance, raw=False, **kwargs):
+    """Keep the dashboard counters and cache in step with the plans"""
+    if not raw:
+        refresh_user_stats([instance.user_id])
+        invalidate_dashboard(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_stats(sender, instance, created=True, raw=False,
+                        **kwargs):
+    """
+    Recount the author's recipes. Edits to recipes shown on other
+    dashboards are covered by the catalog version bump.
+    """
+    # Deletes arrive without `created` and count as a change too
+    if created and not raw:
+        refresh_user_stats([instance.created_by_id])
+        invalidate_dashboard(instance.created_by_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard(instance.user_id)
+
+
 class MealappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mealapp'
@@ -0,0 +1,60 @@
+/* jshint esversion: 6 */
+
+// MEAL PLAN EDITOR TYPEAHEAD
+// Each slot renders only its first recipes; typing in the search box
+// above a <select> loads matching recipes from the suggest endpoint.
+(function () {
+    const form = document.getElementById('mealPlanForm');
+    if (!form || !form.dataset.suggestUrl) {
+        return;
+    }
+
+    function replaceOptions(select, results) {
+        const selected = select.options[select.selectedIndex];
+        const keep = selected && selected.value ? selected : null;
+        select.innerHTML = '';
+
+        const blank = document.createElement('option');
+        blank.value = '';
+        blank.textContent = results.length ? 'Select recipe' : 'No matching recipes';
+        select.appendChild(blank);
+        if (keep) {
+            select.appendChild(keep);
+        }
+        results.forEach(function (recipe) {
+            if (keep && String(recipe.id) === keep.value) {
+                return;
+            }
+            const option = document.createElement('option');
+            option.value = recipe.id;
+            option.textContent = recipe.title;
+            select.appendChild(option);
+        });
+        if (keep) {
+            keep.selected = true;
+        }
+    }
+
+    form.querySelectorAll('[data-suggest-for]').forEach(function (input) {
+        const category = input.dataset.suggestFor;
+        const select = form.querySelector('select[data-category="' + category + '"]');
+        let timer = null;
+        let latest = 0;
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                const request = ++latest;
+                const params = new URLSearchParams({category: category, q: input.value});
+                fetch(form.dataset.suggestUrl + '?' + params.toString())
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        // Ignore answers to queries typed over since
+                        if (request === latest) {
+                            replaceOptions(select, data.results);
+                        }
+                    });
+            }, 200);
+        });
+    });
+}());
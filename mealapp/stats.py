@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import MealPlan, Recipe, UserStats
+
+# One entry per user holding the assembled dashboard context (see
+# mealapp.dashboard), in the cache shared by all workers. Entries also
+# record the day and catalog version they were built for, so a new day
+# or any recipe edit makes them stale without explicit deletes.
+DASHBOARD_CACHE_KEY = 'mealapp:dashboard:{user_id}'
+DASHBOARD_TIMEOUT = 60 * 60
+
+
+def refresh_user_stats(user_ids):
+    """Recount recipes and meal plans of the given users (3 queries)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    recipes = dict(Recipe.objects.filter(created_by_id__in=user_ids).values(
+        'created_by_id').annotate(total=Count('id')).values_list(
+        'created_by_id', 'total'))
+    plans = dict(MealPlan.objects.filter(user_id__in=user_ids).values(
+        'user_id').annotate(total=Count('id')).values_list(
+        'user_id', 'total'))
+    UserStats.objects.bulk_create([
+        UserStats(user_id=user_id, recipe_count=recipes.get(user_id, 0),
+                  meal_plan_count=plans.get(user_id, 0))
+        for user_id in user_ids
+    ], update_conflicts=True, unique_fields=['user'],
+        update_fields=['recipe_count', 'meal_plan_count', 'updated_at'])
+
+
+def invalidate_dashboard(*user_ids):
+    """
+    Drop the cached dashboards of the given users, and again once the
+    transaction commits: another worker rebuilding a dashboard before
+    then would cache the rows as they were.
+    """
+    keys = [DASHBOARD_CACHE_KEY.format(user_id=user_id)
+            for user_id in user_ids]
+    cache.delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,102 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+_encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+# Bytes gathered before a block is encoded, compressed or sent
+BLOCK_SIZE = 64 * 1024
+
+
+def ndjson_lines(rows):
+    """Yield one JSON document per row, newline delimited"""
+    for row in rows:
+        yield _encoder.encode(row) + '\n'
+
+
+def json_array_chunks(rows, batch_size=500):
+    """
+    Yield a JSON array incrementally. Rows are grouped into batches so
+    the response is sent in reasonably sized chunks.
+    """
+    yield '['
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(_encoder.encode(row))
+        if len(batch) >= batch_size:
+            yield ('' if first else ',') + ','.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ',') + ','.join(batch)
+    yield ']'
+
+
+class _Echo:
+    """File-like object handing csv.writer's output straight back"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    # Dates and datetimes as ISO 8601, like the JSON output
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_lines(rows, header):
+    """Yield a CSV header line, then one line per row tuple"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def byte_chunks(chunks, block_size=BLOCK_SIZE):
+    """Encode text chunks as UTF-8, joined into blocks of about block_size"""
+    batch = []
+    size = 0
+    for chunk in chunks:
+        batch.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            yield ''.join(batch).encode()
+            batch = []
+            size = 0
+    if batch:
+        yield ''.join(batch).encode()
+
+
+def compressor(method):
+    """
+    A compressor with compress() and flush() for 'gzip' or 'zstd'. zstd
+    uses the standard library on Python 3.14+ and the zstandard package
+    before that. Raises ValueError if the method is unknown or missing.
+    """
+    if method == 'gzip':
+        # wbits 16 + 15: a gzip header and trailer around the deflate data
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if method == 'zstd':
+        try:
+            from compression import zstd
+            return zstd.ZstdCompressor()
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(
+                'zstd needs Python 3.14 or the zstandard package') from None
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f'unknown compression: {method}')
+
+
+def compressed_chunks(chunks, compressobj, block_size=BLOCK_SIZE):
+    """Yield text chunks as a byte stream compressed by `compressobj`"""
+    for block in byte_chunks(chunks, block_size):
+        data = compressobj.compress(block)
+        if data:
+            yield data
+    yield compressobj.flush()
@@ -1,18 +1,1529 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import cloudinary.exceptions
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import CharField
+from django.db.models.functions import Cast
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mealapp.analytics import nutrition_analytics, streaks
+from mealapp.catalog import (
+    CATALOG_VERSION_KEY, bump_catalog_version, get_catalog_snapshot)
+from mealapp.dashboard import get_dashboard_context
+from mealapp.export import export_chunks
+from mealapp.forms import RecipeForm
+from mealapp.generator import MAX_REPEATS, MealPlanGenerator, RecipeMatrix
+from mealapp.images import (
+    LIST_PAGE_SIZE, TokenBucket, UploadLog, image_variants, list_public_ids,
+    reconcile_images, upload_with_retry)
+from mealapp.ingredients import (
+    parse_ingredient, split_ingredient_lines, split_instruction_lines)
+from mealapp.management.commands.sync_recipe_images_cloudinary import (
+    Command as SyncImagesCommand)
+from mealapp.models import (
+    MEAL_SLOTS, DailyNutrition, ImageManifest, ImageUpload, Ingredient,
+    MealPlan, Recipe, RecipeIngredient, RecipeStep, UserProfile)
+from mealapp.pagination import KeysetPaginator, encode_cursor
+from mealapp.planning import (
+    copy_week, meal_plan_calendar, repeat_plan, upsert_meal_plans)
+from mealapp.recipe_import import iter_json_records
+from mealapp.search import (
+    IContainsSearchBackend, SqliteFTSSearchBackend, get_search_backend,
+    reset_search_backends)
+from mealapp.shopping import build_shopping_list
+from mealapp.stats import DASHBOARD_CACHE_KEY
+from mealapp.uploads import process_upload, stage_image
+
+
+class FakeUploader:
+    """
+    Local stand-in for CloudinaryUploader. Images are `contents[source]`
+    (the source itself by default). Each source is rate limited
+    `failures` times before it succeeds; sources in `missing` fail with
+    NotFound.
+    """
+
+    def __init__(self, failures=0, missing=(), contents=None):
+        self.failures = failures
+        self.missing = set(missing)
+        self.contents = contents or {}
+        self.attempts = Counter()
+        self.digests = Counter()
+        self.uploads = Counter()
+        self.lock = threading.Lock()
+
+    def digest(self, source):
+        with self.lock:
+            self.digests[source] += 1
+        content = self.contents.get(source, source.encode())
+        return hashlib.sha256(content).hexdigest()
+
+    def upload(self, source, public_id, overwrite=True, folder='recipes'):
+        with self.lock:
+            self.attempts[source] += 1
+            attempt = self.attempts[source]
+        if source in self.missing:
+            raise cloudinary.exceptions.NotFound(
+                f'Resource not found: {source}')
+        if attempt <= self.failures:
+            raise cloudinary.exceptions.RateLimited('Rate limit exceeded')
+        with self.lock:
+            self.uploads[source] += 1
+        return {
+            'public_id': public_id,
+            'version': 1,
+            'format': 'jpg',
+            'secure_url':
+                f'https://res.cloudinary.com/fake/image/upload/{public_id}',
+        }
+
+
+class FakeLister:
+    """Local stand-in for CloudinaryLister over a fixed set of ids"""
+
+    def __init__(self, public_ids):
+        self.public_ids = sorted(public_ids)
+        self.calls = 0
+
+    def list_page(self, prefix, cursor=None, page_size=LIST_PAGE_SIZE):
+        self.calls += 1
+        matching = [public_id for public_id in self.public_ids
+                    if public_id.startswith(prefix)]
+        start = int(cursor or 0)
+        end = start + page_size
+        return matching[start:end], str(end) if end < len(matching) else None
+
+
+class FakeSyncImagesCommand(SyncImagesCommand):
+    """sync_recipe_images_cloudinary against a FakeUploader"""
+
+    def __init__(self, uploader=None, **kwargs):
+        super().__init__(**kwargs)
+        self.uploader = uploader or FakeUploader()
+
+    def get_uploader(self, options):
+        return self.uploader
+
+
+def app_queries(captured):
+    """SQL a CaptureQueriesContext saw, less the DatabaseCache's own"""
+    return [query['sql'] for query in captured
+            if 'mealapp_cache' not in query['sql']
+            and 'SAVEPOINT' not in query['sql']]
+
+
+class MealPlanCalendarTests(TestCase):
+    """Calendar range loading must not issue a query per day or slot"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='pass')
+        recipes = {
+            category: Recipe.objects.create(
+                title=f'{category} recipe', description='test',
+                ingredients='1 cup oats', total_calories=100,
+                protein=10, carbs=20, fat=5, fiber=2,
+                category=category, created_by=cls.user)
+            for category in ('breakfast', 'lunch', 'dinner', 'snack')
+        }
+        cls.start = date(2026, 3, 2)
+        for offset in range(28):
+            MealPlan.objects.create(
+                user=cls.user, day=cls.start + timedelta(days=offset),
+                breakfast_recipe=recipes['breakfast'],
+                lunch_recipe=recipes['lunch'],
+                dinner_recipe=recipes['dinner'],
+                snack_recipe=recipes['snack'])
+
+    def test_range_loads_in_one_query(self):
+        with self.assertNumQueries(1):
+            days = meal_plan_calendar(
+                self.user, self.start, self.start + timedelta(days=27))
+            # Touching every slot must not trigger lazy loads
+            titles = [recipe.title for entry in days
+                      for recipe in entry['meals'].values()]
+        self.assertEqual(len(days), 28)
+        self.assertEqual(len(titles), 28 * 4)
+        self.assertEqual(days[0]['totals']['total_calories'], 400)
+        self.assertEqual(days[0]['totals']['protein'], 40)
+
+    def test_view_query_count_is_constant(self):
+        self.client.force_login(self.user)
+        url = reverse('meal_plan_list')
+
+        def count(days):
+            end = self.start + timedelta(days=days - 1)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {
+                    'from': self.start.isoformat(),
+                    'to': end.isoformat(),
+                })
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.assertEqual(count(3), count(28))
+
+    def test_json_variant(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('meal_plan_calendar_api'), {
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(days=6)).isoformat(),
+        })
+        payload = response.json()
+        self.assertEqual(len(payload['days']), 7)
+        self.assertEqual(
+            payload['days'][0]['meals']['lunch']['title'], 'lunch recipe')
+        self.assertEqual(payload['days'][0]['totals']['total_calories'], 400)
+
+    def test_nutrition_rollup_in_one_query(self):
+        plans = MealPlan.objects.filter(
+            user=self.user,
+            day__range=(self.start, self.start + timedelta(days=13)))
+        with self.assertNumQueries(1):
+            rollup = plans.nutrition_rollup()
+        self.assertEqual(len(rollup['days']), 14)
+        self.assertEqual(len(rollup['weeks']), 2)
+        self.assertEqual(rollup['weeks'][0]['week'], self.start)
+        self.assertEqual(rollup['weeks'][0]['total_calories'], 7 * 400)
+        self.assertEqual(rollup['weeks'][1]['fiber'], 7 * 8)
+
+    def test_with_nutrition_annotates_plans(self):
+        plan = MealPlan.objects.with_nutrition().get(
+            user=self.user, day=self.start)
+        self.assertEqual(plan.nutrition_fat, 20)
+        with self.assertNumQueries(0):
+            self.assertEqual(plan.get_total_calories(), 400)
+
+
+class DailyNutritionTests(TestCase):
+    """The materialized daily totals must follow plan and recipe edits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tracker', password='pass')
+        cls.oats = Recipe.objects.create(
+            title='Oats', description='test', ingredients='1 cup oats',
+            total_calories=300, protein=10, carbs=50, fat=6, fiber=8,
+            category='breakfast', created_by=cls.user)
+        cls.soup = Recipe.objects.create(
+            title='Soup', description='test', ingredients='1 l stock',
+            total_calories=200, protein=12, carbs=20, fat=4, fiber=3,
+            category='lunch', created_by=cls.user)
+        cls.start = date(2026, 3, 2)
+        for offset in range(5):
+            MealPlan.objects.create(
+                user=cls.user, day=cls.start + timedelta(days=offset),
+                breakfast_recipe=cls.oats, lunch_recipe=cls.soup)
+
+    def row(self, day=None):
+        return DailyNutrition.objects.get(
+            user=self.user, day=day or self.start)
+
+    def test_plan_save_updates_row(self):
+        self.assertEqual(self.row().total_calories, 500)
+        self.assertEqual(self.row().slot_count, 2)
+        plan = MealPlan.objects.get(user=self.user, day=self.start)
+        plan.lunch_recipe = None
+        plan.save()
+        self.assertEqual(self.row().total_calories, 300)
+        self.assertEqual(self.row().slot_count, 1)
+
+    def test_recipe_edit_updates_all_plans_in_bulk(self):
+        self.oats.total_calories = 400
+        with CaptureQueriesContext(connection) as queries:
+            self.oats.save()
+        writes = [q for q in queries if 'daily_nutrition' in q['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(set(DailyNutrition.objects.values_list(
+            'total_calories', flat=True)), {600})
+
+        # Edits that leave the calories and macros alone skip it
+        loaded = Recipe.objects.get(pk=self.oats.pk)
+        loaded.description = 'Creamy'
+        with CaptureQueriesContext(connection) as queries:
+            loaded.save()
+        self.assertFalse(
+            [q for q in queries if 'daily_nutrition' in q['sql']])
+
+    def test_deletes(self):
+        MealPlan.objects.filter(user=self.user, day=self.start).delete()
+        self.assertFalse(DailyNutrition.objects.filter(
+            user=self.user, day=self.start).exists())
+        self.soup.delete()
+        self.assertEqual(set(DailyNutrition.objects.values_list(
+            'total_calories', flat=True)), {300})
+
+    def test_rebuild_command_restores_table(self):
+        DailyNutrition.objects.filter(day=self.start).update(protein=0)
+        DailyNutrition.objects.filter(
+            day=self.start + timedelta(days=1)).delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_daily_nutrition', check=True,
+                         stdout=StringIO())
+        call_command('rebuild_daily_nutrition', batch_size=2,
+                     stdout=StringIO())
+        self.assertEqual(DailyNutrition.objects.count(), 5)
+        self.assertEqual(self.row().protein, 22)
+
+
+class MealPlanGeneratorTests(TestCase):
+    """Generated weeks should hit the goal and respect variety limits"""
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        calories = rng.uniform(80, 800, 400)
+        values = np.column_stack([
+            calories, calories * 0.25 / 4, calories * 0.5 / 4,
+            calories * 0.25 / 9, rng.uniform(1, 10, 400)])
+        self.matrix = RecipeMatrix(
+            None, np.arange(1, 401), np.tile(MEAL_SLOTS, 100), values)
+
+    def test_week_is_close_to_goal_and_varied(self):
+        plans = MealPlanGenerator(self.matrix, 2200, seed=1).generate(7)
+        self.assertEqual(len(plans), 7)
+        for plan in plans:
+            self.assertLess(
+                abs(plan['totals']['total_calories'] - 2200), 2200 * 0.05)
+        for slot in MEAL_SLOTS:
+            chosen = [plan[slot] for plan in plans]
+            self.assertLessEqual(
+                max(chosen.count(recipe) for recipe in chosen), MAX_REPEATS)
+            self.assertTrue(all(a != b for a, b in zip(chosen, chosen[1:])))
+
+    def test_empty_category_leaves_slot_empty(self):
+        matrix = RecipeMatrix(
+            None, [1, 2, 3], ['breakfast', 'lunch', 'dinner'],
+            [[400, 20, 50, 10, 5]] * 3)
+        plan = MealPlanGenerator(matrix, 1200, seed=1).generate(1)[0]
+        self.assertIsNone(plan['snack'])
+        self.assertEqual(plan['totals']['total_calories'], 1200)
+
+    def test_endpoint_saves_on_post(self):
+        user = User.objects.create_user('auto', password='pass')
+        for index, slot in enumerate(MEAL_SLOTS * 3):
+            Recipe.objects.create(
+                title=f'{slot} {index}', description='test',
+                ingredients='1 cup rice', total_calories=500, protein=30,
+                carbs=60, fat=15, fiber=5, category=slot, created_by=user)
+        self.client.force_login(user)
+        url = reverse('meal_plan_generate_api')
+        response = self.client.get(url, {'from': '2026-03-02', 'days': 3})
+        self.assertEqual(len(response.json()['days']), 3)
+        self.assertFalse(MealPlan.objects.filter(user=user).exists())
+
+        response = self.client.post(url, {'from': '2026-03-02'})
+        self.assertTrue(response.json()['saved'])
+        self.assertEqual(MealPlan.objects.filter(user=user).count(), 7)
+        self.assertEqual(
+            DailyNutrition.objects.get(user=user, day=date(2026, 3, 2))
+            .total_calories, 2000)
+
+
+class GenerateWeeklyPlansTests(TestCase):
+    """The batch command upserts a week per user and can resume"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'batch{i}') for i in range(5)]
+        for index, slot in enumerate(MEAL_SLOTS * 3):
+            Recipe.objects.create(
+                title=f'{slot} {index}', description='test',
+                ingredients='1 cup rice', total_calories=400 + index,
+                protein=25, carbs=50, fat=12, fiber=4, category=slot,
+                created_by=cls.users[0])
+
+    def run_command(self, checkpoint, **options):
+        call_command(
+            'generate_weekly_plans', start='2026-03-02', workers=1,
+            shard_size=2, checkpoint=checkpoint, stdout=StringIO(),
+            **options)
+
+    def test_upserts_a_week_per_user(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'plans.checkpoint')
+        MealPlan.objects.create(user=self.users[0], day=date(2026, 3, 2))
+        self.run_command(checkpoint)
+        self.run_command(checkpoint)
+        self.assertEqual(MealPlan.objects.count(), 5 * 7)
+        self.assertFalse(MealPlan.objects.filter(
+            breakfast_recipe__isnull=True).exists())
+        self.assertEqual(DailyNutrition.objects.count(), 5 * 7)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'plans.checkpoint')
+        first, second = self.users[0].id, self.users[1].id
+        with open(checkpoint, 'w') as handle:
+            json.dump({'key': '2026-03-02:-', 'done': [[first, second]]},
+                      handle)
+        # Users change between runs; the finished range still holds
+        User.objects.filter(pk=first).update(is_active=False)
+        newcomer = User.objects.create_user('newcomer')
+        self.run_command(checkpoint)
+        self.assertFalse(MealPlan.objects.filter(
+            user_id__in=[first, second]).exists())
+        self.assertEqual(MealPlan.objects.filter(user=newcomer).count(), 7)
+        self.assertEqual(MealPlan.objects.count(), 4 * 7)
+
+    def test_nested_ranges_from_resumed_runs(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'plans.checkpoint')
+        ids = [user.id for user in self.users]
+        # A resumed run's shard spans the range finished before it
+        with open(checkpoint, 'w') as handle:
+            json.dump({'key': '2026-03-02:-',
+                       'done': [[ids[1], ids[2]], [ids[0], ids[4]]]},
+                      handle)
+        self.run_command(checkpoint)
+        self.assertFalse(MealPlan.objects.exists())
+
+    def test_dry_run_writes_nothing(self):
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'plans.checkpoint')
+        self.run_command(checkpoint, dry_run=True)
+        self.assertFalse(MealPlan.objects.exists())
+
+
+class CatalogVersionTests(TestCase):
+    """Snapshots follow versions written by any worker"""
+
+    def test_shared_version(self):
+        snapshot = get_catalog_snapshot()
+        self.assertIs(get_catalog_snapshot(), snapshot)
+        # What another gunicorn worker's bump leaves in the shared cache
+        cache.set(CATALOG_VERSION_KEY, 'other-worker', None)
+        rebuilt = get_catalog_snapshot()
+        self.assertIsNot(rebuilt, snapshot)
+        self.assertEqual(rebuilt.version, 'other-worker')
+        self.assertNotEqual(bump_catalog_version(), bump_catalog_version())
+
+    def test_index_payload_omits_unloaded_fields(self):
+        user = User.objects.create_user('indexer')
+        Recipe.objects.create(
+            title='Toast', description='test', ingredients='1 slice bread',
+            total_calories=100, protein=3, carbs=15, fat=1, fiber=1,
+            created_by=user)
+        bump_catalog_version()
+        [payload] = json.loads(get_catalog_snapshot().json)
+        self.assertEqual(payload['recipe_name'], 'Toast')
+        self.assertNotIn('ingredients', payload)
+        self.assertNotIn('instructions', payload)
+
+
+class KeysetPaginatorTests(TestCase):
+    """Cursor pages over (-created_at, id) with NULLs last"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('pager', password='pass')
+        moments = [
+            datetime(2026, 1, day, tzinfo=timezone.utc)
+            for day in (3, 1, 2, 2, 5)
+        ] + [None, None]
+        cls.recipes = []
+        for index, moment in enumerate(moments):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {index}', description='test',
+                ingredients='1 egg', category='breakfast',
+                total_calories=100, protein=5, carbs=5, fat=5, fiber=1,
+                created_by=user)
+            # auto_now_add ignores values passed to create()
+            Recipe.objects.filter(pk=recipe.pk).update(created_at=moment)
+            recipe.created_at = moment
+            cls.recipes.append(recipe)
+
+    def paginator(self):
+        return KeysetPaginator(Recipe.objects.all(), ('-created_at', 'id'), 3)
+
+    def test_round_trip(self):
+        dated = sorted(
+            (recipe for recipe in self.recipes if recipe.created_at),
+            key=lambda recipe: (-recipe.created_at.timestamp(), recipe.id))
+        undated = sorted(
+            (recipe for recipe in self.recipes if not recipe.created_at),
+            key=lambda recipe: recipe.id)
+        expected = [recipe.id for recipe in dated + undated]
+
+        pages = [self.paginator().get_page(None)]
+        self.assertFalse(pages[0].has_previous())
+        while pages[-1].has_next():
+            pages.append(self.paginator().get_page(pages[-1].next_cursor))
+        self.assertEqual(
+            [recipe.id for page in pages for recipe in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        # Walking back from the last page returns the same pages
+        page = pages[-1]
+        for earlier in reversed(pages[:-1]):
+            page = self.paginator().get_page(page.previous_cursor)
+            self.assertEqual([recipe.id for recipe in page],
+                             [recipe.id for recipe in earlier])
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursors_start_over(self):
+        first = [recipe.id for recipe in self.paginator().get_page(None)]
+        for token in ('garbage!', encode_cursor(['not', 'a', 'dict']),
+                      encode_cursor({'d': 'next', 'k': ['2026-01-03']}),
+                      encode_cursor({'d': 'prev', 'k': ['soon', 1]})):
+            page = self.paginator().get_page(token)
+            self.assertEqual([recipe.id for recipe in page], first)
+            self.assertFalse(page.has_previous())
+
+
+class RecipeSearchTests(TestCase):
+    """Ranked full-text search, and the fallback without an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('searcher', password='pass')
+
+        def recipe(title, description, ingredients, category='dinner'):
+            return Recipe.objects.create(
+                title=title, description=description,
+                ingredients=ingredients, category=category,
+                total_calories=400, protein=20, carbs=40, fat=10, fiber=5,
+                created_by=user)
+
+        cls.in_ingredients = recipe('Fried rice', 'Weeknight rice',
+                                    '200 g chickpeas\n1 cup rice')
+        cls.in_title = recipe('Chickpea stew', 'Warming', '1 onion')
+        cls.in_description = recipe(
+            'Hummus', 'Smooth chickpea dip', '1 lemon', category='snack')
+        recipe('Porridge', 'Oats', '1 cup oats', category='breakfast')
+
+    def setUp(self):
+        # Installs are rolled back with each test
+        reset_search_backends()
+        self.addCleanup(reset_search_backends)
+
+    def test_falls_back_without_fts_table(self):
+        # The test database is built from the models (MIGRATION_MODULES
+        # in the test settings), so it has no FTS table
+        self.assertIsInstance(get_search_backend(), IContainsSearchBackend)
+        response = self.client.get(reverse('index'), {'search': 'chickpea'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['recipe_count'], 2)
+
+    def test_ranked_by_field_weight(self):
+        with connection.cursor() as cursor:
+            SqliteFTSSearchBackend().install(cursor)
+        backend = get_search_backend()
+        self.assertIsInstance(backend, SqliteFTSSearchBackend)
+        # Title beats description beats ingredients; prefixes match
+        self.assertEqual(backend.ranked_ids('chick'), [
+            self.in_title.id, self.in_description.id,
+            self.in_ingredients.id])
+        self.assertEqual(backend.ranked_ids('chick', category='snack'),
+                         [self.in_description.id])
+        self.assertEqual(backend.ranked_ids('chick', limit=1),
+                         [self.in_title.id])
+        self.assertEqual(backend.ranked_ids('!!'), [])
+
+        # Triggers keep the index in step with edits
+        self.in_title.title = 'Lentil stew'
+        self.in_title.save()
+        self.assertNotIn(self.in_title.id, backend.ranked_ids('chickpea'))
+
+    def test_ranked_results_page_by_keyset(self):
+        user = self.in_title.created_by
+        for index in range(12):
+            Recipe.objects.create(
+                title=f'Chickpea salad {index}', description='Fresh',
+                ingredients='1 can chickpeas', total_calories=300,
+                protein=12, carbs=30, fat=9, fiber=8, created_by=user)
+        with connection.cursor() as cursor:
+            SqliteFTSSearchBackend().install(cursor)
+        self.client.login(username='searcher', password='pass')
+        url = reverse('recipe_list')
+
+        with CaptureQueriesContext(connection) as captured:
+            first = self.client.get(url, {'search': 'chickpea'})
+        page = first.context['page_obj']
+        second = self.client.get(
+            url, {'search': 'chickpea', 'cursor': page.next_cursor})
+        self.assertFalse(any('OFFSET' in query['sql']
+                             for query in captured.captured_queries))
+        ids = [recipe.id for recipe in page] + [
+            recipe.id for recipe in second.context['page_obj']]
+        ranked = get_search_backend().search(
+            Recipe.objects.filter(created_by=user), 'chickpea')
+        self.assertEqual(ids, [recipe.id for recipe in ranked])
+        self.assertEqual(len(ids), 15)
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    def test_missing_triggers_restored_by_migration(self):
+        with connection.cursor() as cursor:
+            SqliteFTSSearchBackend().install(cursor)
+            # What remaking the recipe table in 0027-0029 did
+            cursor.execute('DROP TRIGGER recipe_fts_insert;')
+        reset_search_backends()
+        self.assertIsInstance(get_search_backend(), IContainsSearchBackend)
+
+        banana = Recipe.objects.create(
+            title='Banana bread', description='Loaf', ingredients='banana',
+            total_calories=300, protein=5, carbs=50, fat=8, fiber=3,
+            created_by=self.in_title.created_by)
+        migration = import_module(
+            'mealapp.migrations.0031_restore_recipe_fts_triggers')
+        with connection.cursor() as cursor:
+            # The SQLite schema editor can't run inside the test's atomic
+            editor = SimpleNamespace(
+                connection=connection, execute=cursor.execute)
+            migration.restore_fts_triggers(None, editor)
+        backend = get_search_backend()
+        self.assertIsInstance(backend, SqliteFTSSearchBackend)
+        self.assertEqual(backend.ranked_ids('banana'), [banana.id])
+
+
+class RecipeApiTests(TestCase):
+    """The recipe API streams every default field, images included"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('streamer', password='pass')
+        for title, image in (('Toast', 'default.jpg'),
+                             ('Soup', 'image/upload/v12/recipes/soup.jpg')):
+            Recipe.objects.create(
+                title=title, description='test', ingredients='1 egg',
+                category='lunch', image_url=image, total_calories=100,
+                protein=5, carbs=5, fat=5, fiber=1, created_by=user)
+
+    def test_ndjson_and_json(self):
+        response = self.client.get(reverse('recipe_api'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join(response.streaming_content).decode()
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 2)
+        images = {row['title']: row['image_url'] for row in rows}
+        self.assertEqual(images['Toast'], 'default.jpg')
+        self.assertTrue(images['Soup'].endswith('v12/recipes/soup.jpg'))
+
+        response = self.client.get(reverse('recipe_api'), {'format': 'json'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(isinstance(row['image_url'], str)
+                            for row in rows))
+
+        response = self.client.get(
+            reverse('recipe_api'), {'fields': 'id,title', 'limit': '1'})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(list(json.loads(rows[0])), ['id', 'title'])
+        self.assertEqual(len(rows), 1)
+
+
+class RecipeSuggestTests(TestCase):
+    """Typeahead reads cached choices that follow recipe edits"""
+
+    def test_suggest_follows_recipe_changes(self):
+        user = User.objects.create_user('cook', password='pass')
+        recipe = Recipe.objects.create(
+            title='Chickpea curry', description='test',
+            ingredients='1 can chickpeas', total_calories=450, protein=18,
+            carbs=60, fat=12, fiber=11, category='dinner', created_by=user)
+        url = reverse('recipe_suggest')
+
+        def titles(term):
+            response = self.client.get(
+                url, {'category': 'dinner', 'q': term})
+            return [row['title'] for row in response.json()['results']]
+
+        self.assertEqual(titles('chick'), ['Chickpea curry'])
+        with CaptureQueriesContext(connection) as captured:
+            titles('curry')
+        self.assertEqual(app_queries(captured), [])
+        recipe.title = 'Lentil curry'
+        recipe.save()
+        self.assertEqual(titles('chick'), [])
+        self.assertEqual(titles('curry'), ['Lentil curry'])
+
+
+class MealPlanConditionalTests(TestCase):
+    """The meal plan editor revalidates with an ETag per day"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('revalidator', password='pass')
+        self.client.login(username='revalidator', password='pass')
+        self.first = MealPlan.objects.create(
+            user=self.user, day=date(2026, 3, 2))
+        self.latest = MealPlan.objects.create(
+            user=self.user, day=date(2026, 3, 3))
+
+    def get(self, plan, etag=None):
+        url = reverse('meal_plan_view', args=[plan.day.isoformat()])
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_not_modified_until_saved(self):
+        response = self.get(self.latest)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.get(self.latest, etag).status_code, 304)
+
+        self.latest.save()
+        self.assertEqual(self.get(self.latest, etag).status_code, 200)
+
+    def test_new_login_invalidates(self):
+        etag = self.get(self.latest)['ETag']
+        self.assertEqual(self.get(self.latest, etag).status_code, 304)
+        # A cached page would carry the previous CSRF secret's token
+        self.client.logout()
+        self.client.login(username='revalidator', password='pass')
+        self.assertEqual(self.get(self.latest, etag).status_code, 200)
+
+    def test_deleting_an_older_plan_invalidates(self):
+        etag = self.get(self.first)['ETag']
+        self.assertEqual(self.get(self.first, etag).status_code, 304)
+
+        # Not the user's most recent change
+        self.first.delete()
+        response = self.get(self.first, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['meal_plan'].pk)
+
+
+class BulkMealPlanTests(TestCase):
+    """Bulk writes cost a constant number of statements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulk', password='pass')
+        cls.recipes = [
+            Recipe.objects.create(
+                title=f'{slot} dish', description='test',
+                ingredients='1 cup rice', total_calories=300, protein=20,
+                carbs=40, fat=8, fiber=3, category=slot,
+                created_by=cls.user)
+            for slot in MEAL_SLOTS
+        ]
+        cls.start = date(2026, 3, 2)
+
+    def days(self, count):
+        return {
+            (self.start + timedelta(days=offset)).isoformat(): {
+                slot: recipe.id
+                for slot, recipe in zip(MEAL_SLOTS, self.recipes)
+            } for offset in range(count)
+        }
+
+    def test_upsert_cost_does_not_grow_with_days(self):
+        def statements(count):
+            with CaptureQueriesContext(connection) as queries:
+                upsert_meal_plans(self.user, self.days(count))
+            return len(queries)
+
+        self.assertEqual(statements(2), statements(60))
+        self.assertEqual(MealPlan.objects.filter(user=self.user).count(), 60)
+        self.assertEqual(
+            DailyNutrition.objects.get(user=self.user, day=self.start)
+            .total_calories, 1200)
+
+    def test_partial_update_keeps_other_slots(self):
+        upsert_meal_plans(self.user, self.days(1))
+        upsert_meal_plans(self.user, {self.start: {'lunch': None}})
+        plan = MealPlan.objects.get(user=self.user, day=self.start)
+        self.assertIsNone(plan.lunch_recipe_id)
+        self.assertEqual(plan.dinner_recipe_id, self.recipes[2].id)
+
+    def test_copy_week_and_repeat(self):
+        upsert_meal_plans(self.user, self.days(7))
+        self.assertEqual(copy_week(self.user, self.start, weeks=3), 21)
+        self.assertEqual(MealPlan.objects.filter(user=self.user).count(), 28)
+
+        MealPlan.objects.filter(user=self.user).delete()
+        upsert_meal_plans(self.user, self.days(1))
+        repeated = repeat_plan(
+            self.user, self.start, self.start,
+            self.start + timedelta(days=13))
+        self.assertEqual(repeated, 9)
+
+    def test_api_rejects_unknown_recipe(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('meal_plan_bulk_api'),
+            json.dumps({'days': {'2026-03-02': {'lunch': 999999}}}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MealPlan.objects.exists())
+
+
+class IngredientParsingTests(TestCase):
+    """Ingredient lines become quantity, unit and ingredient rows"""
+
+    def test_parse_ingredient(self):
+        for line, expected in [
+            ('2 1/2 cups of rice', (2.5, 'cup', 'rice')),
+            ('½ tsp Salt', (0.5, 'tsp', 'salt')),
+            ('200g rolled oats', (200, 'g', 'rolled oat')),
+            ('1.5 kg Potatoes', (1.5, 'kg', 'potato')),
+            # Ranges keep the lower bound; notes and descriptors go
+            ('1-2 large Onions, chopped', (1, '', 'onion')),
+            ('3 Tomatoes (ripe)', (3, '', 'tomato')),
+            ('Salt to taste', (None, '', 'salt to taste')),
+            ('', (None, '', '')),
+        ]:
+            self.assertEqual(parse_ingredient(line), expected, line)
+
+    def test_split_lines(self):
+        # Legacy rows store stringified Python lists
+        self.assertEqual(split_ingredient_lines("['2 Bread', '2 Egg']"),
+                         ['2 Bread', '2 Egg'])
+        self.assertEqual(split_ingredient_lines('1 egg, 2 cups milk'),
+                         ['1 egg', '2 cups milk'])
+        self.assertEqual(split_ingredient_lines('1 egg\n\n2 cups milk, warm'),
+                         ['1 egg', '2 cups milk, warm'])
+        self.assertEqual(split_instruction_lines('Mix. Bake.'),
+                         ['Mix', 'Bake'])
+
+    def test_rows_follow_recipe_edits(self):
+        user = User.objects.create_user('parser', password='pass')
+        recipe = Recipe.objects.create(
+            title='Pancakes', description='test', category='breakfast',
+            ingredients='2 cups flour\n1 egg\nsalt',
+            instructions='Whisk\nFry', total_calories=500, protein=10,
+            carbs=80, fat=12, fiber=2, created_by=user)
+        rows = list(recipe.ingredient_rows.order_by('position').values_list(
+            'quantity', 'unit', 'ingredient__name', 'original_text'))
+        self.assertEqual(rows, [
+            (2, 'cup', 'flour', '2 cups flour'),
+            (1, '', 'egg', '1 egg'),
+            (None, '', 'salt', 'salt'),
+        ])
+
+        recipe.ingredients = '3 eggs\n100 ml milk'
+        recipe.instructions = 'Beat. Cook. Serve'
+        recipe.save()
+        rows = list(recipe.ingredient_rows.order_by('position').values_list(
+            'position', 'quantity', 'unit', 'ingredient__name'))
+        self.assertEqual(rows, [(0, 3, '', 'egg'), (1, 100, 'ml', 'milk')])
+        self.assertEqual(
+            list(recipe.steps.order_by('position').values_list(
+                'text', flat=True)), ['Beat', 'Cook', 'Serve'])
+        # Ingredients are shared by name, not duplicated per edit
+        self.assertEqual(Ingredient.objects.filter(name='egg').count(), 1)
+
+        # Saves that leave ingredients and instructions alone skip it
+        loaded = Recipe.objects.get(pk=recipe.pk)
+        loaded.title = 'Crepes'
+        loaded.image_status = 'pending'
+        with CaptureQueriesContext(connection) as captured:
+            loaded.save()
+        self.assertFalse(any(
+            'recipe_ingredient' in query or 'recipe_step' in query
+            for query in app_queries(captured)))
+
+        # The backfill rebuilds rows the signal never wrote
+        RecipeIngredient.objects.all().delete()
+        RecipeStep.objects.all().delete()
+        call_command('backfill_recipe_structure', stdout=StringIO())
+        self.assertEqual(recipe.ingredient_rows.count(), 2)
+        self.assertEqual(recipe.steps.count(), 3)
+
+
+class ShoppingListTests(TestCase):
+    """Units are converted, merged across the week and scaled"""
+
+    def test_merges_and_scales(self):
+        user = User.objects.create_user('shopper', password='pass')
+        porridge = Recipe.objects.create(
+            title='Porridge', description='test', servings=2,
+            ingredients='1 cup milk\n100 g rolled oats\n1 pinch salt',
+            total_calories=350, protein=12, carbs=55, fat=8, fiber=6,
+            category='breakfast', created_by=user)
+        pancakes = Recipe.objects.create(
+            title='Pancakes', description='test', servings=1,
+            ingredients='2 tbsp milk\n1 kg flour\nsalt',
+            total_calories=500, protein=10, carbs=80, fat=12, fiber=2,
+            category='snack', created_by=user)
+        start = date(2026, 3, 2)
+        for offset in range(2):
+            MealPlan.objects.create(
+                user=user, day=start + timedelta(days=offset),
+                breakfast_recipe=porridge, snack_recipe=pancakes)
+
+        items = {
+            (item['name'], item['unit']): item['quantity']
+            for item in build_shopping_list(
+                user, start, start + timedelta(days=6), people=2)
+        }
+        # 2 days x (1 cup for 2 people + 2 tbsp x 2 people)
+        self.assertEqual(items[('milk', 'ml')], 2 * (240 + 60))
+        self.assertEqual(items[('rolled oat', 'g')], 200)
+        self.assertEqual(items[('flour', 'kg')], 4)
+        self.assertEqual(items[('salt', 'pinch')], 2)
+        self.assertIsNone(items[('salt', '')])
+
+        # Second build is served from the cache
+        with CaptureQueriesContext(connection) as captured:
+            build_shopping_list(user, start, start + timedelta(days=6))
+        self.assertEqual(len(app_queries(captured)), 2)
+
+
+class DashboardTests(TestCase):
+    """The dashboard is cached per user and never writes"""
+
+    def test_cached_and_invalidated(self):
+        user = User.objects.create_user('dashboard', password='pass')
+        recipe = Recipe.objects.create(
+            title='Toast', description='test', ingredients='bread',
+            total_calories=300, protein=10, carbs=40, fat=8, fiber=3,
+            category='breakfast', created_by=user)
+
+        with CaptureQueriesContext(connection) as captured:
+            context = get_dashboard_context(user)
+        self.assertEqual(len(app_queries(captured)), 2)
+        self.assertIsNone(context['meal_plan'])
+        self.assertEqual(context['user_recipes_count'], 1)
+        with CaptureQueriesContext(connection) as captured:
+            get_dashboard_context(user)
+        self.assertEqual(app_queries(captured), [])
+        self.assertFalse(MealPlan.objects.filter(user=user).exists())
+
+        plan = MealPlan.objects.create(
+            user=user, day=date.today(), breakfast_recipe=recipe)
+        context = get_dashboard_context(user)
+        self.assertEqual(context['meal_plan_count'], 1)
+        self.assertEqual(context['total_calories'], 300)
+
+        key = DASHBOARD_CACHE_KEY.format(user_id=user.pk)
+        stale = cache.get(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.delete()
+            # Another worker rebuilt the dashboard before the commit
+            cache.set(key, stale)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(get_dashboard_context(user)['meal_plan_count'], 0)
+
+
+class NutritionAnalyticsTests(TestCase):
+    """Rolling windows, adherence and streaks over the day array"""
+
+    def test_streaks(self):
+        flags = np.array([1, 1, 0, 1, 1, 1, 0], dtype=bool)
+        self.assertEqual(streaks(flags), (3, 3))
+        self.assertEqual(streaks(np.array([1, 1, 0, 1], dtype=bool)), (1, 2))
+        self.assertEqual(streaks(np.zeros(5, dtype=bool)), (0, 0))
+
+    def test_history(self):
+        # Staff users get no profile, so the default 2000 kcal goal
+        user = User.objects.create_user(
+            'history', password='pass', is_staff=True)
+        recipes = {
+            slot: Recipe.objects.create(
+                title=slot, description='test', ingredients='x',
+                total_calories=500, protein=25, carbs=60, fat=15, fiber=5,
+                category=slot, created_by=user)
+            for slot in MEAL_SLOTS
+        }
+        end = date(2026, 3, 31)
+        # Five complete days ending on `end`, one half day before a gap
+        for offset in range(5):
+            MealPlan.objects.create(
+                user=user, day=end - timedelta(days=offset),
+                **{f'{slot}_recipe': recipe
+                   for slot, recipe in recipes.items()})
+        MealPlan.objects.create(
+            user=user, day=end - timedelta(days=6),
+            breakfast_recipe=recipes['breakfast'],
+            dinner_recipe=recipes['dinner'])
+
+        user = User.objects.select_related('profile').get(pk=user.pk)
+        with CaptureQueriesContext(connection) as captured:
+            analytics = nutrition_analytics(
+                user, end - timedelta(days=29), end)
+        # DailyNutrition totals, then the plans' recipe ids, no joins
+        queries = app_queries(captured)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('FROM "daily_nutrition"', queries[0])
+        self.assertFalse(any('JOIN' in sql for sql in queries))
+        summary = analytics['summary']
+        self.assertEqual(summary['planned_days'], 6)
+        self.assertEqual(summary['complete_days'], 5)
+        self.assertEqual(summary['current_streak'], 5)
+        # 2000 kcal goal: the complete days adhere, the half day does not
+        self.assertEqual(summary['adherence'], round(5 / 6 * 100, 1))
+        self.assertEqual(
+            summary['averages']['7']['total_calories'],
+            round((5 * 2000 + 1000) / 6, 1))
+        self.assertEqual(summary['variety']['distinct'], 4)
+        self.assertEqual(len(analytics['series']['day']), 30)
+        self.assertIsNone(analytics['series']['avg_7_total_calories'][0])
+
+
+class ProfileChangeTrackingTests(TestCase):
+    """Profile saves write only changed columns, logins none at all"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('tracked', password='pass')
+
+    def test_unchanged_save_is_skipped(self):
+        profile = UserProfile.objects.get(user=self.user)
+        with self.assertNumQueries(0):
+            profile.save()
+
+        profile.weight_kg = 80
+        with CaptureQueriesContext(connection) as captured:
+            profile.save()
+        self.assertEqual(len(app_queries(captured)), 1)
+        update = app_queries(captured)[0]
+        self.assertIn('"weight_kg"', update)
+        self.assertIn('"bmi"', update)
+        self.assertNotIn('"first_name"', update)
+        profile.refresh_from_db()
+        self.assertEqual(profile.bmi, round(80 / 1.7 ** 2, 2))
+
+    def test_login_leaves_profile_alone(self):
+        user = User.objects.get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.force_login(user)
+        self.assertFalse(any(
+            'user_profile' in query['sql'] for query in captured))
+
+
+class RecomputeProfilesTests(TestCase):
+    """Vectorized recomputation matches UserProfile.save()"""
+
+    def test_recompute(self):
+        user = User.objects.create_user('recompute', password='pass')
+        profile = user.profile
+        expected_bmi, expected_goal = profile.bmi, profile.daily_calorie_goal
+        UserProfile.objects.filter(pk=profile.pk).update(
+            bmi=None, daily_calorie_goal=1000)
+        # Missing age: BMI is recomputed, the stored goal is kept
+        partial = User.objects.create_user('partial', password='pass')
+        UserProfile.objects.filter(pk=partial.profile.pk).update(
+            age=None, bmi=None, daily_calorie_goal=1500)
+
+        out = StringIO()
+        call_command('recompute_profiles', '--dry-run', stdout=out)
+        self.assertIn('2 BMI and 1 calorie goal changes', out.getvalue())
+        profile.refresh_from_db()
+        self.assertIsNone(profile.bmi)
+
+        call_command('recompute_profiles', stdout=StringIO())
+        profile.refresh_from_db()
+        self.assertEqual(profile.bmi, expected_bmi)
+        self.assertEqual(profile.daily_calorie_goal, expected_goal)
+        partial.profile.refresh_from_db()
+        self.assertEqual(partial.profile.daily_calorie_goal, 1500)
+        self.assertIsNotNone(partial.profile.bmi)
+
+        call_command('recompute_profiles', '--activity-factor', '1.5',
+                     '--goal-offset', '-100', stdout=StringIO())
+        profile.refresh_from_db()
+        self.assertAlmostEqual(
+            profile.daily_calorie_goal,
+            round(expected_goal / 1.2 * 1.5 - 100, 2), places=1)
+
+
+class ImageSyncTests(TestCase):
+    """Concurrent uploads against the fake uploader, with resume"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('photographer', password='pass')
+        self.recipes = [
+            Recipe.objects.create(
+                title=f'Photo {index}', description='test', ingredients='x',
+                image_url=f'https://example.com/photo-{index}.jpg',
+                total_calories=100, protein=1, carbs=1, fat=1, fiber=1,
+                created_by=self.user)
+            for index in range(5)
+        ]
+        handle, self.checkpoint = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.checkpoint)
+        self.addCleanup(
+            lambda: os.path.exists(self.checkpoint)
+            and os.remove(self.checkpoint))
+
+    def test_retries_with_backoff(self):
+        uploader = FakeUploader(failures=2)
+        delays = []
+        result = upload_with_retry(
+            uploader, 'https://example.com/a.jpg', 'recipes/a',
+            retries=3, backoff=1, sleep=delays.append)
+        self.assertTrue(result['secure_url'].endswith('/recipes/a'))
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[1], 2)
+        with self.assertRaises(cloudinary.exceptions.RateLimited):
+            upload_with_retry(
+                FakeUploader(failures=5), 'https://example.com/b.jpg',
+                'recipes/b', retries=2, sleep=lambda delay: None)
+
+    def test_token_bucket(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(delay):
+            waits.append(delay)
+            now[0] += delay
+
+        bucket = TokenBucket(2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(6):
+            bucket.acquire()
+        # Burst of 2, then one token every half second
+        self.assertAlmostEqual(sum(waits), 2.0)
+
+    def test_sync_and_resume(self):
+        first, *rest = self.recipes
+        # An interrupted run uploaded the first image but never saved it
+        UploadLog(self.checkpoint).record(
+            first.pk, url='https://res.cloudinary.com/fake/first',
+            source='https://example.com/photo-0.jpg')
+        out = StringIO()
+        call_command(FakeSyncImagesCommand(),
+                     '--workers', '3', '--rate', '0', '--batch-size', '2',
+                     '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn('Total updated: 4', out.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint))
+        # The raw column; CloudinaryField reparses URLs on load
+        stored = dict(Recipe.objects.annotate(
+            raw=Cast('image_url', CharField())).values_list('id', 'raw'))
+        self.assertEqual(
+            stored[first.pk], 'https://res.cloudinary.com/fake/first')
+        for recipe in rest:
+            self.assertRegex(
+                stored[recipe.pk],
+                r'^https://res\.cloudinary\.com/fake/image/upload/recipes/'
+                rf'photo_{recipe.pk - first.pk}_{recipe.pk}_[0-9a-f]{{12}}$')
+
+    def test_failures_do_not_reapply_saved_uploads(self):
+        first, second, *_rest = self.recipes
+        out = StringIO()
+        call_command(FakeSyncImagesCommand(), '--rate', '0',
+                     '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn('Total updated: 5', out.getvalue())
+        # A run with a failure keeps only the failure in the log
+        UploadLog(self.checkpoint).record(second.pk, error='NotFound')
+        # An upload logged but not saved, then changed by the user
+        UploadLog(self.checkpoint).record(
+            first.pk, url='https://res.cloudinary.com/fake/stale',
+            source='https://example.com/photo-0.jpg')
+        Recipe.objects.filter(pk=first.pk).update(image_url='mine.jpg')
+
+        out = StringIO()
+        call_command(FakeSyncImagesCommand(), '--rate', '0',
+                     '--checkpoint', self.checkpoint, stdout=out)
+        self.assertIn('Resuming: saved 0 of 1', out.getvalue())
+        self.assertIn('Total failed: 1', out.getvalue())
+        raw = Recipe.objects.annotate(
+            raw=Cast('image_url', CharField())).get(pk=first.pk).raw
+        self.assertEqual(raw, 'mine.jpg')
+        self.assertEqual(UploadLog(self.checkpoint).read(),
+                         ({}, {second.pk: 'NotFound'}))
+
+    def test_manifest_skips_unchanged_and_duplicates(self):
+        sources = [f'https://example.com/photo-{index}.jpg'
+                   for index in range(5)]
+        # Three recipes share one picture
+        contents = {source: b'same' for source in sources[:3]}
+        uploader = FakeUploader(contents=contents)
+
+        def sync(*args):
+            call_command(FakeSyncImagesCommand(uploader), '--rate', '0',
+                         '--checkpoint', self.checkpoint, *args,
+                         stdout=StringIO())
+
+        sync()
+        self.assertEqual(sum(uploader.uploads.values()), 3)
+        manifest = {entry.recipe_id: entry
+                    for entry in ImageManifest.objects.all()}
+        self.assertEqual(len(manifest), 5)
+        self.assertEqual(
+            len({manifest[recipe.pk].secure_url
+                 for recipe in self.recipes[:3]}), 1)
+
+        # Same sources again (e.g. a re-import): no download, no upload
+        for recipe, source in zip(self.recipes, sources):
+            Recipe.objects.filter(pk=recipe.pk).update(image_url=source)
+        uploader.digests.clear()
+        sync()
+        self.assertEqual(sum(uploader.digests.values()), 0)
+        self.assertEqual(sum(uploader.uploads.values()), 3)
+
+        # Only the picture whose content changed is sent again
+        for recipe, source in zip(self.recipes, sources):
+            Recipe.objects.filter(pk=recipe.pk).update(image_url=source)
+        contents[sources[4]] = b'edited'
+        sync('--rehash')
+        self.assertEqual(sum(uploader.digests.values()), 5)
+        self.assertEqual(uploader.uploads[sources[4]], 2)
+        self.assertEqual(sum(uploader.uploads.values()), 4)
+
+
+class ImageVerificationTests(TestCase):
+    """Listing pages are reconciled against the recipes in one pass"""
+
+    def test_reconcile(self):
+        base = 'https://res.cloudinary.com/demo/image/upload/v1/'
+        recipes = [
+            # As CloudinaryField stores an assigned URL
+            (1, 'Kept', 'image/upload/' + base + 'recipes/kept%281%29.jpg'),
+            (2, 'Gone', base + 'recipes/gone.jpg'),
+            (3, 'Elsewhere', 'https://res.cloudinary.com/other/image/'
+                             'upload/recipes/kept.jpg'),
+            (4, 'Outside', base + 'avatars/me.png'),
+            (5, 'External', 'https://example.com/photo.jpg'),
+            (6, 'Default', 'default.jpg'),
+            # The field's own upload, stored without a host
+            (7, 'Native', 'image/upload/v3/recipes/native.png'),
+        ]
+        listed = [f'recipes/{index}' for index in range(1200)]
+        lister = FakeLister(
+            listed + ['recipes/kept(1)', 'recipes/native', 'avatars/me'])
+
+        public_ids = list_public_ids(lister, 'recipes/', page_size=500)
+        self.assertEqual(lister.calls, 3)
+        self.assertEqual(len(public_ids), 1202)
+
+        report = reconcile_images(public_ids, recipes, 'demo', 'recipes/')
+        self.assertEqual(report['checked'], 7)
+        self.assertEqual(report['valid'], 2)
+        self.assertEqual(report['external'], 2)
+        self.assertEqual(report['missing'], [(2, 'Gone', 'recipes/gone')])
+        self.assertEqual(
+            [row[0] for row in report['mismatched']], [3, 4])
+        self.assertEqual(len(report['orphaned']), 1200)
+
+
+class ImageVariantsTests(TestCase):
+    """Renditions are derived when the image changes and read from rows"""
+
+    def test_variants(self):
+        base = 'https://res.cloudinary.com/demo/image/upload/v7/'
+        variants = image_variants(
+            'image/upload/' + base + 'recipes/kept%281%29.jpg')
+        self.assertEqual(
+            variants['card'],
+            'https://res.cloudinary.com/demo/image/upload/'
+            'c_fill,g_auto,w_480,h_320,f_auto,q_auto/v7/recipes/kept%281%29')
+        self.assertEqual(variants['srcset'].count('w_'), 4)
+        self.assertIn('e_blur', variants['placeholder'])
+
+        native = image_variants('image/upload/v3/recipes/native.png', 'me')
+        self.assertIn('/me/image/upload/c_limit,w_1200,f_auto,q_auto/v3/'
+                      'recipes/native', native['hero'])
+        external = image_variants('https://example.com/photo.jpg')
+        self.assertEqual(external['card'], 'https://example.com/photo.jpg')
+        self.assertNotIn('srcset', external)
+        self.assertEqual(image_variants('default.jpg'),
+                         {'source': 'default.jpg'})
+
+    def test_saved_once_and_backfilled(self):
+        user = User.objects.create_user('cook', password='pass')
+        recipe = Recipe.objects.create(
+            title='Toast', description='test', ingredients='bread',
+            image_url='https://res.cloudinary.com/demo/image/upload/v1/'
+                      'recipes/toast.jpg',
+            total_calories=100, protein=1, carbs=1, fat=1, fiber=1,
+            created_by=user)
+        recipe.refresh_from_db()
+        self.assertIn('w_480', recipe.image_variants['card'])
+
+        # Unchanged image: no second write of the renditions
+        recipe.title = 'Buttered toast'
+        with CaptureQueriesContext(connection) as queries:
+            recipe.save()
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "recipe" SET "image_variants"')
+            for query in queries.captured_queries))
+
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, 'srcset="')
+        self.assertContains(response, recipe.image_variants['card'])
+
+        # Writes that skip the signals are picked up by the backfill
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_url='https://example.com/toast.jpg')
+        call_command('backfill_image_variants', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(
+            recipe.image_variants['card'], 'https://example.com/toast.jpg')
+
+    def test_backfill_inlines_placeholders(self):
+        user = User.objects.create_user('cook', password='pass')
+        recipe = Recipe.objects.create(
+            title='Toast', description='test', ingredients='bread',
+            image_url='https://res.cloudinary.com/demo/image/upload/v1/'
+                      'recipes/toast.jpg',
+            total_calories=100, protein=1, carbs=1, fat=1, fiber=1,
+            created_by=user)
+        recipe.refresh_from_db()
+        self.assertTrue(
+            recipe.image_variants['placeholder'].startswith('https://'))
+
+        command = 'mealapp.management.commands.backfill_image_variants'
+        with mock.patch(f'{command}.inline_placeholder') as fetch:
+            call_command('backfill_image_variants', '--url-placeholders',
+                         stdout=StringIO())
+            fetch.assert_not_called()
+            fetch.return_value = 'data:image/jpeg;base64,AA=='
+            call_command('backfill_image_variants', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['placeholder'],
+                         'data:image/jpeg;base64,AA==')
+
+
+class ImageUploadTests(TestCase):
+    """Form uploads are staged and pushed to Cloudinary off-request"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('baker', password='pass')
+        self.client.login(username='baker', password='pass')
+
+    def recipe_data(self, **values):
+        return {
+            'title': 'Scones', 'description': 'test', 'servings': 4,
+            'prep_time_minutes': 10, 'cook_time_minutes': 15,
+            'category': 'breakfast', 'total_calories': 300, 'carbs': 40,
+            'protein': 6, 'fat': 12, 'fiber': 2,
+            'ingredients_text': 'flour\nbutter', 'instructions_text': 'Bake',
+            **values,
+        }
+
+    def post_recipe(self, image, url=None):
+        return self.client.post(
+            url or reverse('recipe_create'), self.recipe_data(image_url=image))
+
+    def test_recipe_saved_with_pending_image(self):
+        image = SimpleUploadedFile(
+            'scones.jpg', b'jpeg bytes', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.post_recipe(image)
+        self.assertEqual(response.status_code, 302)
+        # The upload, and the owner's dashboard invalidation
+        self.assertEqual(len(callbacks), 2)
+        recipe = Recipe.objects.get(title='Scones')
+        self.assertEqual(recipe.image_status, 'pending')
+        # Staged in the database, where any process can pick it up
+        upload = ImageUpload.objects.get(object_id=recipe.pk)
+        self.assertEqual(bytes(upload.data), b'jpeg bytes')
+
+        uploader = FakeUploader()
+        self.assertTrue(process_upload(upload.pk, uploader=uploader))
+        self.assertEqual(uploader.uploads[b'jpeg bytes'], 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, 'ready')
+        raw = Recipe.objects.annotate(
+            raw=Cast('image_url', CharField())).get(pk=recipe.pk).raw
+        self.assertRegex(raw, rf'^image/upload/v1/recipe_{recipe.pk}_\w+\.jpg')
+        self.assertIn('w_480', recipe.image_variants['card'])
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_failed_and_superseded_uploads(self):
+        response = self.post_recipe(SimpleUploadedFile(
+            'notes.txt', b'text', content_type='text/plain'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Recipe.objects.exists())
+
+        with self.captureOnCommitCallbacks():
+            self.post_recipe(SimpleUploadedFile(
+                'a.jpg', b'first', content_type='image/jpeg'))
+        recipe = Recipe.objects.get()
+        first = ImageUpload.objects.get()
+        uploader = FakeUploader(missing={b'first'})
+        self.assertFalse(process_upload(first.pk, uploader, backoff=0))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, 'failed')
+
+        # Editing with a new image supersedes the failed upload
+        with self.captureOnCommitCallbacks():
+            self.post_recipe(
+                SimpleUploadedFile('b.jpg', b'second',
+                                   content_type='image/jpeg'),
+                reverse('recipe_update', args=[recipe.pk]))
+        second = ImageUpload.objects.latest('id')
+        self.assertFalse(process_upload(first.pk, uploader, backoff=0))
+        self.assertTrue(process_upload(second.pk, uploader, backoff=0))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, 'ready')
+        self.assertFalse(ImageUpload.objects.exists())
+
+
+    def test_stale_saves_keep_finished_upload(self):
+        with self.captureOnCommitCallbacks():
+            self.post_recipe(SimpleUploadedFile(
+                'a.jpg', b'jpeg', content_type='image/jpeg'))
+        recipe = Recipe.objects.get()
+        # An edit form loaded while the upload is still pending
+        form = RecipeForm(self.recipe_data(title='Cream scones'),
+                          instance=Recipe.objects.get(pk=recipe.pk))
+        self.assertTrue(process_upload(
+            ImageUpload.objects.get().pk, uploader=FakeUploader()))
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Cream scones')
+        self.assertEqual(recipe.image_status, 'ready')
+        self.assertIn('w_480', recipe.image_variants['card'])
+
+        profile = UserProfile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks():
+            stage_image(profile, SimpleUploadedFile(
+                'me.jpg', b'jpeg', content_type='image/jpeg'))
+        stale = UserProfile.objects.get(pk=profile.pk)
+        self.assertTrue(process_upload(
+            ImageUpload.objects.get().pk, uploader=FakeUploader()))
+        stale.age = 40
+        stale.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.age, 40)
+        self.assertEqual(profile.user_image_status, 'ready')
+        self.assertIn('profile_', str(profile.user_image))
+
+
+class RecipeImportTests(TestCase):
+    """Streaming import with validation and upserts on the natural key"""
+
+    def test_iter_json_records(self):
+        records = [{'title': f'Recipe {index}', 'note': '[{,}]'}
+                   for index in range(5)]
+        for text in (json.dumps(records, indent=2),
+                     '\n'.join(json.dumps(record) for record in records)):
+            self.assertEqual(
+                list(iter_json_records(StringIO(text), chunk_size=7)),
+                records)
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_records(StringIO('[{"title": 1}, {"ti'), 7))
+
+    def test_import_fixtures(self):
+        User.objects.create_user('chef', password='pass')
+        out = StringIO()
+        call_command(
+            'import_recipes', 'fixtures/all_recipes.json',
+            'fixtures/breakfast_recipes.json', '--owner', 'chef',
+            stdout=out)
+        self.assertIn('Created: 36, updated: 0, duplicates skipped: 8',
+                      out.getvalue())
+        recipe = Recipe.objects.get(title='Bread omelette')
+        self.assertEqual(recipe.ingredients, '2 Bread\n2 Egg\n0.5 Salt')
+        self.assertEqual(recipe.ingredient_rows.count(), 3)
+        self.assertEqual(recipe.created_by.stats.recipe_count, 36)
+
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as stream:
+            for record in [
+                {'title': '  bread   OMELETTE ', 'category': 'Breakfast',
+                 'ingredients': '2 Bread, 3 Egg', 'total_calories': 250,
+                 'protein': 9, 'carbs': 26, 'fat': 8, 'fiber': 2},
+                {'title': 'Mystery', 'category': 'brunch',
+                 'ingredients': ['1 Egg']},
+            ]:
+                stream.write(json.dumps(record) + '\n')
+        out = StringIO()
+        call_command('import_recipes', path, '--owner', 'chef', stdout=out)
+        self.assertIn('Created: 0, updated: 1', out.getvalue())
+        self.assertIn("unknown category: 'brunch'", out.getvalue())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.total_calories, 250)
+        self.assertEqual(recipe.ingredients, '2 Bread\n3 Egg')
+        self.assertEqual(Recipe.objects.count(), 36)
+
+    def test_renamed_recipe_still_matches(self):
+        chef = User.objects.create_user('chef', password='pass')
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        os.close(handle)
+
+        def import_titled(title, calories):
+            with open(path, 'w') as stream:
+                stream.write(json.dumps({
+                    'title': title, 'category': 'breakfast',
+                    'ingredients': ['1 Egg'], 'total_calories': calories,
+                    'protein': 6, 'carbs': 1, 'fat': 5, 'fiber': 0}))
+            out = StringIO()
+            call_command('import_recipes', path, '--owner', 'chef',
+                         stdout=out)
+            return out.getvalue()
+
+        self.assertIn('Created: 1', import_titled('Pancakes', 200))
+        recipe = Recipe.objects.get()
+        recipe.title = 'Crepes'
+        recipe.save()
+        # e.g. an export of the renamed recipe, imported again
+        self.assertIn('Created: 0, updated: 1', import_titled('Crepes', 180))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.total_calories, 180)
+
+        # A title another recipe of the owner already has keeps no key
+        Recipe.objects.create(
+            title='Omelette', description='test', ingredients='2 Egg',
+            total_calories=150, protein=12, carbs=1, fat=10, fiber=0,
+            created_by=chef)
+        recipe.title = 'omelette'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertIsNone(recipe.import_key)
+
+
+class ExportTests(TestCase):
+    """Streaming NDJSON and CSV exports of recipes and meal plans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            'exporter', password='pass', is_staff=True)
+        cls.user = User.objects.create_user('eater', password='pass')
+        cls.recipe = Recipe.objects.create(
+            title='Porridge, with "honey"', category='breakfast',
+            ingredients='1 cup Oats', created_by=cls.staff,
+            total_calories=300, protein=10, carbs=50, fat=5, fiber=8)
+        for offset in range(3):
+            MealPlan.objects.create(
+                user=cls.user, day=date(2024, 5, 1) + timedelta(days=offset),
+                breakfast_recipe=cls.recipe)
+        MealPlan.objects.create(user=cls.staff, day=date(2024, 5, 2))
 
-# Create your tests here.
-from mealapp.models import Recipe
+    def test_meal_plans_resolve_titles_and_filter(self):
+        chunks = export_chunks(
+            'meal-plans', 'ndjson', users=['eater'],
+            since=date(2024, 5, 2), chunk_size=1)
+        rows = [json.loads(line)
+                for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([row['day'] for row in rows],
+                         ['2024-05-02', '2024-05-03'])
+        self.assertEqual(rows[0]['breakfast'], 'Porridge, with "honey"')
+        self.assertEqual(rows[0]['username'], 'eater')
+        self.assertIsNone(rows[0]['lunch'])
 
-# Update a single recipe
-recipe = Recipe.objects.first()
-recipe.image_url = 'https://res.cloudinary.com/YOUR_CLOUD_'
-'NAME/image/upload/v1234567890/recipe.jpg'
-recipe.save()
+    def test_compressed_csv(self):
+        data = gzip.decompress(b''.join(
+            export_chunks('recipes', 'csv', 'gzip')))
+        rows = list(csv.DictReader(data.decode().splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Porridge, with "honey"')
+        self.assertEqual(rows[0]['username'], 'exporter')
 
-# Or update multiple recipes
-Recipe.objects.filter(title='Oatmeal').update(
-    image_url='https://res.cloudinary.com/YOUR_CLOUD_NAME/'
-    'image/upload/v1234567890/oatmeal.jpg'
-)
+    def test_export_api_is_staff_only(self):
+        url = reverse('export_api', args=['meal-plans'])
+        self.client.login(username='eater', password='pass')
+        self.assertEqual(self.client.get(url).status_code, 403)
 
-exit()
+        self.client.login(username='exporter', password='pass')
+        response = self.client.get(
+            url, {'format': 'csv', 'from': '2024-05-02', 'to': '2024-05-02'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            self.client.get(url, {'from': 'May'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(url, {'compress': 'brotli'}).status_code, 400)
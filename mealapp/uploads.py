@@ -0,0 +1,137 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .images import CloudinaryUploader, image_variants, upload_with_retry
+from .models import ImageUpload, Recipe, UserProfile
+from .stats import invalidate_dashboard
+
+# Images uploaded through forms are staged in the database and pushed to
+# Cloudinary by a small thread pool in the web process, so a request
+# never waits on Cloudinary. Staged files outlive a dyno restart or
+# deploy; process_image_uploads, run from any dyno, retries leftovers.
+
+# Concurrent uploads per web process, and retries of each
+UPLOAD_WORKERS = 2
+UPLOAD_RETRIES = 3
+
+# Cloudinary's upload limit for images on the free plan
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# kind: (model, lookup of ImageUpload.object_id, image field,
+#        status field, Cloudinary folder)
+TARGETS = {
+    'recipe': (Recipe, 'pk', 'image_url', 'image_status', 'recipes'),
+    'profile': (UserProfile, 'user_id', 'user_image', 'user_image_status',
+                'profiles'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _target(instance):
+    if isinstance(instance, Recipe):
+        return 'recipe', instance.pk
+    return 'profile', instance.user_id
+
+
+def _changed(kind, object_id):
+    """Invalidate what renders the image, as the save signals would"""
+    if kind == 'recipe':
+        bump_catalog_version()
+    else:
+        invalidate_dashboard(object_id)
+
+
+def _set(kind, object_id, **values):
+    model, lookup, *_rest = TARGETS[kind]
+    model.objects.filter(**{lookup: object_id}).update(
+        updated_at=timezone.now(), **values)
+
+
+def stage_image(instance, uploaded_file):
+    """
+    Stage `uploaded_file` in the database, mark the recipe's or profile's
+    image pending and upload it once the transaction commits. The
+    current image is kept until then.
+    """
+    kind, object_id = _target(instance)
+    status_field = TARGETS[kind][3]
+    # Forms cap images at MAX_IMAGE_BYTES
+    upload = ImageUpload.objects.create(
+        kind=kind, object_id=object_id,
+        data=b''.join(uploaded_file.chunks()))
+    setattr(instance, status_field, 'pending')
+    _set(kind, object_id, **{status_field: 'pending'})
+    _changed(kind, object_id)
+    transaction.on_commit(lambda: submit_upload(upload.pk))
+    return upload
+
+
+def submit_upload(upload_id):
+    """Queue an upload on this process's worker threads"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+    return _executor.submit(run_upload, upload_id)
+
+
+def run_upload(upload_id, retries=UPLOAD_RETRIES):
+    """process_upload on a worker thread"""
+    try:
+        return process_upload(upload_id, retries=retries)
+    finally:
+        # Worker threads open their own connection
+        connection.close()
+
+
+def process_upload(upload_id, uploader=None, retries=UPLOAD_RETRIES,
+                   backoff=1.0):
+    """
+    Push a staged image to Cloudinary and set it on its recipe or
+    profile. Uploads superseded by a newer one for the same object are
+    dropped. Returns True if the image was set.
+    """
+    upload = ImageUpload.objects.filter(pk=upload_id).first()
+    if upload is None:
+        # Already handled, or the retry command got there first
+        return False
+    kind, object_id = upload.kind, upload.object_id
+    _model, _lookup, field, status_field, folder = TARGETS[kind]
+    if ImageUpload.objects.filter(
+            kind=kind, object_id=object_id, pk__gt=upload.pk).exists():
+        upload.delete()
+        return False
+
+    try:
+        result = upload_with_retry(
+            uploader or CloudinaryUploader(), bytes(upload.data),
+            f'{kind}_{object_id}_{uuid.uuid4().hex[:8]}', retries, backoff,
+            folder=folder)
+    except Exception as error:
+        ImageUpload.objects.filter(pk=upload.pk).update(
+            status='failed', attempts=F('attempts') + 1,
+            error=str(error)[:1000], updated_at=timezone.now())
+        _set(kind, object_id, **{status_field: 'failed'})
+        _changed(kind, object_id)
+        return False
+
+    # How CloudinaryField stores its own uploads
+    value = (f"image/upload/v{result['version']}/{result['public_id']}"
+             f".{result['format']}")
+    values = {field: value, status_field: 'ready'}
+    if kind == 'recipe':
+        values['image_variants'] = image_variants(value)
+    with transaction.atomic():
+        _set(kind, object_id, **values)
+        upload.delete()
+    _changed(kind, object_id)
+    return True
@@ -8,6 +8,7 @@ urlpatterns = [
     path('profile/', views.profile_setup, name='profile_setup'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('help/', views.help_page, name='help'),
+    path('analytics/', views.analytics_view, name='analytics'),
     # Recipe CRUD
     path('recipes/create/',
          views.RecipeCreateView.as_view(),
@@ -36,4 +37,26 @@ urlpatterns = [
     path('meal-plan/<int:plan_id>/delete/',
          views.delete_meal_plan, name='meal_plan_delete'),
 
+    # API
+    path('shopping-list/', views.shopping_list_view, name='shopping_list'),
+    path('api/shopping-list/', views.shopping_list_api,
+         name='shopping_list_api'),
+    path('api/recipes/', views.recipe_api, name='recipe_api'),
+    path('api/recipes/suggest/', views.recipe_suggest,
+         name='recipe_suggest'),
+    path('api/meal-plans/', views.meal_plan_calendar_api,
+         name='meal_plan_calendar_api'),
+    path('api/analytics/', views.analytics_api, name='analytics_api'),
+    path('api/meal-plans/nutrition/', views.meal_plan_nutrition_api,
+         name='meal_plan_nutrition_api'),
+    path('api/meal-plans/generate/', views.meal_plan_generate_api,
+         name='meal_plan_generate_api'),
+    path('api/meal-plans/bulk/', views.meal_plan_bulk_api,
+         name='meal_plan_bulk_api'),
+    path('api/meal-plans/copy-week/', views.meal_plan_copy_week_api,
+         name='meal_plan_copy_week_api'),
+    path('api/meal-plans/repeat/', views.meal_plan_repeat_api,
+         name='meal_plan_repeat_api'),
+    path('api/export/<slug:kind>/', views.export_api, name='export_api'),
+
 ]
@@ -2,75 +2,82 @@ from multiprocessing import context
 from unicodedata import category
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, render, redirect
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.core.paginator import Paginator
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import CharField, Q
+from django.db.models.functions import Cast
 from django.urls import reverse_lazy
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from requests import request
 from mealapp.forms import MealPlanForm
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from datetime import datetime, date
-from .models import MealPlan, Recipe, UserProfile
+from datetime import datetime, date, timedelta
+from .analytics import (
+    ANALYTICS_DAYS, MAX_ANALYTICS_DAYS, nutrition_analytics)
+from .catalog import (
+    get_catalog_snapshot, get_recipe_choices, suggest_recipes)
+from .conditional import (
+    cache_headers, catalog_condition, meal_plan_condition, recipe_condition)
+from .dashboard import get_dashboard_context
+from .export import (
+    EXPORTS, export_chunks, export_content_type, export_filename)
+from .generator import generate_meal_plans, save_meal_plans
+from .ingredients import split_ingredient_lines, split_instruction_lines
+from .models import (
+    MEAL_SLOTS, DailyNutrition, MealPlan, Recipe, UserProfile)
+from .pagination import (
+    KeysetPaginator, OffsetCursorPaginator, estimated_count)
+from .planning import (
+    WEEKDAYS, calendar_as_json, copy_week, meal_plan_calendar, parse_day,
+    parse_range, repeat_plan, upsert_meal_plans, with_slot_recipes)
+from .search import RANKED_ORDER, get_search_backend
+from .shopping import build_shopping_list
+from .streaming import json_array_chunks, ndjson_lines
+from .uploads import stage_image
 from .forms import ProfileSetupForm, MealPlanForm, RecipeForm
 from os import path
 import json
-import re
+
+# Keyset orderings (unique, index-backed) for cursor pagination
+RECIPE_KEYSET = ('-created_at', 'id')
+MEAL_PLAN_KEYSET = ('-day',)
+
+# Longest span the generator endpoint proposes at once
+MAX_GENERATED_DAYS = 28
+
+# Largest household the shopping list scales to
+MAX_PEOPLE = 20
+
+# Recipes rendered per slot in the meal plan editor; typeahead does the rest
+EDITOR_INLINE_CHOICES = 50
+MAX_SUGGESTIONS = 50
+
 # Home & Index
 
 
+@cache_headers
+@catalog_condition
 def index(request):
     search = request.GET.get('search', '')
-    page_number = request.GET.get('page', 1)
-
-    # Get all recipes
-    all_recipes = Recipe.objects.all()
     category = request.GET.get('category', '')
-    if category:
-        all_recipes = all_recipes.filter(category=category)
 
-    if search:
-        all_recipes = all_recipes.filter(
-            Q(title__icontains=search) |
-            Q(description__icontains=search) |
-            Q(category__icontains=search)
-        )
-
-    # Serialize ALL recipes manually to handle JSONField and CloudinaryField
-    recipes_data = []
-    for recipe in all_recipes:
-        try:
-            recipes_data.append({
-                'id': recipe.id,
-                'recipe_name': recipe.title,
-                'category': recipe.category,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients if isinstance(
-                    recipe.ingredients, list) else [],
-                'instructions': recipe.instructions if isinstance(
-                    recipe.instructions, list) else [],
-                'image_url': recipe.image_url.url if hasattr(
-                    recipe.image_url, 'url') else str(recipe.image_url),
-                'prep_time_minutes': recipe.prep_time_minutes,
-                'total_calories': recipe.total_calories,
-                'servings': recipe.servings,
-                'protein': recipe.protein,
-                'carbs': recipe.carbs,
-                'fat': recipe.fat,
-                'fiber': recipe.fiber,
-            })
-        except Exception as e:
-            print(f"Error serializing recipe {recipe.id}: {e}")
-            continue
-
-    # Pagination - 12 recipes per page
-    paginator = Paginator(all_recipes, 12)
-    page_obj = paginator.get_page(page_number)
+    # Serve cards and JSON from the shared, pre-serialized catalog
+    # snapshot instead of walking every Recipe on each request
+    snapshot = get_catalog_snapshot()
+    recipes, recipes_json = snapshot.slice(category, search)
+
+    # Cursor pagination - 12 recipes per page, sliced from the snapshot
+    paginator = OffsetCursorPaginator(recipes, 12)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
         'recipes': page_obj,
-        'recipes_json': json.dumps(recipes_data),
+        'recipes_json': recipes_json.decode(),
+        'recipe_count': len(recipes),
         'search_term': search,
         'page_obj': page_obj,
         'is_paginated': page_obj.has_other_pages(),
@@ -98,11 +105,11 @@ def profile_setup(request):
             profile.gender = form.cleaned_data.get('gender')
             profile.height_cm = form.cleaned_data.get('height_cm')
             profile.weight_kg = form.cleaned_data.get('weight_kg')
-            profile.daily_calorie_goal = form.cleaned_data.get(
-                'daily_calorie_goal')
-            profile.bmi = form.cleaned_data.get('bmi')
 
+            # Writes only changed fields; BMI and calorie goal are
+            # recalculated when age, gender, height or weight changed
             profile.save()
+            _stage_form_image(request, profile, form, 'user_image')
             messages.success(
                 request,
                 f'✅ Profile saved! Your BMI is {
@@ -127,33 +134,8 @@ def profile_setup(request):
 @login_required(login_url='account_login')
 def dashboard(request):
     """User dashboard view showing meal plans and progress"""
-    user_profile, created = UserProfile.objects.get_or_create(
-        user=request.user)
-
-    # Get today's meal plan
-    today = date.today()
-    meal_plan, created = MealPlan.objects.get_or_create(
-        user=request.user,
-        day=today
-    )
-
-    # Get user's recipes count
-    user_recipes_count = Recipe.objects.filter(created_by=request.user).count()
-
-    # Calculate remaining calories
-    total_calories = meal_plan.get_total_calories()
-    remaining_calories = (
-        user_profile.daily_calorie_goal or 0) - total_calories
-
-    context = {
-        'user_profile': user_profile,
-        'meal_plan': meal_plan,
-        'today': today,
-        'total_calories': total_calories,
-        'remaining_calories': remaining_calories,
-        'user_recipes_count': user_recipes_count,
-        'today': date.today(),
-    }
+    # Read-only and cached per user; see mealapp.dashboard
+    context = get_dashboard_context(request.user)
     return render(request, 'mealapp/dashboard.html', context)
 
 
@@ -161,15 +143,141 @@ def dashboard(request):
 @login_required
 def meal_plan_list_view(request):
     """List all meal plans for the user, sorted by date (newest first)"""
-    meal_plans = MealPlan.objects.filter(user=request.user).order_by('-day')
+    if 'from' in request.GET or 'to' in request.GET:
+        return meal_plan_calendar_view(request)
+
+    meal_plans = MealPlan.objects.filter(user=request.user).with_nutrition()
+    paginator = KeysetPaginator(
+        with_slot_recipes(meal_plans), MEAL_PLAN_KEYSET, 30)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     context = {
-        'meal_plans': meal_plans,
+        'meal_plans': page_obj,
+        'meal_plan_total': estimated_count(meal_plans),
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
         'is_list_view': True,
     }
     return render(request, 'mealapp/meal_plan.html', context)
 
 
+def meal_plan_calendar_view(request):
+    """Week/month calendar of meal plans for ?from=&to="""
+    start, end = parse_range(request.GET)
+    span = (end - start).days + 1
+    days = meal_plan_calendar(request.user, start, end)
+
+    context = {
+        'days': days,
+        'start': start,
+        'end': end,
+        'previous_start': start - timedelta(days=span),
+        'previous_end': start - timedelta(days=1),
+        'next_start': end + timedelta(days=1),
+        'next_end': end + timedelta(days=span),
+    }
+    return render(request, 'mealapp/meal_plan_calendar.html', context)
+
+
+@login_required
+def meal_plan_calendar_api(request):
+    """JSON variant of the meal plan calendar"""
+    start, end = parse_range(request.GET)
+    days = meal_plan_calendar(request.user, start, end)
+    return JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': calendar_as_json(days),
+    })
+
+
+@login_required
+def meal_plan_nutrition_api(request):
+    """Daily and weekly nutrition totals for ?from=&to="""
+    start, end = parse_range(request.GET)
+    rollup = DailyNutrition.objects.filter(
+        user=request.user, day__range=(start, end)).rollup()
+    return JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'days': rollup['days'],
+        'weeks': rollup['weeks'],
+    })
+
+
+def _analytics_params(request):
+    """?to= (default today) and ?days= ending on it"""
+    end = parse_day(request.GET.get('to')) or date.today()
+    try:
+        days = int(request.GET.get('days', ANALYTICS_DAYS))
+    except ValueError:
+        days = ANALYTICS_DAYS
+    days = min(max(days, 1), MAX_ANALYTICS_DAYS)
+    return end - timedelta(days=days - 1), end
+
+
+@login_required
+def analytics_view(request):
+    """Nutrition history: rolling averages, adherence and streaks"""
+    start, end = _analytics_params(request)
+    analytics = nutrition_analytics(request.user, start, end)
+    averages = analytics['summary']['averages']
+    rows = [
+        (field.replace('total_', '').capitalize(), target,
+         averages['7'][field], averages['30'][field])
+        for field, target in analytics['targets'].items()
+    ]
+    return render(request, 'mealapp/analytics.html', {
+        'analytics': analytics,
+        'summary': analytics['summary'],
+        'rows': rows,
+        'start': start,
+        'end': end,
+        'days': (end - start).days + 1,
+    })
+
+
+@login_required
+def analytics_api(request):
+    """JSON variant of the analytics page, with the daily series"""
+    start, end = _analytics_params(request)
+    return JsonResponse(nutrition_analytics(request.user, start, end))
+
+
+def _shopping_params(request):
+    start, end = parse_range(request.GET)
+    try:
+        people = min(max(int(request.GET.get('people', 1)), 1), MAX_PEOPLE)
+    except ValueError:
+        people = 1
+    return start, end, people
+
+
+@login_required
+def shopping_list_view(request):
+    """Merged ingredients of the planned meals for ?from=&to="""
+    start, end, people = _shopping_params(request)
+    context = {
+        'items': build_shopping_list(request.user, start, end, people),
+        'start': start,
+        'end': end,
+        'people': people,
+    }
+    return render(request, 'mealapp/shopping_list.html', context)
+
+
+@login_required
+def shopping_list_api(request):
+    """JSON variant of the shopping list"""
+    start, end, people = _shopping_params(request)
+    return JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'people': people,
+        'items': build_shopping_list(request.user, start, end, people),
+    })
+
+
 @login_required
 def meal_plan_current(request):
     """Redirect to today's meal plan"""
@@ -183,7 +291,41 @@ def create_meal_plan(request):
     return redirect('meal_plan_list')
 
 
+def _save_posted_slots(request, day):
+    """Upsert the four posted <select> values for one day"""
+    try:
+        upsert_meal_plans(request.user, {
+            day: {slot: request.POST.get(slot) for slot in MEAL_SLOTS}})
+    except ValueError as error:
+        messages.error(request, str(error))
+        return False
+    return True
+
+
+def meal_plan_choices(meal_plan):
+    """
+    Options rendered inline in each slot's <select>: the first
+    EDITOR_INLINE_CHOICES titles plus the current pick. The rest is
+    fetched on demand from recipe_suggest.
+    """
+    choices = get_recipe_choices()
+    slots = {}
+    for slot in MEAL_SLOTS:
+        options = choices.get(slot, [])
+        inline = options[:EDITOR_INLINE_CHOICES]
+        current = getattr(meal_plan, f'{slot}_recipe')
+        if current and all(pk != current.id for pk, _title in inline):
+            inline = [(current.id, current.title)] + inline
+        slots[slot] = {
+            'choices': inline,
+            'more': len(options) > EDITOR_INLINE_CHOICES,
+        }
+    return slots
+
+
 @login_required
+@cache_headers
+@meal_plan_condition
 def meal_plan_view(request, date):
     """View/Edit meal plan for a specific date"""
     try:
@@ -191,46 +333,167 @@ def meal_plan_view(request, date):
     except ValueError:
         return redirect('dashboard')
 
-    meal_plan, created = MealPlan.objects.get_or_create(
-        user=request.user,
-        day=parsed_date
-    )
-    recipes = Recipe.objects.all().order_by('category', 'title')
+    # Writes are single upserts, so concurrent tabs cannot race on
+    # the (user, day) constraint
+    if request.method == 'POST' and 'auto_fill' in request.POST:
+        plans = generate_meal_plans(request.user, parsed_date, days=1)
+        save_meal_plans(request.user, plans)
+        messages.success(
+            request, 'Meal plan filled in to match your calorie goal.')
+        return redirect('meal_plan_view', date=date)
 
     if request.method == 'POST':
-        meal_plan.breakfast_recipe_id = request.POST.get('breakfast')
-        meal_plan.lunch_recipe_id = request.POST.get('lunch')
-        meal_plan.dinner_recipe_id = request.POST.get('dinner')
-        meal_plan.snack_recipe_id = request.POST.get('snack')
-        meal_plan.save()
-        messages.success(request, 'Meal plan updated successfully!')
+        if _save_posted_slots(request, parsed_date):
+            messages.success(request, 'Meal plan updated successfully!')
         return redirect('dashboard')
 
+    # Nothing is created until the user saves the plan
+    meal_plan = with_slot_recipes(MealPlan.objects.with_nutrition()).filter(
+        user=request.user, day=parsed_date).first()
+    if meal_plan is None:
+        meal_plan = MealPlan(user=request.user, day=parsed_date)
+
     return render(request, 'mealapp/meal_plan.html', {
         'meal_plan': meal_plan,
-        'recipes': recipes,
+        'slot_choices': meal_plan_choices(meal_plan),
         'date': parsed_date,
     })
 
 
+@login_required
+def meal_plan_generate_api(request):
+    """
+    Propose plans for ?from= (default today) and ?days= (default 7).
+    POST also saves them over the existing plans of those days.
+    """
+    params = request.POST if request.method == 'POST' else request.GET
+    start = parse_day(params.get('from')) or date.today()
+    try:
+        days = min(max(int(params.get('days', 7)), 1), MAX_GENERATED_DAYS)
+        seed = int(params['seed']) if params.get('seed') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid days or seed.'}, status=400)
+
+    plans = generate_meal_plans(request.user, start, days=days, seed=seed)
+    if request.method == 'POST':
+        save_meal_plans(request.user, plans)
+
+    chosen = {plan[slot] for plan in plans for slot in MEAL_SLOTS}
+    titles = dict(Recipe.objects.filter(
+        id__in=chosen).values_list('id', 'title'))
+    return JsonResponse({
+        'saved': request.method == 'POST',
+        'days': [{
+            'day': plan['day'].isoformat(),
+            'meals': {
+                slot: {'id': plan[slot], 'title': titles.get(plan[slot])}
+                if plan[slot] else None
+                for slot in MEAL_SLOTS
+            },
+            'totals': plan['totals'],
+        } for plan in plans],
+    })
+
+
+def _request_data(request):
+    """JSON body for API clients, form fields for the calendar page"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _bulk_operation(request, operation):
+    """
+    Run a bulk meal plan write. Form posts carrying ?next= are redirected
+    back with a message, API calls get JSON.
+    """
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+    next_url = data.get('next')
+    if next_url and not url_has_allowed_host_and_scheme(
+            next_url, allowed_hosts={request.get_host()}):
+        next_url = None
+    try:
+        saved = operation(data)
+    except (TypeError, ValueError) as error:
+        if next_url:
+            messages.error(request, str(error))
+            return redirect(next_url)
+        return JsonResponse({'error': str(error)}, status=400)
+    if next_url:
+        messages.success(request, f'{saved} day(s) of meal plans updated.')
+        return redirect(next_url)
+    return JsonResponse({'saved': saved})
+
+
+def _required_day(data, key):
+    day = parse_day(data.get(key))
+    if day is None:
+        raise ValueError(f"'{key}' must be a YYYY-MM-DD date.")
+    return day
+
+
+@login_required
+@require_POST
+def meal_plan_bulk_api(request):
+    """Upsert {"days": {"YYYY-MM-DD": {"lunch": 12, ...}}} atomically"""
+    def operation(data):
+        days = data.get('days')
+        if not isinstance(days, dict):
+            raise ValueError("'days' must map dates to meal slots.")
+        if not all(isinstance(slots, dict) for slots in days.values()):
+            raise ValueError("Each day must map meal slots to recipe ids.")
+        return upsert_meal_plans(request.user, days)
+    return _bulk_operation(request, operation)
+
+
+@login_required
+@require_POST
+def meal_plan_copy_week_api(request):
+    """Copy the week starting at 'from' onto the next 'weeks' weeks"""
+    def operation(data):
+        return copy_week(
+            request.user, _required_day(data, 'from'),
+            int(data.get('weeks', 1)))
+    return _bulk_operation(request, operation)
+
+
+@login_required
+@require_POST
+def meal_plan_repeat_api(request):
+    """Repeat the plan of 'day' on 'weekdays' (0=Mon) from 'from' to 'to'"""
+    def operation(data):
+        weekdays = data.get('weekdays', WEEKDAYS)
+        if isinstance(weekdays, str):
+            weekdays = [part for part in weekdays.split(',') if part]
+        weekdays = {int(weekday) for weekday in weekdays}
+        return repeat_plan(
+            request.user, _required_day(data, 'day'),
+            _required_day(data, 'from'), _required_day(data, 'to'),
+            weekdays)
+    return _bulk_operation(request, operation)
+
+
 @login_required
 def meal_plan_update(request, plan_id):
     """Update a specific meal plan"""
-    meal_plan = get_object_or_404(MealPlan, id=plan_id, user=request.user)
-    recipes = Recipe.objects.all().order_by('category', 'title')
+    meal_plan = get_object_or_404(
+        with_slot_recipes(MealPlan.objects.with_nutrition()),
+        id=plan_id, user=request.user)
 
     if request.method == 'POST':
-        meal_plan.breakfast_recipe_id = request.POST.get('breakfast')
-        meal_plan.lunch_recipe_id = request.POST.get('lunch')
-        meal_plan.dinner_recipe_id = request.POST.get('dinner')
-        meal_plan.snack_recipe_id = request.POST.get('snack')
-        meal_plan.save()
-        messages.success(request, 'Meal plan updated successfully!')
+        if _save_posted_slots(request, meal_plan.day):
+            messages.success(request, 'Meal plan updated successfully!')
         return redirect('dashboard')
 
     return render(request, 'mealapp/meal_plan.html', {
         'meal_plan': meal_plan,
-        'recipes': recipes,
+        'slot_choices': meal_plan_choices(meal_plan),
         'date': meal_plan.day,
     })
 
@@ -263,10 +526,9 @@ def delete_meal_plan(request, plan_id):
         return super().delete(request, *args, **kwargs)
 
     # GET request - show confirmation
-    recipes = Recipe.objects.all().order_by('category', 'title')
     return render(request, 'mealapp/meal_plan.html', {
         'meal_plan': meal_plan,
-        'recipes': recipes,
+        'slot_choices': meal_plan_choices(meal_plan),
         'date': meal_plan.day,
         'confirm_delete': True,
     })
@@ -274,36 +536,24 @@ def delete_meal_plan(request, plan_id):
 
 # Recipe CRUD
 # Recipe Detail to show single recipe
+@cache_headers
+@recipe_condition
 def recipe_detail(request, recipe_id):
     """View for displaying a single recipe's details"""
-    recipe = get_object_or_404(Recipe, id=recipe_id)
-    # Split ingredients by comma or newline, and clean up brackets/quotes
-
-    if recipe.ingredients:
-        raw = recipe.ingredients
-        # Remove brackets and quotes
-        raw = re.sub(r"[\[\]\'\"]", '', raw)
-        if '\n' in raw:
-            ingredients_list = [i.strip()
-                                for i in raw.split('\n') if i.strip()]
-        else:
-            ingredients_list = [i.strip() for i in raw.split(',') if i.strip()]
-    else:
-        ingredients_list = []
-
-    # Split instructions by newline or period
-    if recipe.instructions:
-        raw_instructions = recipe.instructions
-        # Remove brackets and quotes
-        raw_instructions = re.sub(r"[\[\]\'\"]", '', raw_instructions)
-        if '\n' in raw_instructions:
-            instructions_list = [
-                s.strip() for s in raw_instructions.split('\n') if s.strip()]
-        else:
-            instructions_list = [
-                s.strip() for s in raw_instructions.split('.') if s.strip()]
-    else:
-        instructions_list = []
+    recipe = get_object_or_404(
+        Recipe.objects.prefetch_related('ingredient_rows', 'steps'),
+        id=recipe_id)
+
+    # Structured rows are parsed once when the recipe is saved
+    ingredients_list = [
+        row.original_text for row in recipe.ingredient_rows.all()]
+    instructions_list = [step.text for step in recipe.steps.all()]
+
+    # Rows saved before the backfill ran have no structure yet
+    if not ingredients_list and recipe.ingredients:
+        ingredients_list = split_ingredient_lines(recipe.ingredients)
+    if not instructions_list and recipe.instructions:
+        instructions_list = split_instruction_lines(recipe.instructions)
 
     context = {
         'recipe': recipe,
@@ -322,16 +572,30 @@ class RecipeListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         queryset = Recipe.objects.filter(
-            created_by=self.request.user).order_by('-created_at')
+            created_by=self.request.user).order_by(*RECIPE_KEYSET)
         category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(category=category)
+        search = self.request.GET.get('search', '')
+        if search:
+            # Ranked full-text search, best match first
+            queryset = get_search_backend().search(queryset, search)
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """Keyset pages, by rank and id for ranked search results"""
+        ranked = 'rank' in queryset.query.annotations
+        paginator = KeysetPaginator(
+            queryset, RANKED_ORDER if ranked else RECIPE_KEYSET, page_size)
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         context['selected_category'] = self.request.GET.get('category', '')
+        context['search_term'] = self.request.GET.get('search', '')
+        context['recipe_total'] = estimated_count(self.object_list)
         return context
 
     def recipe_list_user(self, username):
@@ -347,6 +611,15 @@ class RecipeListView(LoginRequiredMixin, ListView):
         return render(request, 'mealapp/recipe_list.html', context)
 
 
+def _stage_form_image(request, instance, form, field):
+    """Stage a newly chosen image for upload off the request"""
+    image = form.cleaned_data.get(field)
+    if isinstance(image, UploadedFile):
+        stage_image(instance, image)
+        messages.info(
+            request, 'Your image is uploading and will appear shortly.')
+
+
 class RecipeCreateView(LoginRequiredMixin, CreateView):
     model = Recipe
     template_name = 'mealapp/recipe_create.html'
@@ -355,8 +628,10 @@ class RecipeCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.created_by = self.request.user
+        response = super().form_valid(form)
         messages.success(self.request, 'Recipe created successfully!')
-        return super().form_valid(form)
+        _stage_form_image(self.request, self.object, form, 'image_url')
+        return response
 
 
 class RecipeUpdateView(LoginRequiredMixin, UpdateView):
@@ -372,8 +647,10 @@ class RecipeUpdateView(LoginRequiredMixin, UpdateView):
         return Recipe.objects.filter(created_by=self.request.user)
 
     def form_valid(self, form):
+        response = super().form_valid(form)
         messages.success(self.request, 'Recipe updated successfully!')
-        return super().form_valid(form)
+        _stage_form_image(self.request, self.object, form, 'image_url')
+        return response
 
 
 class RecipeDeleteView(LoginRequiredMixin, DeleteView):
@@ -395,6 +672,117 @@ class RecipeDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+# Recipe API
+# Columns clients may request with ?fields=
+API_RECIPE_FIELDS = [
+    'id', 'title', 'description', 'category', 'ingredients', 'instructions',
+    'image_url', 'servings', 'prep_time_minutes', 'cook_time_minutes',
+    'total_calories', 'protein', 'carbs', 'fat', 'fiber',
+    'created_at', 'updated_at',
+]
+API_CHUNK_SIZE = 2000
+
+
+@cache_headers
+@catalog_condition
+def recipe_suggest(request):
+    """Typeahead for the meal plan editor: ?category=lunch&q=chi"""
+    category = request.GET.get('category', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1),
+                    MAX_SUGGESTIONS)
+    except ValueError:
+        limit = 20
+    matches = suggest_recipes(category, request.GET.get('q', ''), limit)
+    return JsonResponse({
+        'category': category,
+        'results': [{'id': pk, 'title': title} for pk, title in matches],
+    })
+
+
+def recipe_api(request):
+    """
+    Stream the recipe catalog as NDJSON (default) or a JSON array.
+    Rows come from .values().iterator(), so memory stays flat no matter
+    how large the catalog is. Accepts ?fields=, ?category=, ?search=,
+    ?format=ndjson|json and ?limit=.
+    """
+    requested = request.GET.get('fields', '')
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in API_RECIPE_FIELDS]
+    if unknown:
+        return JsonResponse(
+            {'error': f"Unknown field(s): {', '.join(unknown)}",
+             'allowed': API_RECIPE_FIELDS}, status=400)
+    fields = fields or API_RECIPE_FIELDS
+
+    output = request.GET.get('format', 'ndjson')
+    if output not in ('ndjson', 'json'):
+        return JsonResponse(
+            {'error': 'format must be ndjson or json'}, status=400)
+
+    queryset = Recipe.objects.order_by(*RECIPE_KEYSET)
+    category = request.GET.get('category', '')
+    if category:
+        queryset = queryset.filter(category=category)
+    search = request.GET.get('search', '')
+    if search:
+        queryset = get_search_backend().search(queryset, search)
+    limit = request.GET.get('limit', '')
+    if limit.isdigit():
+        queryset = queryset[:int(limit)]
+
+    # CloudinaryField loads image_url as a CloudinaryResource, which JSON
+    # cannot encode; select the stored value instead
+    columns = [
+        Cast('image_url', CharField()) if field == 'image_url' else field
+        for field in fields
+    ]
+    rows = (
+        dict(zip(fields, row)) for row in
+        queryset.values_list(*columns).iterator(chunk_size=API_CHUNK_SIZE))
+    if output == 'json':
+        response = StreamingHttpResponse(
+            json_array_chunks(rows), content_type='application/json')
+    else:
+        response = StreamingHttpResponse(
+            ndjson_lines(rows), content_type='application/x-ndjson')
+    return response
+
+
+@login_required
+def export_api(request, kind):
+    """
+    Staff download of all recipes or meal plans, streamed as they are
+    read. Accepts ?format=ndjson|csv, ?compress=gzip|zstd, ?from=&to=
+    (YYYY-MM-DD, inclusive) and ?user= (repeatable usernames).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only.'}, status=403)
+    if kind not in EXPORTS:
+        raise Http404
+    output = request.GET.get('format', 'ndjson')
+    compression = request.GET.get('compress') or None
+    filters = {'users': request.GET.getlist('user')}
+    for param, key in (('from', 'since'), ('to', 'until')):
+        value = request.GET.get(param)
+        if value:
+            filters[key] = parse_day(value)
+            if filters[key] is None:
+                return JsonResponse(
+                    {'error': f'{param} must be YYYY-MM-DD'}, status=400)
+    try:
+        chunks = export_chunks(kind, output, compression, **filters)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    response = StreamingHttpResponse(
+        chunks, content_type=export_content_type(output, compression))
+    filename = export_filename(kind, output, compression, date.today())
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 def help_page(request):
     """Help page"""
     return render(request, 'mealapp/help.html', {'title': 'Help'})
@@ -116,6 +116,20 @@ DATABASES = {
 }
 if 'test' in sys.argv:
     DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
+    # Migration 0016 uses ArrayField, which SQLite cannot create, so the
+    # test database is built from the models. Tests that need the search
+    # index install it themselves, see mealapp.search.
+    MIGRATION_MODULES = {'mealapp': None}
+
+# Shared by every gunicorn worker, so catalog version bumps and cache
+# deletes (dashboards, meal plan choices) reach all of them. The table is
+# created by mealapp's 0030 migration (or manage.py createcachetable).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mealapp_cache',
+    }
+}
 
 
 # Password validation